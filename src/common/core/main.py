@@ -50,7 +50,7 @@ def ensure_cli_env() -> typing.Generator[None, None, None]:
     if "docgen" in sys.argv:
         os.environ["DOCGEN_MODE"] = "true"
 
-    if "task-processor" in sys.argv:
+    if "task-processor" in sys.argv or "benchmarktaskprocessor" in sys.argv:
         # A hacky way to signal we're not running the API
         os.environ["RUN_BY_PROCESSOR"] = "true"
 
@@ -0,0 +1,124 @@
+import argparse
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError, CommandParser
+
+from task_processor.benchmark import WORKLOADS, Percentiles, run_benchmark
+from task_processor.constants import (
+    DEFAULT_TASK_PROCESSOR_FAIR_SHARE,
+    DEFAULT_TASK_PROCESSOR_NUM_THREADS,
+    DEFAULT_TASK_PROCESSOR_QUEUE_POP_SIZE,
+    DEFAULT_TASK_PROCESSOR_SLEEP_INTERVAL_MS,
+)
+from task_processor.task_run_method import TaskRunMethod
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the throughput of the Task Processor by enqueueing synthetic "
+        "tasks, and processing them with the given configuration."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--workload",
+            choices=WORKLOADS,
+            help="Kind of task to enqueue.",
+            default="noop",
+        )
+        parser.add_argument(
+            "--size",
+            type=int,
+            help=(
+                "Size of each task, in the workload's unit: "
+                + ", ".join(
+                    f"{name} ({workload.unit}, defaults to {workload.default_size})"
+                    for name, workload in WORKLOADS.items()
+                )
+                + "."
+            ),
+            default=None,
+        )
+        parser.add_argument(
+            "--numtasks",
+            type=int,
+            help="Number of tasks to enqueue.",
+            default=1000,
+        )
+        parser.add_argument(
+            "--numthreads",
+            type=int,
+            help="Number of worker threads to run.",
+            default=DEFAULT_TASK_PROCESSOR_NUM_THREADS,
+        )
+        parser.add_argument(
+            "--queuepopsize",
+            type=int,
+            help="Number of tasks each worker will pop from the queue on each cycle.",
+            default=DEFAULT_TASK_PROCESSOR_QUEUE_POP_SIZE,
+        )
+        parser.add_argument(
+            "--sleepintervalms",
+            type=int,
+            help="Number of millis each worker waits before checking for new tasks.",
+            default=DEFAULT_TASK_PROCESSOR_SLEEP_INTERVAL_MS,
+        )
+        parser.add_argument(
+            "--maxsleepintervalms",
+            type=int,
+            help="Max number of millis each worker waits before checking for new tasks.",
+            default=None,
+        )
+        parser.add_argument(
+            "--fairshare",
+            action=argparse.BooleanOptionalAction,
+            help="Interleave task identifiers in each batch of tasks popped.",
+            default=DEFAULT_TASK_PROCESSOR_FAIR_SHARE,
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            help="Number of seconds to wait for tasks to be processed.",
+            default=300,
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if settings.TASK_RUN_METHOD != TaskRunMethod.TASK_PROCESSOR:
+            raise CommandError(
+                "The task processor can only be benchmarked "
+                "if `TASK_RUN_METHOD` is `TASK_PROCESSOR`."
+            )
+
+        try:
+            result = run_benchmark(
+                workload=options["workload"],
+                num_tasks=options["numtasks"],
+                size=options["size"],
+                num_threads=options["numthreads"],
+                queue_pop_size=options["queuepopsize"],
+                sleep_interval_ms=options["sleepintervalms"],
+                max_sleep_interval_ms=options["maxsleepintervalms"],
+                fair_share=options["fairshare"],
+                timeout=timedelta(seconds=options["timeout"]),
+            )
+        except TimeoutError as exception:
+            raise CommandError(str(exception))
+
+        self.stdout.write(
+            f"Completed tasks: {result.num_completed} of {result.num_tasks}\n"
+            f"Enqueue rate: {result.enqueue_rate:.1f} tasks/s\n"
+            f"Throughput: {result.throughput:.1f} tasks/s\n"
+            f"Claim latency: {_format_percentiles(result.claim_latency)}\n"
+            f"End-to-end latency: {_format_percentiles(result.end_to_end_latency)}\n"
+            f"DB statements per task: {result.statements_per_task:.2f}"
+        )
+
+
+def _format_percentiles(percentiles: Percentiles) -> str:
+    return (
+        f"p50={percentiles.p50 * 1000:.1f}ms "
+        f"p95={percentiles.p95 * 1000:.1f}ms "
+        f"p99={percentiles.p99 * 1000:.1f}ms"
+    )
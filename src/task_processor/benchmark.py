@@ -0,0 +1,272 @@
+"""
+Benchmark the throughput of the task processor against a real database.
+
+Synthetic tasks are enqueued with `TaskHandler.delay` to a dedicated queue
+while task runners process them, so that task processor configurations can be
+compared, and regressions in enqueueing, claiming or running tasks caught.
+
+Only tasks enqueued by the benchmark are processed. Still, don't run it
+against a production database, as it competes with task processors for it.
+"""
+
+import hashlib
+import logging
+import statistics
+import time
+import typing
+from contextlib import ExitStack
+from dataclasses import dataclass
+from datetime import timedelta
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+
+from task_processor.decorators import register_task_handler
+from task_processor.models import Task
+from task_processor.threads import TaskRunner
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_QUEUE = "benchmark"
+
+
+def _noop(size: int) -> None:
+    pass
+
+
+def _sleep(size: int) -> None:
+    time.sleep(size / 1000)
+
+
+def _cpu(size: int) -> None:
+    digest = b""
+    for _ in range(size):
+        digest = hashlib.sha256(digest).digest()
+
+
+def _payload(size: int, payload: str) -> None:
+    assert len(payload) == size
+
+
+@dataclass(frozen=True)
+class Workload:
+    function: typing.Callable[..., None]
+    get_kwargs: typing.Callable[[int], dict[str, typing.Any]]
+    # what the workload's size is measured in
+    unit: str
+    default_size: int
+
+
+WORKLOADS: dict[str, Workload] = {
+    "noop": Workload(
+        _noop,
+        get_kwargs=lambda size: {"size": size},
+        unit="-",
+        default_size=0,
+    ),
+    "sleep": Workload(
+        _sleep,
+        get_kwargs=lambda size: {"size": size},
+        unit="milliseconds",
+        default_size=10,
+    ),
+    "cpu": Workload(
+        _cpu,
+        get_kwargs=lambda size: {"size": size},
+        unit="SHA-256 rounds",
+        default_size=10_000,
+    ),
+    "payload": Workload(
+        _payload,
+        get_kwargs=lambda size: {"size": size, "payload": "x" * size},
+        unit="bytes",
+        default_size=100_000,
+    ),
+}
+
+
+@dataclass
+class Percentiles:
+    p50: float
+    p95: float
+    p99: float
+
+    @classmethod
+    def from_values(cls, values: list[float]) -> "Percentiles":
+        if len(values) < 2:
+            value = values[0] if values else 0.0
+            return cls(p50=value, p95=value, p99=value)
+        percentiles = statistics.quantiles(values, n=100, method="inclusive")
+        return cls(p50=percentiles[49], p95=percentiles[94], p99=percentiles[98])
+
+
+@dataclass
+class BenchmarkResult:
+    num_tasks: int
+    num_completed: int
+    # tasks enqueued per second
+    enqueue_rate: float
+    # tasks completed per second, from the first enqueued to the last completed
+    throughput: float
+    # seconds taken to claim tasks to process
+    claim_latency: Percentiles
+    # seconds from enqueueing tasks to their completion
+    end_to_end_latency: Percentiles
+    # statements executed by task runners, including those claiming no tasks
+    statements_per_task: float
+
+
+class _StatementRecorder:
+    """
+    Count the statements executed by task runners, and time the claim queries.
+
+    Install using `connection.execute_wrapper` from each task runner thread.
+    """
+
+    def __init__(self) -> None:
+        self.num_statements = 0
+        self.claim_durations: list[float] = []
+        self._lock = Lock()
+
+    def __call__(
+        self,
+        execute: typing.Callable[..., typing.Any],
+        sql: str,
+        params: typing.Any,
+        many: bool,
+        context: dict[str, typing.Any],
+    ) -> typing.Any:
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started_at
+            with self._lock:
+                self.num_statements += 1
+                if "claim_tasks_to_process" in sql:
+                    self.claim_durations.append(duration)
+
+
+class _BenchmarkTaskRunner(TaskRunner):
+    def __init__(
+        self,
+        *args: typing.Any,
+        statement_recorder: _StatementRecorder,
+        **kwargs: typing.Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.statement_recorder = statement_recorder
+
+    def run(self) -> None:
+        # Connections are per thread, so wrappers are installed from the runner
+        with ExitStack() as stack:
+            for database in settings.TASK_PROCESSOR_DATABASES:
+                stack.enter_context(
+                    connections[database].execute_wrapper(self.statement_recorder)
+                )
+            super().run()
+
+
+def run_benchmark(
+    *,
+    workload: str,
+    num_tasks: int,
+    size: int | None = None,
+    num_threads: int,
+    queue_pop_size: int,
+    sleep_interval_ms: int,
+    max_sleep_interval_ms: int | None = None,
+    fair_share: bool = False,
+    timeout: timedelta = timedelta(minutes=5),
+) -> BenchmarkResult:
+    """
+    Enqueue `num_tasks` tasks of the given `workload` while `num_threads` task
+    runners process them, and measure how long each step took.
+
+    Raise `TimeoutError` if tasks are still waiting after `timeout`.
+    """
+    benchmark_workload = WORKLOADS[workload]
+    task_handler = register_task_handler(task_name=workload, queue=BENCHMARK_QUEUE)(
+        benchmark_workload.function
+    )
+    kwargs = benchmark_workload.get_kwargs(
+        benchmark_workload.default_size if size is None else size
+    )
+
+    tasks = Task.objects.filter(task_identifier=task_handler.task_identifier)
+    # Leftovers from an interrupted run would skew the results
+    tasks.delete()
+
+    statement_recorder = _StatementRecorder()
+    runners = [
+        _BenchmarkTaskRunner(
+            sleep_interval_millis=sleep_interval_ms,
+            max_sleep_interval_millis=max_sleep_interval_ms,
+            queue_pop_size=queue_pop_size,
+            queues=[BENCHMARK_QUEUE],
+            fair_share=fair_share,
+            run_recurring_tasks=False,
+            statement_recorder=statement_recorder,
+        )
+        for _ in range(num_threads)
+    ]
+    for runner in runners:
+        runner.start()
+
+    try:
+        enqueue_started_at = time.perf_counter()
+        for _ in range(num_tasks):
+            task_handler.delay(kwargs=kwargs)
+        enqueue_seconds = time.perf_counter() - enqueue_started_at
+        logger.info("Enqueued %d task(s) in %.3fs", num_tasks, enqueue_seconds)
+
+        deadline = time.monotonic() + timeout.total_seconds()
+        while tasks.filter(completed=False, num_failures__lt=3).exists():
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Benchmark tasks still waiting after {timeout.total_seconds()}s"
+                )
+            time.sleep(0.1)
+    finally:
+        for runner in runners:
+            runner.stop()
+        for runner in runners:
+            runner.join()
+
+    try:
+        timestamps = [
+            (created_at, finished_at)
+            for created_at, finished_at in tasks.filter(completed=True).values_list(
+                "created_at", "finished_at"
+            )
+            if finished_at
+        ]
+    finally:
+        tasks.delete()
+
+    end_to_end_latencies = [
+        (finished_at - created_at).total_seconds()
+        for created_at, finished_at in timestamps
+    ]
+    processing_seconds = (
+        (
+            max(finished_at for _, finished_at in timestamps)
+            - min(created_at for created_at, _ in timestamps)
+        ).total_seconds()
+        if timestamps
+        else 0.0
+    )
+    return BenchmarkResult(
+        num_tasks=num_tasks,
+        num_completed=len(timestamps),
+        enqueue_rate=num_tasks / enqueue_seconds if enqueue_seconds else 0.0,
+        throughput=(
+            len(timestamps) / processing_seconds if processing_seconds else 0.0
+        ),
+        claim_latency=Percentiles.from_values(statement_recorder.claim_durations),
+        end_to_end_latency=Percentiles.from_values(end_to_end_latencies),
+        statements_per_task=(
+            statement_recorder.num_statements / num_tasks if num_tasks else 0.0
+        ),
+    )
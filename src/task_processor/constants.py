@@ -1,4 +1,39 @@
+import os
+
 DEFAULT_TASK_PROCESSOR_NUM_THREADS: int = 5
 DEFAULT_TASK_PROCESSOR_SLEEP_INTERVAL_MS: int = 500
 DEFAULT_TASK_PROCESSOR_GRACE_PERIOD_MS: int = 20000
+DEFAULT_TASK_PROCESSOR_DRAIN_TIMEOUT_MS: int = 10000
 DEFAULT_TASK_PROCESSOR_QUEUE_POP_SIZE: int = 10
+DEFAULT_TASK_PROCESSOR_LISTEN: bool = False
+DEFAULT_TASK_PROCESSOR_FAIR_SHARE: bool = False
+DEFAULT_TASK_PROCESSOR_NUM_PROCESSES: int = os.cpu_count() or 1
+
+TASK_BULK_CREATE_BATCH_SIZE: int = 1000
+
+QUEUE_METRICS_INTERVAL_SECONDS: float = 15
+AUTOSCALE_INTERVAL_SECONDS: float = 10
+HEARTBEAT_INTERVAL_SECONDS: float = 5
+HEARTBEAT_RETENTION_SECONDS: float = 24 * 60 * 60
+DEFAULT_HEARTBEAT_MAX_AGE_SECONDS: float = 30
+# Leases of tasks in flight are extended to this long from now with each heartbeat
+TASK_LEASE_RENEWAL_SECONDS: float = 60
+TASK_QUEUE_LATENCY_BUCKETS = (
+    # 100 ms, 500 ms, 1 s, 5 s, 15 s, 30 s, 1 min, 5 min, 15 min, 1 h, 6 h
+    0.1,
+    0.5,
+    1,
+    5,
+    15,
+    30,
+    60,
+    5 * 60,
+    15 * 60,
+    60 * 60,
+    6 * 60 * 60,
+    float("inf"),
+)
+
+DEFAULT_TASK_QUEUE: str = "default"
+
+TASK_ENQUEUED_CHANNEL: str = "task_processor_task_enqueued"
@@ -1,3 +1,7 @@
+import asyncio
+import functools
+import hashlib
+import inspect
 import logging
 import typing
 from datetime import datetime, time, timedelta
@@ -9,8 +13,11 @@ from django.utils import timezone
 from opentelemetry import propagate
 
 from task_processor import metrics, task_registry
+from task_processor.constants import DEFAULT_TASK_QUEUE, TASK_BULK_CREATE_BATCH_SIZE
 from task_processor.exceptions import InvalidArgumentsError, TaskQueueFullError
 from task_processor.models import RecurringTask, Task, TaskPriority
+from task_processor.notifications import notify_task_enqueued
+from task_processor.task_registry import TaskExecutionBackend
 from task_processor.task_run_method import TaskRunMethod
 from task_processor.types import TaskCallable, TaskParameters, TraceContext
 from task_processor.utils import get_task_identifier_from_function
@@ -26,6 +33,11 @@ class TaskHandler(typing.Generic[TaskParameters]):
         "transaction_on_commit",
         "task_identifier",
         "timeout",
+        "execution_backend",
+        "deduplicate",
+        "debounce",
+        "queue",
+        "max_concurrency",
     )
 
     unwrapped: TaskCallable[TaskParameters]
@@ -39,24 +51,44 @@ class TaskHandler(typing.Generic[TaskParameters]):
         priority: TaskPriority = TaskPriority.NORMAL,
         transaction_on_commit: bool = True,
         timeout: timedelta | None = None,
+        execution_backend: TaskExecutionBackend = TaskExecutionBackend.THREAD,
+        deduplicate: bool = False,
+        debounce: timedelta | None = None,
+        queue: str = DEFAULT_TASK_QUEUE,
+        max_concurrency: int | None = None,
     ) -> None:
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("Max concurrency must be at least one")
+        if execution_backend == TaskExecutionBackend.PROCESS and (
+            "<locals>" in f.__qualname__ or inspect.iscoroutinefunction(f)
+        ):
+            raise ValueError(
+                "Only synchronous functions defined at module level "
+                "can be run in a task process"
+            )
+
         self.unwrapped = f
         self.queue_size = queue_size
         self.priority = priority
         self.transaction_on_commit = transaction_on_commit
         self.timeout = timeout
+        self.execution_backend = execution_backend
+        self.deduplicate = deduplicate or debounce is not None
+        self.debounce = debounce
+        self.queue = queue
+        self.max_concurrency = max_concurrency
 
         self.task_identifier = task_identifier = get_task_identifier_from_function(
             f,
             task_name,
         )
-        task_registry.register_task(task_identifier, f)
+        task_registry.register_task(task_identifier, f, execution_backend)
 
     def __call__(
         self,
         *args: TaskParameters.args,
         **kwargs: TaskParameters.kwargs,
-    ) -> None:
+    ) -> None | typing.Awaitable[None]:
         _validate_inputs(*args, **kwargs)
         return self.unwrapped(*args, **kwargs)
 
@@ -68,6 +100,7 @@ class TaskHandler(typing.Generic[TaskParameters]):
         # (will require a change to the signature)
         args: tuple[typing.Any, ...] = (),
         kwargs: dict[str, typing.Any] | None = None,
+        dedup_key: str | None = None,
     ) -> Task | None:
         task_identifier = self.task_identifier
         logger.debug("Request to run task '%s' asynchronously.", task_identifier)
@@ -83,7 +116,7 @@ class TaskHandler(typing.Generic[TaskParameters]):
 
         if settings.TASK_RUN_METHOD == TaskRunMethod.SYNCHRONOUSLY:
             _validate_inputs(*args, **kwargs)
-            self.unwrapped(*args, **kwargs)
+            _run_to_completion(self.unwrapped, *args, **kwargs)
         elif settings.TASK_RUN_METHOD == TaskRunMethod.SEPARATE_THREAD:
             logger.debug("Running task '%s' in separate thread", task_identifier)
             self.run_in_thread(args=args, kwargs=kwargs)
@@ -97,22 +130,127 @@ class TaskHandler(typing.Generic[TaskParameters]):
                 propagate.inject(carrier)
                 task = Task.create(
                     task_identifier=task_identifier,
-                    scheduled_for=delay_until or timezone.now(),
+                    scheduled_for=delay_until or self._get_scheduled_for(),
                     priority=self.priority,
                     queue_size=self.queue_size,
                     timeout=self.timeout,
                     args=args,
                     kwargs=kwargs,
                     trace_context=carrier or None,
+                    dedup_key=dedup_key,
+                    queue=self.queue,
+                    max_concurrency=self.max_concurrency,
                 )
             except TaskQueueFullError as e:
                 logger.warning(e)
                 return None
 
-            task.save()
+            if self.deduplicate or dedup_key:
+                [task] = self._create_deduplicated([task])
+            else:
+                task.save()
+            _notify_task_enqueued(task)
             return task
         return None
 
+    def delay_many(
+        self,
+        args_list: typing.Iterable[tuple[typing.Any, ...]],
+        *,
+        kwargs_list: typing.Iterable[dict[str, typing.Any]] | None = None,
+        delay_until: datetime | None = None,
+    ) -> list[Task]:
+        """
+        Enqueue a task for each item of `args_list` and, if provided, the
+        matching item of `kwargs_list`, writing them in bulk.
+
+        Tasks exceeding the queue size are dropped.
+        Return the enqueued tasks.
+        """
+        task_identifier = self.task_identifier
+        args_list = list(args_list)
+        kwargs_list = list(kwargs_list) if kwargs_list is not None else None
+        if kwargs_list is not None and len(kwargs_list) != len(args_list):
+            raise InvalidArgumentsError(
+                "`args_list` and `kwargs_list` must be of the same length."
+            )
+        items = list(zip(args_list, kwargs_list or [{}] * len(args_list)))
+        logger.debug(
+            "Request to run %d task(s) '%s' asynchronously.",
+            len(items),
+            task_identifier,
+        )
+
+        if settings.TASK_RUN_METHOD != TaskRunMethod.TASK_PROCESSOR:
+            for args, kwargs in items:
+                self.delay(delay_until=delay_until, args=args, kwargs=kwargs)
+            return []
+
+        if self.queue_size:
+            capacity = Task.get_queue_capacity(task_identifier, self.queue_size)
+            if capacity < len(items):
+                logger.warning(
+                    "Queue for task %s is full. Max queue size is %d. "
+                    "Dropping %d task(s).",
+                    task_identifier,
+                    self.queue_size,
+                    len(items) - capacity,
+                )
+                items = items[:capacity]
+        if not items:
+            return []
+
+        logger.debug("Creating %d task(s) '%s'...", len(items), task_identifier)
+        carrier: TraceContext = {}
+        propagate.inject(carrier)
+        scheduled_for = delay_until or self._get_scheduled_for()
+        tasks = [
+            Task.create(
+                task_identifier=task_identifier,
+                scheduled_for=scheduled_for,
+                priority=self.priority,
+                timeout=self.timeout,
+                args=args,
+                kwargs=kwargs,
+                trace_context=carrier or None,
+                queue=self.queue,
+                max_concurrency=self.max_concurrency,
+            )
+            for args, kwargs in items
+        ]
+        if self.deduplicate:
+            tasks = self._create_deduplicated(tasks)
+        else:
+            tasks = Task.objects.bulk_create(
+                tasks,
+                batch_size=TASK_BULK_CREATE_BATCH_SIZE,
+            )
+        metrics.flagsmith_task_processor_enqueued_tasks_total.labels(
+            task_identifier=task_identifier
+        ).inc(len(tasks))
+        _notify_task_enqueued(tasks[0])
+        return tasks
+
+    def _get_scheduled_for(self) -> datetime:
+        if self.debounce:
+            return timezone.now() + self.debounce
+        return timezone.now()
+
+    def _create_deduplicated(self, tasks: list[Task]) -> list[Task]:
+        unique_tasks: dict[str, Task] = {}
+        for task in tasks:
+            task.dedup_key = task.dedup_key or _get_dedup_key(task)
+            unique_tasks.setdefault(task.dedup_key, task)
+        deduplicated_tasks = list(unique_tasks.values())
+        return [
+            task
+            for offset in range(0, len(deduplicated_tasks), TASK_BULK_CREATE_BATCH_SIZE)
+            for task in Task.objects.create_deduplicated(
+                deduplicated_tasks[offset : offset + TASK_BULK_CREATE_BATCH_SIZE],
+                debounce=self.debounce is not None,
+            )
+        ]
+
     def run_in_thread(
         self,
         *,
@@ -121,7 +259,10 @@ class TaskHandler(typing.Generic[TaskParameters]):
     ) -> None:
         kwargs = kwargs or {}
         _validate_inputs(*args, **kwargs)
-        thread = Thread(target=self.unwrapped, args=args, kwargs=kwargs, daemon=True)
+        target: typing.Callable[..., typing.Any] = self.unwrapped
+        if inspect.iscoroutinefunction(target):
+            target = functools.partial(_run_to_completion, target)
+        thread = Thread(target=target, args=args, kwargs=kwargs, daemon=True)
 
         def _start() -> None:
             logger.info(
@@ -141,10 +282,18 @@ def register_task_handler(  # noqa: C901
     priority: TaskPriority = TaskPriority.NORMAL,
     transaction_on_commit: bool = True,
     timeout: timedelta | None = timedelta(seconds=60),
+    execution_backend: TaskExecutionBackend = TaskExecutionBackend.THREAD,
+    deduplicate: bool = False,
+    debounce: timedelta | None = None,
+    queue: str = DEFAULT_TASK_QUEUE,
+    max_concurrency: int | None = None,
 ) -> typing.Callable[[TaskCallable[TaskParameters]], TaskHandler[TaskParameters]]:
     """
     Turn a function into an asynchronous task.
 
+    Coroutine functions are supported, and are awaited concurrently
+    on an event loop shared by the task processor's threads.
+
     :param str task_name: task name. Defaults to function name.
     :param int queue_size: (`TASK_PROCESSOR` task run method only)
         max queue size for the task. Task runs exceeding the max size get dropped by
@@ -157,6 +306,27 @@ def register_task_handler(  # noqa: C901
         immediately.
         Pass `False` if you want the task to start immediately regardless of current
         transaction.
+    :param TaskExecutionBackend execution_backend: (`TASK_PROCESSOR` task run
+        method only) where the task processor runs the task. Use
+        `TaskExecutionBackend.PROCESS` for CPU-bound tasks, to run them in a
+        separate process and kill it on timeout. Defaults to running the task
+        in a thread.
+    :param bool deduplicate: (`TASK_PROCESSOR` task run method only)
+        Whether to coalesce the task into a pending one with the same arguments,
+        or the same `dedup_key` passed to `delay`, instead of enqueueing it again.
+        Defaults to `False`.
+    :param timedelta debounce: (`TASK_PROCESSOR` task run method only)
+        Deduplicate the task, and delay it by this amount each time it's enqueued
+        again, so that it runs once a burst of calls is over.
+    :param str queue: (`TASK_PROCESSOR` task run method only) name of the queue
+        to enqueue the task to, so that it's processed by task processors
+        started with `--queues` including it. Defaults to `"default"`.
+    :param int max_concurrency: (`TASK_PROCESSOR` task run method only)
+        max number of instances of the task to run at the same time, across all
+        task processors. Defaults to `None` (unlimited). The cap is recorded on
+        each task as it's enqueued, so changing it only applies to tasks enqueued
+        afterwards; tasks already queued keep enforcing the cap they were
+        enqueued with.
     :rtype: TaskHandler
     """
 
@@ -168,6 +338,11 @@ def register_task_handler(  # noqa: C901
             priority=priority,
             transaction_on_commit=transaction_on_commit,
             timeout=timeout,
+            execution_backend=execution_backend,
+            deduplicate=deduplicate,
+            debounce=debounce,
+            queue=queue,
+            max_concurrency=max_concurrency,
         )
 
     return wrapper
@@ -211,3 +386,32 @@ def _validate_inputs(*args: typing.Any, **kwargs: typing.Any) -> None:
         Task.serialize_data(kwargs or {})
     except TypeError as e:
         raise InvalidArgumentsError("Inputs are not serializable.") from e
+
+
+def _get_dedup_key(task: Task) -> str:
+    return hashlib.sha256(
+        f"{task.serialized_args}:{task.serialized_kwargs}".encode()
+    ).hexdigest()
+
+
+def _notify_task_enqueued(task: Task) -> None:
+    if (
+        getattr(settings, "ENABLE_TASK_PROCESSOR_NOTIFY", False)
+        and task.scheduled_for
+        and task.scheduled_for <= timezone.now()
+    ):
+        notify_task_enqueued(task._state.db or "default")
+
+
+def _run_to_completion(
+    f: TaskCallable[TaskParameters],
+    *args: TaskParameters.args,
+    **kwargs: TaskParameters.kwargs,
+) -> None:
+    result = f(*args, **kwargs)
+    if inspect.isawaitable(result):
+        asyncio.run(_await(result))
+
+
+async def _await(awaitable: typing.Awaitable[None]) -> None:
+    await awaitable
@@ -23,6 +23,10 @@ class TaskBackoffError(TaskProcessingError):
         super().__init__()
         self.delay_until = delay_until
 
+    def __reduce__(self) -> tuple[type["TaskBackoffError"], tuple[datetime | None]]:
+        # Preserve `delay_until` for errors raised in task processes
+        return self.__class__, (self.delay_until,)
+
 
 class TaskQueueFullError(Exception):
     pass
@@ -1,34 +1,30 @@
-import uuid
+from datetime import timedelta
 
-import backoff
+from django.conf import settings
+from django.utils import timezone
 from health_check.backends import BaseHealthCheckBackend  # type: ignore[import-untyped]
 from health_check.exceptions import HealthCheckException  # type: ignore[import-untyped]
 
-from task_processor.models import HealthCheckModel
-from task_processor.tasks import create_health_check_model
+from task_processor.constants import DEFAULT_HEARTBEAT_MAX_AGE_SECONDS
+from task_processor.models import TaskProcessorHeartbeat
 
 
-def is_processor_healthy(max_tries: int = 5, factor: float = 0.1) -> bool:
-    health_check_model_uuid = str(uuid.uuid4())
+def is_processor_healthy() -> bool:
+    """
+    Return whether any task runner checked for tasks recently, according to
+    the heartbeats written by task processors.
 
-    create_health_check_model.delay(args=(health_check_model_uuid,))
-
-    @backoff.on_predicate(
-        backoff.expo,
-        lambda m: m is None,
-        max_tries=max_tries,
-        factor=factor,
-        jitter=None,
+    Heartbeats older than `TASK_PROCESSOR_HEARTBEAT_MAX_AGE_SECONDS` are
+    not taken into account.
+    """
+    max_age_seconds: float = getattr(
+        settings,
+        "TASK_PROCESSOR_HEARTBEAT_MAX_AGE_SECONDS",
+        DEFAULT_HEARTBEAT_MAX_AGE_SECONDS,
     )
-    def get_health_check_model() -> HealthCheckModel | None:
-        return HealthCheckModel.objects.filter(uuid=health_check_model_uuid).first()
-
-    health_check_model = get_health_check_model()
-    if health_check_model:
-        health_check_model.delete()
-        return True
-
-    return False
+    return TaskProcessorHeartbeat.objects.filter(
+        last_checked_at__gte=timezone.now() - timedelta(seconds=max_age_seconds),
+    ).exists()
 
 
 class TaskProcessorHealthCheckBackend(BaseHealthCheckBackend):  # type: ignore[misc]
@@ -1,16 +1,163 @@
 import typing
+from datetime import timedelta
 
-from django.db.models import Manager
+from django.db import connections, router, transaction
+from django.db.models import Exists, F, Manager, OuterRef
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 if typing.TYPE_CHECKING:
-    from django.db.models.query import RawQuerySet
+    from django.db.models.query import QuerySet, RawQuerySet
 
     from task_processor.models import RecurringTask, Task
 
 
 class TaskManager(Manager["Task"]):
-    def get_tasks_to_process(self, num_tasks: int) -> "RawQuerySet[Task]":
-        return self.raw("SELECT * FROM get_tasks_to_process(%s)", [num_tasks])
+    def get_tasks_to_process(
+        self,
+        num_tasks: int,
+        queues: list[str] | None = None,
+        fair_share: bool = False,
+        priority_aging: timedelta | None = None,
+    ) -> "RawQuerySet[Task]":
+        return self.raw(
+            "SELECT * FROM claim_tasks_to_process(%s, %s::text[], %s, %s::interval)",
+            [num_tasks, queues, fair_share, priority_aging],
+        )
+
+    def renew_leases(self, task_ids: typing.Sequence[int], duration: timedelta) -> int:
+        """
+        Extend the lease of the locked tasks in `task_ids` to at least
+        `duration` from now, and return the number of leases renewed.
+        """
+        return self.filter(pk__in=task_ids, is_locked=True).update(
+            lease_expires_at=Greatest(F("lease_expires_at"), timezone.now() + duration)
+        )
+
+    def mark_started(self, task_ids: typing.Sequence[int]) -> None:
+        """
+        Record that the claimed tasks in `task_ids` started running, so that
+        a failure is counted if their lease expires.
+        """
+        self.filter(pk__in=task_ids).update(started_at=timezone.now())
+
+    def release(self, task_ids: typing.Sequence[int]) -> int:
+        """
+        Unlock the tasks in `task_ids`, which were claimed but not started,
+        and return the number of tasks released.
+        """
+        tasks = self.filter(pk__in=task_ids, is_locked=True)
+        with transaction.atomic(using=self._get_database()):
+            # Tasks are marked started along with their batch, before they run.
+            # Tasks left locked below mustn't count a failure once reclaimed.
+            tasks.update(started_at=None)
+            return self._release(tasks)
+
+    def reclaim_expired(self) -> int:
+        """
+        Unlock the tasks whose lease expired, i.e. claimed by a task processor
+        that died or stopped renewing it, and return the number of tasks reclaimed.
+
+        The lost run of tasks that started is counted as a failure. Tasks that
+        never started are released.
+        """
+        now = timezone.now()
+        expired_tasks = self.filter(
+            completed=False,
+            is_locked=True,
+            lease_expires_at__lt=now,
+        )
+        with transaction.atomic(using=self._get_database()):
+            # This also takes them out of the scope of `pending_task_dedup_key_uniq`
+            num_failed = expired_tasks.filter(started_at__isnull=False).update(
+                is_locked=False,
+                lease_expires_at=None,
+                num_failures=F("num_failures") + 1,
+                finished_at=now,
+                last_error="Task lease expired before the task finished",
+            )
+            num_released = self._release(expired_tasks.filter(started_at__isnull=True))
+        return num_failed + num_released
+
+    def create_deduplicated(
+        self,
+        tasks: typing.Sequence["Task"],
+        *,
+        debounce: bool = False,
+    ) -> list["Task"]:
+        """
+        Insert `tasks`, coalescing each into the pending task with the same
+        `task_identifier` and `dedup_key`, if there is one.
+
+        If `debounce` is set, coalesced tasks are pushed back to the later
+        `scheduled_for`. Otherwise, they're left untouched.
+
+        Return the inserted or coalesced tasks, in the same order as `tasks`,
+        which must not contain duplicates.
+        """
+        database = self._get_database()
+        connection = connections[database]
+        quote_name = connection.ops.quote_name
+        fields = [
+            field for field in self.model._meta.concrete_fields if not field.primary_key
+        ]
+        columns = ", ".join(quote_name(field.column) for field in fields)
+        values = ", ".join(["(" + ", ".join(["%s"] * len(fields)) + ")"] * len(tasks))
+        params = [
+            field.get_db_prep_save(field.pre_save(task, True), connection)
+            for task in tasks
+            for field in fields
+        ]
+        table = quote_name(self.model._meta.db_table)
+        scheduled_for = (
+            f"GREATEST({table}.scheduled_for, EXCLUDED.scheduled_for)"
+            if debounce
+            else f"{table}.scheduled_for"
+        )
+        # The conflict target matches the `pending_task_dedup_key_uniq` index
+        sql = (
+            f"INSERT INTO {table} ({columns}) VALUES {values} "
+            "ON CONFLICT (task_identifier, dedup_key) "
+            "WHERE (NOT completed AND NOT is_locked AND num_failures = 0) "
+            f"DO UPDATE SET scheduled_for = {scheduled_for} "
+            "RETURNING *"
+        )
+        created_tasks = {
+            (task.task_identifier, task.dedup_key): task
+            for task in self.raw(sql, params, using=database)
+        }
+        return [created_tasks[task.task_identifier, task.dedup_key] for task in tasks]
+
+    def _release(self, tasks: "QuerySet[Task]") -> int:
+        with transaction.atomic(using=self._get_database()):
+            # Unlocking tasks with a pending duplicate would break
+            # `pending_task_dedup_key_uniq`, so they're coalesced into it instead
+            pending_duplicates = self.filter(
+                task_identifier=OuterRef("task_identifier"),
+                dedup_key=OuterRef("dedup_key"),
+                completed=False,
+                is_locked=False,
+                num_failures=0,
+            )
+            _, num_deleted = (
+                tasks.filter(num_failures=0).filter(Exists(pending_duplicates)).delete()
+            )
+            # Of duplicates released together, only the first is unlocked. The
+            # others are coalesced into it once reclaimed.
+            released_duplicates = tasks.filter(
+                task_identifier=OuterRef("task_identifier"),
+                dedup_key=OuterRef("dedup_key"),
+                num_failures=0,
+                pk__lt=OuterRef("pk"),
+            )
+            num_unlocked = tasks.exclude(Exists(released_duplicates)).update(
+                is_locked=False,
+                lease_expires_at=None,
+            )
+        return num_deleted.get(self.model._meta.label, 0) + num_unlocked
+
+    def _get_database(self) -> str:
+        return self._db or router.db_for_write(self.model)
 
 
 class RecurringTaskManager(Manager["RecurringTask"]):
@@ -2,6 +2,7 @@ import prometheus_client
 from django.conf import settings
 
 from common.prometheus import Histogram
+from task_processor.constants import TASK_QUEUE_LATENCY_BUCKETS
 
 flagsmith_task_processor_enqueued_tasks_total = prometheus_client.Counter(
     "flagsmith_task_processor_enqueued_tasks_total",
@@ -15,8 +16,31 @@ if settings.DOCGEN_MODE or settings.TASK_PROCESSOR_MODE:
         "Total number of finished tasks. Only collected by Task Processor. `task_type` label is either `recurring` or `standard`.",
         ["task_identifier", "task_type", "result"],
     )
+    flagsmith_task_processor_waiting_tasks = prometheus_client.Gauge(
+        "flagsmith_task_processor_waiting_tasks",
+        "Number of tasks due to run, and waiting for a task processor thread. Only collected by Task Processor.",
+        ["task_identifier", "priority"],
+        multiprocess_mode="livemax",
+    )
+    flagsmith_task_processor_locked_tasks = prometheus_client.Gauge(
+        "flagsmith_task_processor_locked_tasks",
+        "Number of tasks picked up by a task processor thread, and not finished yet. Only collected by Task Processor.",
+        ["task_identifier"],
+        multiprocess_mode="livemax",
+    )
+    flagsmith_task_processor_oldest_waiting_task_age_seconds = prometheus_client.Gauge(
+        "flagsmith_task_processor_oldest_waiting_task_age_seconds",
+        "Seconds since the longest waiting task was due to run. Only collected by Task Processor.",
+        multiprocess_mode="livemax",
+    )
     flagsmith_task_processor_task_duration_seconds = Histogram(
         "flagsmith_task_processor_task_duration_seconds",
         "Task processor task duration in seconds. Only collected by Task Processor. `task_type` label is either `recurring` or `standard`.",
         ["task_identifier", "task_type", "result"],
     )
+    flagsmith_task_processor_task_queue_latency_seconds = Histogram(
+        "flagsmith_task_processor_task_queue_latency_seconds",
+        "Seconds between a task being due to run, and a task processor thread starting it. Only collected by Task Processor. Not collected for recurring tasks.",
+        ["task_identifier", "priority"],
+        buckets=TASK_QUEUE_LATENCY_BUCKETS,
+    )
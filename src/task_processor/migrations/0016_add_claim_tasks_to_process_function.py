@@ -0,0 +1,23 @@
+import os
+
+from django.db import migrations
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("task_processor", "0015_add_is_disabled"),
+    ]
+
+    operations = [
+        PostgresOnlyRunSQL.from_sql_file(
+            os.path.join(
+                os.path.dirname(__file__),
+                "sql",
+                "0016_claim_tasks_to_process.sql",
+            ),
+            reverse_sql="DROP FUNCTION IF EXISTS claim_tasks_to_process(integer)",
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("task_processor", "0016_add_claim_tasks_to_process_function"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="task",
+                    index=models.Index(
+                        condition=models.Q(
+                            ("completed", False), ("num_failures__lt", 3)
+                        ),
+                        fields=["task_identifier"],
+                        name="incomplete_tasks_ident_idx",
+                    ),
+                ),
+            ],
+            database_operations=[
+                PostgresOnlyRunSQL(
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "incomplete_tasks_ident_idx" ON "task_processor_task" ("task_identifier") WHERE (NOT "completed" AND "num_failures" < 3);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS "incomplete_tasks_ident_idx";',
+                ),
+            ],
+        )
+    ]
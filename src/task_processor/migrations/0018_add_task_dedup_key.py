@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("task_processor", "0017_add_incomplete_tasks_identifier_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="dedup_key",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
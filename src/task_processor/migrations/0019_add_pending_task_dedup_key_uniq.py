@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("task_processor", "0018_add_task_dedup_key"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name="task",
+                    constraint=models.UniqueConstraint(
+                        condition=models.Q(
+                            ("completed", False),
+                            ("is_locked", False),
+                            ("num_failures", 0),
+                        ),
+                        fields=("task_identifier", "dedup_key"),
+                        name="pending_task_dedup_key_uniq",
+                    ),
+                ),
+            ],
+            database_operations=[
+                PostgresOnlyRunSQL(
+                    'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "pending_task_dedup_key_uniq" ON "task_processor_task" ("task_identifier", "dedup_key") WHERE (NOT "completed" AND NOT "is_locked" AND "num_failures" = 0);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS "pending_task_dedup_key_uniq";',
+                ),
+            ],
+        )
+    ]
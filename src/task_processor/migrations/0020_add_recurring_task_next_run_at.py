@@ -0,0 +1,40 @@
+import os
+
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("task_processor", "0019_add_pending_task_dedup_key_uniq"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recurringtask",
+            name="next_run_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="recurringtask",
+            index=models.Index(
+                condition=models.Q(("is_disabled", False)),
+                fields=["next_run_at"],
+                name="recurring_task_next_run_idx",
+            ),
+        ),
+        PostgresOnlyRunSQL.from_sql_file(
+            os.path.join(
+                os.path.dirname(__file__),
+                "sql",
+                "0020_get_recurringtasks_to_process.sql",
+            ),
+            reverse_sql=os.path.join(
+                os.path.dirname(__file__),
+                "sql",
+                "0015_get_recurringtasks_to_process.sql",
+            ),
+        ),
+    ]
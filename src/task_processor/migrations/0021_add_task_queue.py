@@ -0,0 +1,28 @@
+import os
+
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("task_processor", "0020_add_recurring_task_next_run_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="queue",
+            field=models.CharField(default="default", max_length=100),
+        ),
+        PostgresOnlyRunSQL.from_sql_file(
+            os.path.join(
+                os.path.dirname(__file__),
+                "sql",
+                "0021_claim_tasks_to_process.sql",
+            ),
+            reverse_sql="DROP FUNCTION IF EXISTS claim_tasks_to_process(integer, text[])",
+        ),
+    ]
@@ -0,0 +1,28 @@
+import os
+
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("task_processor", "0022_add_incomplete_tasks_queue_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="max_concurrency",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        PostgresOnlyRunSQL.from_sql_file(
+            os.path.join(
+                os.path.dirname(__file__),
+                "sql",
+                "0023_claim_tasks_to_process.sql",
+            ),
+            reverse_sql="DROP FUNCTION IF EXISTS claim_tasks_to_process(integer, text[], boolean)",
+        ),
+    ]
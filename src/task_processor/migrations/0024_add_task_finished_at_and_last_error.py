@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("task_processor", "0023_add_task_max_concurrency"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="finished_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="last_error",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_processor', '0024_add_task_finished_at_and_last_error'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskProcessorHeartbeat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=255, unique=True)),
+                ('last_seen_at', models.DateTimeField()),
+                ('last_checked_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('last_claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('num_in_flight', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
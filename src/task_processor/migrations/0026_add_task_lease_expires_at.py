@@ -0,0 +1,59 @@
+import os
+
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("task_processor", "0025_add_task_processor_heartbeat"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="lease_expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="task",
+                    index=models.Index(
+                        condition=models.Q(("completed", False), ("is_locked", True)),
+                        fields=["lease_expires_at"],
+                        name="locked_tasks_lease_idx",
+                    ),
+                ),
+            ],
+            database_operations=[
+                PostgresOnlyRunSQL(
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "locked_tasks_lease_idx" ON "task_processor_task" ("lease_expires_at") WHERE (NOT "completed" AND "is_locked");',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS "locked_tasks_lease_idx";',
+                ),
+            ],
+        ),
+        # Tasks locked before leases were introduced may never be released
+        # otherwise; give them time to finish if they're still running.
+        PostgresOnlyRunSQL(
+            "UPDATE task_processor_task SET lease_expires_at = NOW() + INTERVAL '1 hour' "
+            "WHERE is_locked AND NOT completed AND lease_expires_at IS NULL",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        PostgresOnlyRunSQL.from_sql_file(
+            os.path.join(
+                os.path.dirname(__file__),
+                "sql",
+                "0026_claim_tasks_to_process.sql",
+            ),
+            reverse_sql=os.path.join(
+                os.path.dirname(__file__),
+                "sql",
+                "0023_claim_tasks_to_process.sql",
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+import os
+
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("task_processor", "0026_add_task_lease_expires_at"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="task",
+                    index=models.Index(
+                        condition=models.Q(
+                            ("completed", False), ("num_failures__lt", 3)
+                        ),
+                        fields=["priority", "scheduled_for"],
+                        name="incomplete_tasks_priority_idx",
+                    ),
+                ),
+            ],
+            database_operations=[
+                PostgresOnlyRunSQL(
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "incomplete_tasks_priority_idx" ON "task_processor_task" ("priority", "scheduled_for") WHERE (NOT "completed" AND "num_failures" < 3);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS "incomplete_tasks_priority_idx";',
+                ),
+            ],
+        ),
+        PostgresOnlyRunSQL.from_sql_file(
+            os.path.join(
+                os.path.dirname(__file__),
+                "sql",
+                "0027_claim_tasks_to_process.sql",
+            ),
+            reverse_sql="DROP FUNCTION IF EXISTS claim_tasks_to_process(integer, text[], boolean, interval)",
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("task_processor", "0027_add_task_priority_aging"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="task",
+                    index=models.Index(
+                        condition=models.Q(
+                            ("completed", False), ("max_concurrency__isnull", False)
+                        ),
+                        fields=["task_identifier", "is_locked"],
+                        name="incomplete_capped_tasks_idx",
+                    ),
+                ),
+            ],
+            database_operations=[
+                PostgresOnlyRunSQL(
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "incomplete_capped_tasks_idx" ON "task_processor_task" ("task_identifier", "is_locked") WHERE (NOT "completed" AND "max_concurrency" IS NOT NULL);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS "incomplete_capped_tasks_idx";',
+                ),
+            ],
+        )
+    ]
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from django.db import migrations, models
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+SQL_DIR = Path(__file__).parent / "sql"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("task_processor", "0028_add_incomplete_capped_tasks_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        PostgresOnlyRunSQL.from_sql_file(
+            str(SQL_DIR / "0029_claim_tasks_to_process.sql"),
+            reverse_sql=str(SQL_DIR / "0027_claim_tasks_to_process.sql"),
+        ),
+        # Tasks claimed by task processors predating leases are reclaimed too
+        PostgresOnlyRunSQL.from_sql_file(
+            str(SQL_DIR / "0029_get_tasks_to_process.sql"),
+            reverse_sql=str(SQL_DIR / "0011_get_tasks_to_process.sql"),
+        ),
+        # Earlier overloads, which no task processor release calls, and which
+        # claim tasks without a lease, or without resetting `started_at`
+        *(
+            PostgresOnlyRunSQL(
+                f"DROP FUNCTION IF EXISTS claim_tasks_to_process({arguments})",
+                reverse_sql=(SQL_DIR / sql_file_name).read_text(),
+            )
+            for arguments, sql_file_name in [
+                ("integer", "0016_claim_tasks_to_process.sql"),
+                ("integer, text[]", "0021_claim_tasks_to_process.sql"),
+                ("integer, text[], boolean", "0026_claim_tasks_to_process.sql"),
+            ]
+        ),
+    ]
@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from django.db import migrations
+
+from common.migrations.helpers import PostgresOnlyRunSQL
+
+SQL_DIR = Path(__file__).parent / "sql"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("task_processor", "0029_add_task_started_at"),
+    ]
+
+    operations = [
+        PostgresOnlyRunSQL.from_sql_file(
+            str(SQL_DIR / "0030_claim_tasks_to_process.sql"),
+            reverse_sql=str(SQL_DIR / "0029_claim_tasks_to_process.sql"),
+        ),
+    ]
@@ -0,0 +1,65 @@
+CREATE OR REPLACE FUNCTION claim_tasks_to_process(num_tasks integer, queues text[])
+RETURNS TABLE (
+    id integer,
+    created_at timestamp with time zone,
+    scheduled_for timestamp with time zone,
+    task_identifier varchar,
+    serialized_args text,
+    serialized_kwargs text,
+    num_failures integer,
+    completed boolean,
+    is_locked boolean,
+    priority smallint,
+    timeout interval,
+    trace_context jsonb,
+    queue varchar
+) AS $$
+BEGIN
+    -- Lock the whole batch with a single statement, rather than updating
+    -- the selected tasks one by one, and only return the columns needed
+    -- to run them.
+    -- The query is planned for the given arguments on every call, as a
+    -- generic plan can't use the `LIMIT` to pick the index path.
+    RETURN QUERY EXECUTE $query$
+        WITH claimed_task AS (
+            UPDATE task_processor_task AS task
+            -- Lock the tasks by setting is_locked True, so that no other workers can select them after this
+            -- transaction is complete (but the tasks are still being executed by the current worker)
+            SET is_locked = TRUE
+            FROM (
+                SELECT task_to_claim.id
+                FROM task_processor_task AS task_to_claim
+                WHERE task_to_claim.num_failures < 3
+                  AND task_to_claim.scheduled_for < NOW()
+                  AND task_to_claim.completed = FALSE
+                  AND task_to_claim.is_locked = FALSE
+                  AND task_to_claim.queue = ANY($2)
+                ORDER BY task_to_claim.priority ASC, task_to_claim.scheduled_for ASC, task_to_claim.created_at ASC
+                LIMIT $1
+                -- Select for update to ensure that no other workers can select these tasks while in this transaction block
+                FOR UPDATE SKIP LOCKED
+            ) AS task_to_claim
+            WHERE task.id = task_to_claim.id
+            RETURNING
+                task.id,
+                task.created_at,
+                task.scheduled_for,
+                task.task_identifier,
+                task.serialized_args,
+                task.serialized_kwargs,
+                task.num_failures,
+                task.completed,
+                task.is_locked,
+                task.priority,
+                task.timeout,
+                task.trace_context,
+                task.queue
+        )
+        -- RETURNING does not preserve the order of the subquery
+        SELECT *
+        FROM claimed_task
+        ORDER BY claimed_task.priority ASC, claimed_task.scheduled_for ASC, claimed_task.created_at ASC
+    $query$
+    USING num_tasks, queues;
+END;
+$$ LANGUAGE plpgsql
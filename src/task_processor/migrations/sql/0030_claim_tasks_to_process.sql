@@ -0,0 +1,271 @@
+CREATE OR REPLACE FUNCTION claim_tasks_to_process(
+    num_tasks integer,
+    queues text[],
+    fair_share boolean,
+    priority_aging interval
+)
+RETURNS TABLE (
+    id integer,
+    created_at timestamp with time zone,
+    scheduled_for timestamp with time zone,
+    task_identifier varchar,
+    serialized_args text,
+    serialized_kwargs text,
+    num_failures integer,
+    completed boolean,
+    is_locked boolean,
+    priority smallint,
+    timeout interval,
+    trace_context jsonb,
+    queue varchar
+) AS $$
+#variable_conflict use_column
+DECLARE
+    -- Consider more tasks than we claim when interleaving them
+    num_candidates integer := CASE WHEN fair_share THEN num_tasks * 10 ELSE num_tasks END;
+    candidate_ids integer[];
+    num_running_by_identifier jsonb;
+BEGIN
+    -- Tasks whose identifier already runs as many tasks as their cap allows are
+    -- skipped while selecting candidates, so that a capped backlog can't fill the
+    -- candidates and hold back the tasks behind it. Running tasks are found with
+    -- `incomplete_capped_tasks_idx`, without reading the backlog.
+    SELECT COALESCE(jsonb_object_agg(running_task.task_identifier, running_task.num_running), '{}')
+    INTO num_running_by_identifier
+    FROM (
+        SELECT task.task_identifier, COUNT(*) AS num_running
+        FROM task_processor_task AS task
+        WHERE task.num_failures < 3
+          AND task.completed = FALSE
+          AND task.is_locked = TRUE
+          AND task.max_concurrency IS NOT NULL
+        GROUP BY task.task_identifier
+    ) AS running_task;
+
+    LOOP
+        -- This is planned for the given arguments on every call, as a generic plan
+        -- can't use them to pick the index path.
+        IF priority_aging IS NULL THEN
+            EXECUTE $query$
+                SELECT ARRAY(
+                    SELECT task.id
+                    FROM task_processor_task AS task
+                    WHERE task.num_failures < 3
+                      AND task.scheduled_for < NOW()
+                      AND task.completed = FALSE
+                      AND task.is_locked = FALSE
+                      AND ($2 IS NULL OR task.queue = ANY($2))
+                      AND (
+                          task.max_concurrency IS NULL
+                          OR task.max_concurrency > COALESCE(($3 ->> task.task_identifier)::integer, 0)
+                      )
+                    ORDER BY task.priority ASC, task.scheduled_for ASC, task.created_at ASC
+                    LIMIT $1
+                    -- Select for update to ensure that no other workers can select these tasks while in this transaction block
+                    FOR UPDATE SKIP LOCKED
+                )
+            $query$
+            INTO candidate_ids
+            USING num_candidates, queues, num_running_by_identifier;
+        ELSE
+            -- Tasks are due at `scheduled_for + priority * priority_aging`, so that waiting
+            -- improves their priority by one for every `priority_aging`. Tasks of the same
+            -- priority are due in the order they were scheduled, so the first tasks due are
+            -- among the first of each priority, which `incomplete_tasks_priority_idx` finds
+            -- by skipping from one priority to the next.
+            -- Candidates of each priority are locked, even if not claimed in the end.
+            EXECUTE $query$
+                SELECT ARRAY(
+                    WITH RECURSIVE waiting_priority AS (
+                        (
+                            SELECT task.priority
+                            FROM task_processor_task AS task
+                            WHERE task.num_failures < 3
+                              AND task.scheduled_for < NOW()
+                              AND task.completed = FALSE
+                              AND task.is_locked = FALSE
+                              AND task.priority IS NOT NULL
+                              AND ($2 IS NULL OR task.queue = ANY($2))
+                            ORDER BY task.priority ASC
+                            LIMIT 1
+                        )
+                        UNION ALL
+                        SELECT (
+                            SELECT task.priority
+                            FROM task_processor_task AS task
+                            WHERE task.num_failures < 3
+                              AND task.scheduled_for < NOW()
+                              AND task.completed = FALSE
+                              AND task.is_locked = FALSE
+                              AND task.priority > waiting_priority.priority
+                              AND ($2 IS NULL OR task.queue = ANY($2))
+                            ORDER BY task.priority ASC
+                            LIMIT 1
+                        )
+                        FROM waiting_priority
+                        WHERE waiting_priority.priority IS NOT NULL
+                    )
+                    SELECT aged_task.id
+                    FROM (
+                        SELECT prioritised_task.*
+                        FROM waiting_priority
+                        CROSS JOIN LATERAL (
+                            SELECT task.id, task.priority, task.scheduled_for, task.created_at
+                            FROM task_processor_task AS task
+                            WHERE task.num_failures < 3
+                              AND task.scheduled_for < NOW()
+                              AND task.completed = FALSE
+                              AND task.is_locked = FALSE
+                              AND task.priority = waiting_priority.priority
+                              AND ($2 IS NULL OR task.queue = ANY($2))
+                              AND (
+                                  task.max_concurrency IS NULL
+                                  OR task.max_concurrency > COALESCE(($4 ->> task.task_identifier)::integer, 0)
+                              )
+                            ORDER BY task.scheduled_for ASC, task.created_at ASC
+                            LIMIT $1
+                            FOR UPDATE SKIP LOCKED
+                        ) AS prioritised_task
+                        UNION ALL
+                        SELECT unprioritised_task.*
+                        FROM (
+                            SELECT task.id, task.priority, task.scheduled_for, task.created_at
+                            FROM task_processor_task AS task
+                            WHERE task.num_failures < 3
+                              AND task.scheduled_for < NOW()
+                              AND task.completed = FALSE
+                              AND task.is_locked = FALSE
+                              AND task.priority IS NULL
+                              AND ($2 IS NULL OR task.queue = ANY($2))
+                              AND (
+                                  task.max_concurrency IS NULL
+                                  OR task.max_concurrency > COALESCE(($4 ->> task.task_identifier)::integer, 0)
+                              )
+                            ORDER BY task.scheduled_for ASC, task.created_at ASC
+                            LIMIT $1
+                            FOR UPDATE SKIP LOCKED
+                        ) AS unprioritised_task
+                    ) AS aged_task
+                    -- Tasks without a priority age as the lowest priority tasks
+                    ORDER BY aged_task.scheduled_for + COALESCE(aged_task.priority, 100) * $3 ASC,
+                        aged_task.created_at ASC
+                    LIMIT $1
+                )
+            $query$
+            INTO candidate_ids
+            USING num_candidates, queues, priority_aging, num_running_by_identifier;
+        END IF;
+
+        -- Candidates may still be over their concurrency cap once claimed alongside
+        -- others, so consider more tasks when any has a cap. The candidates selected
+        -- so far are locked by this transaction, so they're selected again.
+        EXIT WHEN num_candidates > num_tasks OR NOT EXISTS (
+            SELECT 1
+            FROM task_processor_task AS task
+            WHERE task.id = ANY(candidate_ids)
+              AND task.max_concurrency IS NOT NULL
+        );
+        num_candidates := num_tasks * 10;
+    END LOOP;
+
+    -- Serialise claims of candidates with a concurrency cap, in a consistent order to
+    -- avoid deadlocks, so that concurrent workers can't both see the same free slots.
+    -- The locks are held until the end of the transaction.
+    PERFORM pg_advisory_xact_lock(hashtext('task_processor_task:' || capped_task.task_identifier))
+    FROM (
+        SELECT DISTINCT task.task_identifier
+        FROM task_processor_task AS task
+        WHERE task.id = ANY(candidate_ids)
+          AND task.max_concurrency IS NOT NULL
+        ORDER BY task.task_identifier
+    ) AS capped_task;
+
+    -- This runs as a new statement, so it sees tasks claimed by workers
+    -- which released the locks above, and claimed since the caps were checked
+    RETURN QUERY
+    WITH candidate_task AS (
+        SELECT
+            task.id,
+            task.task_identifier,
+            task.max_concurrency,
+            task.created_at,
+            -- Without priority aging, tasks are claimed by priority first
+            CASE WHEN priority_aging IS NULL THEN task.priority END AS strict_priority,
+            task.scheduled_for + COALESCE(COALESCE(task.priority, 100) * priority_aging, INTERVAL '0') AS due_at
+        FROM task_processor_task AS task
+        WHERE task.id = ANY(candidate_ids)
+    ),
+    running_task AS (
+        SELECT task.task_identifier, COUNT(*) AS num_running
+        FROM task_processor_task AS task
+        WHERE task.num_failures < 3
+          AND task.completed = FALSE
+          AND task.is_locked = TRUE
+          AND task.max_concurrency IS NOT NULL
+          AND task.task_identifier IN (
+              SELECT candidate_task.task_identifier
+              FROM candidate_task
+              WHERE candidate_task.max_concurrency IS NOT NULL
+          )
+        GROUP BY task.task_identifier
+    ),
+    ranked_task AS (
+        SELECT
+            candidate_task.*,
+            ROW_NUMBER() OVER (
+                PARTITION BY candidate_task.task_identifier
+                ORDER BY candidate_task.strict_priority ASC, candidate_task.due_at ASC, candidate_task.created_at ASC
+            ) AS identifier_rank
+        FROM candidate_task
+    ),
+    task_to_claim AS (
+        SELECT ranked_task.id
+        FROM ranked_task
+        LEFT JOIN running_task ON running_task.task_identifier = ranked_task.task_identifier
+        WHERE ranked_task.max_concurrency IS NULL
+           OR ranked_task.identifier_rank + COALESCE(running_task.num_running, 0) <= ranked_task.max_concurrency
+        -- In fair share mode, take the first task of each identifier before any second one, and so on
+        ORDER BY
+            CASE WHEN fair_share THEN ranked_task.identifier_rank ELSE 1 END ASC,
+            ranked_task.strict_priority ASC,
+            ranked_task.due_at ASC,
+            ranked_task.created_at ASC
+        LIMIT num_tasks
+    ),
+    claimed_task AS (
+        UPDATE task_processor_task AS task
+        -- Lock the tasks by setting is_locked True, so that no other workers can select them after this
+        -- transaction is complete (but the tasks are still being executed by the current worker)
+        -- The lease covers the task's timeout, and is renewed by the worker while the task
+        -- is in flight; add one minute as a grace period for overhead
+        SET is_locked = TRUE,
+            lease_expires_at = NOW() + COALESCE(task.timeout, INTERVAL '0') + INTERVAL '1 minute',
+            -- Set by the worker once the task starts, so that a failure is only
+            -- counted for started tasks if the lease expires
+            started_at = NULL
+        FROM task_to_claim
+        WHERE task.id = task_to_claim.id
+        RETURNING
+            task.id,
+            task.created_at,
+            task.scheduled_for,
+            task.task_identifier,
+            task.serialized_args,
+            task.serialized_kwargs,
+            task.num_failures,
+            task.completed,
+            task.is_locked,
+            task.priority,
+            task.timeout,
+            task.trace_context,
+            task.queue
+    )
+    -- RETURNING does not preserve the order of the subquery
+    SELECT *
+    FROM claimed_task
+    ORDER BY
+        CASE WHEN priority_aging IS NULL THEN claimed_task.priority END ASC,
+        claimed_task.scheduled_for + COALESCE(COALESCE(claimed_task.priority, 100) * priority_aging, INTERVAL '0') ASC,
+        claimed_task.created_at ASC;
+END;
+$$ LANGUAGE plpgsql
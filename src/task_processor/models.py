@@ -1,22 +1,25 @@
+import asyncio
 import logging
 import typing
 import uuid
 from datetime import datetime, timedelta
 
-import simplejson as json
-from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
-from task_processor.exceptions import TaskAbandonedError, TaskQueueFullError
+from task_processor import serialization
+from task_processor.constants import DEFAULT_TASK_QUEUE
+from task_processor.exceptions import (
+    InvalidArgumentsError,
+    TaskAbandonedError,
+    TaskQueueFullError,
+)
 from task_processor.managers import RecurringTaskManager, TaskManager
 from task_processor.task_registry import get_task, registered_tasks
 from task_processor.types import TaskCallable, TraceContext
 
 logger = logging.getLogger(__name__)
 
-_django_json_encoder_default = DjangoJSONEncoder().default
-
 
 class TaskPriority(models.IntegerChoices):
     LOWER = 100
@@ -42,14 +45,14 @@ class AbstractBaseTask(models.Model):
     @property
     def args(self) -> tuple[typing.Any, ...]:
         if self.serialized_args:
-            args = self.deserialize_data(self.serialized_args)
+            args = self._deserialize_cached(self.serialized_args)
             return tuple(args)
         return ()
 
     @property
     def kwargs(self) -> typing.Dict[str, typing.Any]:
         if self.serialized_kwargs:
-            kwargs = self.deserialize_data(self.serialized_kwargs)
+            kwargs = self._deserialize_cached(self.serialized_kwargs)
             if typing.TYPE_CHECKING:
                 assert isinstance(kwargs, dict)
             return kwargs
@@ -57,11 +60,21 @@ class AbstractBaseTask(models.Model):
 
     @staticmethod
     def serialize_data(data: typing.Any) -> str:
-        return json.dumps(data, default=_django_json_encoder_default)
+        return serialization.serialize(data)
 
     @staticmethod
     def deserialize_data(data: str) -> typing.Any:
-        return json.loads(data)
+        return serialization.deserialize(data)
+
+    def _deserialize_cached(self, data: str) -> typing.Any:
+        # Arguments are read several times per run, only parse them once.
+        # The cache is keyed by payload, so it never outlives a change to it.
+        cache: dict[str, typing.Any] = self.__dict__.setdefault(
+            "_deserialized_data", {}
+        )
+        if data not in cache:
+            cache[data] = self.deserialize_data(data)
+        return cache[data]
 
     def mark_failure(self) -> None:
         self.unlock()
@@ -73,7 +86,21 @@ class AbstractBaseTask(models.Model):
         self.is_locked = False
 
     def run(self) -> None:
-        return self.callable(*self.args, **self.kwargs)
+        if self.is_async:
+            asyncio.run(self.run_async())
+            return
+        self.callable(*self.args, **self.kwargs)
+
+    async def run_async(self) -> None:
+        await typing.cast(
+            typing.Awaitable[None],
+            self.callable(*self.args, **self.kwargs),
+        )
+
+    @property
+    def is_async(self) -> bool:
+        registered_task = registered_tasks.get(self.task_identifier)
+        return bool(registered_task and registered_task.is_async)
 
     @property
     def callable(self) -> TaskCallable[typing.Any]:
@@ -93,6 +120,21 @@ class Task(AbstractBaseTask):
     priority = models.SmallIntegerField(
         default=None, null=True, choices=TaskPriority.choices
     )
+    # pending tasks with the same key are coalesced into one
+    dedup_key = models.CharField(max_length=255, blank=True, null=True)
+    queue = models.CharField(max_length=100, default=DEFAULT_TASK_QUEUE)
+    # max number of tasks with the same identifier to run at the same time,
+    # as set on the task handler when the task was enqueued
+    max_concurrency = models.IntegerField(blank=True, null=True)
+    # denormalise the outcome of the latest run, so that task runs
+    # don't need to be recorded for every successful run
+    finished_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    # locked tasks are released for other workers once this has passed
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    # set once the claimed batch of a task starts running, so that a failure is
+    # counted if its lease expires, but not if it was claimed and never started
+    started_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         # We have customised the migration in 0004 to only apply this change to postgres databases
@@ -102,7 +144,39 @@ class Task(AbstractBaseTask):
                 name="incomplete_tasks_idx",
                 fields=["scheduled_for"],
                 condition=models.Q(completed=False, num_failures__lt=3),
-            )
+            ),
+            models.Index(
+                name="incomplete_tasks_ident_idx",
+                fields=["task_identifier"],
+                condition=models.Q(completed=False, num_failures__lt=3),
+            ),
+            models.Index(
+                name="incomplete_tasks_queue_idx",
+                fields=["queue", "scheduled_for"],
+                condition=models.Q(completed=False, num_failures__lt=3),
+            ),
+            models.Index(
+                name="incomplete_tasks_priority_idx",
+                fields=["priority", "scheduled_for"],
+                condition=models.Q(completed=False, num_failures__lt=3),
+            ),
+            models.Index(
+                name="locked_tasks_lease_idx",
+                fields=["lease_expires_at"],
+                condition=models.Q(completed=False, is_locked=True),
+            ),
+            models.Index(
+                name="incomplete_capped_tasks_idx",
+                fields=["task_identifier", "is_locked"],
+                condition=models.Q(completed=False, max_concurrency__isnull=False),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                name="pending_task_dedup_key_uniq",
+                fields=["task_identifier", "dedup_key"],
+                condition=models.Q(completed=False, is_locked=False, num_failures=0),
+            ),
         ]
 
     @classmethod
@@ -117,7 +191,15 @@ class Task(AbstractBaseTask):
         kwargs: typing.Dict[str, typing.Any] | None = None,
         timeout: timedelta | None = timedelta(seconds=60),
         trace_context: TraceContext | None = None,
+        dedup_key: str | None = None,
+        queue: str = DEFAULT_TASK_QUEUE,
+        max_concurrency: int | None = None,
     ) -> "Task":
+        try:
+            serialized_args = cls.serialize_data(args or tuple())
+            serialized_kwargs = cls.serialize_data(kwargs or dict())
+        except TypeError as e:
+            raise InvalidArgumentsError("Inputs are not serializable.") from e
         if queue_size and cls._is_queue_full(task_identifier, queue_size):
             raise TaskQueueFullError(
                 f"Queue for task {task_identifier} is full. "
@@ -127,22 +209,33 @@ class Task(AbstractBaseTask):
             task_identifier=task_identifier,
             scheduled_for=scheduled_for,
             priority=priority,
-            serialized_args=cls.serialize_data(args or tuple()),
-            serialized_kwargs=cls.serialize_data(kwargs or dict()),
+            serialized_args=serialized_args,
+            serialized_kwargs=serialized_kwargs,
             timeout=timeout,
             trace_context=trace_context,
+            dedup_key=dedup_key,
+            queue=queue,
+            max_concurrency=max_concurrency,
         )
 
     @classmethod
     def _is_queue_full(cls, task_identifier: str, queue_size: int) -> bool:
-        return (
-            cls.objects.filter(
-                task_identifier=task_identifier,
-                completed=False,
-                num_failures__lt=3,
-            ).count()
-            > queue_size
-        )
+        return cls.get_queue_capacity(task_identifier, queue_size) < 1
+
+    @classmethod
+    def get_queue_capacity(cls, task_identifier: str, queue_size: int) -> int:
+        """
+        Return how many more tasks can be enqueued for `task_identifier`
+        before its queue is considered full.
+        """
+        # Stop counting once the queue is full, so that the cost of
+        # enqueueing does not grow with the backlog.
+        queued = cls.objects.filter(
+            task_identifier=task_identifier,
+            completed=False,
+            num_failures__lt=3,
+        )[: queue_size + 1].count()
+        return max(queue_size - queued + 1, 0)
 
     def mark_failure(self) -> None:
         super().mark_failure()
@@ -152,6 +245,10 @@ class Task(AbstractBaseTask):
         super().mark_success()
         self.completed = True
 
+    def unlock(self) -> None:
+        super().unlock()
+        self.lease_expires_at = None
+
 
 class RecurringTask(AbstractBaseTask):
     MAX_CONSECUTIVE_FAILURES = 4
@@ -163,6 +260,8 @@ class RecurringTask(AbstractBaseTask):
     timeout = models.DurationField(default=timedelta(minutes=30))
 
     last_picked_at = models.DateTimeField(blank=True, null=True)
+    # unknown until the task is first picked up
+    next_run_at = models.DateTimeField(blank=True, null=True)
     is_disabled = models.BooleanField(default=False)
     num_consecutive_failures = models.IntegerField(default=0)
     objects: RecurringTaskManager = RecurringTaskManager()
@@ -174,6 +273,13 @@ class RecurringTask(AbstractBaseTask):
                 name="unique_run_every_tasks",
             ),
         ]
+        indexes = [
+            models.Index(
+                name="recurring_task_next_run_idx",
+                fields=["next_run_at"],
+                condition=models.Q(is_disabled=False),
+            ),
+        ]
 
     def unlock(self) -> None:
         self.is_locked = False
@@ -217,17 +323,26 @@ class RecurringTask(AbstractBaseTask):
 
     @property
     def should_execute(self) -> bool:
+        return self.get_next_run_at() <= timezone.now()
+
+    def get_next_run_at(
+        self,
+        last_task_run: "RecurringTaskRun | None" = None,
+    ) -> datetime:
+        """
+        Return when the task is next due to run, given its latest run,
+        which is fetched if not provided.
+        """
         now = timezone.now()
-        last_task_run = (
-            self.task_runs.order_by("-started_at").first() if self.pk else None
-        )
+        if last_task_run is None and self.pk:
+            last_task_run = self.task_runs.order_by("-started_at").first()
 
         if not last_task_run:
-            # If we have never run this task, then we should execute it only if
-            # the time has passed after which we want to ensure this task runs.
-            # This allows us to control when intensive tasks should be run.
+            # If we have never run this task, then we should execute it only
+            # once the time has passed after which we want to ensure this task
+            # runs. This allows us to control when intensive tasks should be run.
             if not self.first_run_time:
-                return True
+                return now
             first_run_today = now.replace(
                 hour=self.first_run_time.hour,
                 minute=self.first_run_time.minute,
@@ -238,26 +353,28 @@ class RecurringTask(AbstractBaseTask):
             time_difference = (now - first_run_today).total_seconds()
             if time_difference > 12 * 3600:
                 # first_run_today appears far in the past; it refers to tomorrow.
-                return False
+                return first_run_today + timedelta(days=1)
             if time_difference < -12 * 3600:
                 # first_run_today appears far in the future; it refers to yesterday.
-                return True
-            return now >= first_run_today
+                return first_run_today - timedelta(days=1)
+            return first_run_today
 
         # if the last run was at t- run_every, then we should execute it
-        if (timezone.now() - last_task_run.started_at) >= self.run_every:
-            return True
-
-        # if the last run was not a success and we do not have
-        # more than 3 failures in t- run_every, then we should execute it
-        if (
-            last_task_run.result != TaskResult.SUCCESS.name
-            and self.task_runs.filter(started_at__gte=(now - self.run_every)).count()
-            <= 3
-        ):
-            return True
-        # otherwise, we should not execute it
-        return False
+        next_run_at: datetime = last_task_run.started_at + self.run_every
+
+        # if the last run was not a success, then we should execute it
+        # as soon as we do not have more than 3 runs in t- run_every
+        if last_task_run.result != TaskResult.SUCCESS.name:
+            fourth_latest_started_at = (
+                self.task_runs.order_by("-started_at")
+                .values_list("started_at", flat=True)[3:4]
+                .first()
+            )
+            if fourth_latest_started_at is None:
+                return last_task_run.started_at
+            next_run_at = min(next_run_at, fourth_latest_started_at + self.run_every)
+
+        return next_run_at
 
     @property
     def is_task_registered(self) -> bool:
@@ -294,6 +411,21 @@ class RecurringTaskRun(AbstractTaskRun):
     )
 
 
+class TaskProcessorHeartbeat(models.Model):
+    """
+    Latest state of a task runner thread, written periodically by
+    the task processor it belongs to.
+    """
+
+    # `{hostname}:{pid}:{thread name}`
+    worker_id = models.CharField(max_length=255, unique=True)
+    last_seen_at = models.DateTimeField()
+    # when the runner last started checking for tasks, if ever
+    last_checked_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    last_claimed_at = models.DateTimeField(blank=True, null=True)
+    num_in_flight = models.IntegerField(default=0)
+
+
 class HealthCheckModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     uuid = models.UUIDField(unique=True, blank=False, null=False)
@@ -1,6 +1,20 @@
+import typing
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Min, Q
 from django.utils import timezone
 
 from task_processor.models import Task
+from task_processor.types import MonitoringInfo, WaitingTasksInfo
+
+if typing.TYPE_CHECKING:
+    from django.db.models.query import QuerySet
+
+MONITORING_INFO_CACHE_KEY = "task_processor:monitoring_info"
+DEFAULT_MONITORING_INFO_CACHE_SECONDS = 5
 
 
 def get_num_waiting_tasks() -> int:
@@ -10,3 +24,171 @@ def get_num_waiting_tasks() -> int:
         scheduled_for__lt=timezone.now(),
         is_locked=False,
     ).count()
+
+
+def get_task_counts(
+    database: str,
+    now: datetime,
+) -> typing.Iterable[tuple[str, int | None, int, int, datetime | None]]:
+    """
+    Return the number of due tasks waiting and locked, along with when the
+    oldest waiting one was due, per task identifier and priority.
+    """
+    return (
+        _get_due_tasks(database, now)
+        .values_list("task_identifier", "priority")
+        .annotate(
+            waiting=Count("id", filter=Q(is_locked=False)),
+            locked=Count("id", filter=Q(is_locked=True)),
+            oldest_scheduled_for=Min("scheduled_for", filter=Q(is_locked=False)),
+        )
+        .order_by()
+    )
+
+
+def get_monitoring_info() -> MonitoringInfo:
+    """
+    Return the number of waiting tasks, broken down by database, task
+    identifier and priority, along with how long the oldest has waited.
+
+    The result is cached for `TASK_PROCESSOR_MONITORING_CACHE_SECONDS`, so that
+    polling dashboards don't each scan the task table.
+    """
+    monitoring_info: MonitoringInfo | None = cache.get(MONITORING_INFO_CACHE_KEY)
+    if monitoring_info is None:
+        monitoring_info = _get_monitoring_info()
+        cache.set(
+            MONITORING_INFO_CACHE_KEY,
+            monitoring_info,
+            timeout=getattr(
+                settings,
+                "TASK_PROCESSOR_MONITORING_CACHE_SECONDS",
+                DEFAULT_MONITORING_INFO_CACHE_SECONDS,
+            ),
+        )
+    return monitoring_info
+
+
+def _get_monitoring_info() -> MonitoringInfo:
+    now = timezone.now()
+    breakdown: list[WaitingTasksInfo] = []
+    oldest_scheduled_fors: list[datetime] = []
+    is_estimate = False
+    for database in settings.TASK_PROCESSOR_DATABASES:
+        sample_percent = _get_sample_percent(database)
+        is_estimate = is_estimate or sample_percent is not None
+        waiting_tasks = list(_get_waiting_tasks(database, now, sample_percent))
+        if sample_percent is None:
+            oldest_scheduled_fors.extend(row[3] for row in waiting_tasks)
+        elif oldest_scheduled_for := _get_oldest_scheduled_for(database, now):
+            # The sampled pages may not include the oldest task
+            oldest_scheduled_fors.append(oldest_scheduled_for)
+        for (
+            task_identifier,
+            priority,
+            waiting,
+            oldest_scheduled_for,
+        ) in waiting_tasks:
+            breakdown.append(
+                {
+                    "database": database,
+                    "task_identifier": task_identifier,
+                    "priority": priority,
+                    "waiting": waiting,
+                    "oldest_waiting_seconds": (
+                        now - oldest_scheduled_for
+                    ).total_seconds(),
+                }
+            )
+    breakdown.sort(
+        key=lambda info: (
+            -info["waiting"],
+            info["database"],
+            info["task_identifier"],
+            (info["priority"] is None, info["priority"]),
+        )
+    )
+    return {
+        "waiting": sum(info["waiting"] for info in breakdown),
+        "oldest_waiting_seconds": (
+            (now - min(oldest_scheduled_fors)).total_seconds()
+            if oldest_scheduled_fors
+            else None
+        ),
+        "is_estimate": is_estimate,
+        "breakdown": breakdown,
+    }
+
+
+def _get_sample_percent(database: str) -> float | None:
+    """
+    Return the percentage of the task table to sample, if the planner
+    estimates it has more rows than `TASK_PROCESSOR_MONITORING_SAMPLE_ROWS`.
+    """
+    sample_rows: int | None = getattr(
+        settings, "TASK_PROCESSOR_MONITORING_SAMPLE_ROWS", None
+    )
+    connection = connections[database]
+    if sample_rows is None or connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)",
+            [Task._meta.db_table],
+        )
+        (num_rows,) = cursor.fetchone()
+    if num_rows <= sample_rows:
+        return None
+    return float(sample_rows / num_rows * 100)
+
+
+def _get_waiting_tasks(
+    database: str,
+    now: datetime,
+    sample_percent: float | None,
+) -> typing.Iterable[tuple[str, int | None, int, datetime]]:
+    if sample_percent is None:
+        return (
+            _get_due_tasks(database, now)
+            .filter(is_locked=False)
+            .values_list("task_identifier", "priority")
+            .annotate(waiting=Count("id"), oldest_scheduled_for=Min("scheduled_for"))
+            .order_by()
+        )
+
+    # Pages are sampled at random, then counts are scaled back up
+    with connections[database].cursor() as cursor:
+        cursor.execute(
+            "SELECT task_identifier, priority, "
+            "ROUND(COUNT(*) * 100 / %s)::integer, MIN(scheduled_for) "
+            f"FROM {Task._meta.db_table} TABLESAMPLE SYSTEM (%s) "
+            "WHERE num_failures < 3 AND completed = FALSE "
+            "AND scheduled_for < %s AND is_locked = FALSE "
+            "GROUP BY task_identifier, priority",
+            [sample_percent, sample_percent, now],
+        )
+        return typing.cast(
+            list[tuple[str, int | None, int, datetime]],
+            cursor.fetchall(),
+        )
+
+
+def _get_oldest_scheduled_for(database: str, now: datetime) -> datetime | None:
+    """
+    Return when the oldest waiting task was due, exactly, as opposed to
+    the breakdown of a sampled task table.
+    """
+    oldest_scheduled_for: datetime | None = (
+        _get_due_tasks(database, now)
+        .filter(is_locked=False)
+        .aggregate(oldest_scheduled_for=Min("scheduled_for"))["oldest_scheduled_for"]
+    )
+    return oldest_scheduled_for
+
+
+def _get_due_tasks(database: str, now: datetime) -> "QuerySet[Task]":
+    return Task.objects.using(database).filter(
+        num_failures__lt=3,
+        completed=False,
+        scheduled_for__lt=now,
+    )
@@ -0,0 +1,57 @@
+import select
+import typing
+
+from django.db import connections
+
+from task_processor.constants import TASK_ENQUEUED_CHANNEL
+
+if typing.TYPE_CHECKING:
+    from django.db.backends.base.base import BaseDatabaseWrapper
+
+
+def notify_task_enqueued(database: str) -> None:
+    """
+    Let task processors listening on `database` know a task is ready.
+
+    The notification is only delivered once the current transaction commits,
+    so listeners never wake up for tasks they can't see yet.
+    """
+    connection = connections[database]
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, '')", [TASK_ENQUEUED_CHANNEL])
+
+
+def listen_for_enqueued_tasks(connection: "BaseDatabaseWrapper") -> bool:
+    """
+    Subscribe `connection` to task enqueued notifications.
+
+    Return `False` if the database does not support notifications.
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {TASK_ENQUEUED_CHANNEL}")
+    return True
+
+
+def wait_for_enqueued_tasks(
+    connections_: list["BaseDatabaseWrapper"],
+    timeout: float,
+) -> bool:
+    """
+    Block until a task enqueued notification is received on any of the
+    connections, or until `timeout` seconds pass.
+
+    Return `True` if a notification was received.
+    """
+    raw_connections = [connection.connection for connection in connections_]
+    readable, _, _ = select.select(raw_connections, [], [], timeout)
+    received = False
+    for raw_connection in readable:
+        raw_connection.poll()
+        if raw_connection.notifies:
+            raw_connection.notifies.clear()
+            received = True
+    return received
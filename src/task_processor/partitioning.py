@@ -0,0 +1,331 @@
+"""
+Optional Postgres range partitioning of task run tables by `started_at`.
+
+Once partitioned, task runs past their retention period are removed by
+dropping whole partitions, instead of deleting rows one by one.
+
+Partitions are named after the (exclusive) upper bound of their range,
+e.g. `task_processor_taskrun_p20250102` holds runs started before
+2 January 2025, and after the upper bound of the previous partition.
+Runs falling outside of every partition land in a default partition.
+"""
+
+import logging
+import typing
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import ForeignKey, Model
+
+from task_processor.models import AbstractTaskRun
+
+if typing.TYPE_CHECKING:
+    from django.db.backends.base.base import BaseDatabaseWrapper
+    from django.db.backends.utils import CursorWrapper
+
+logger = logging.getLogger(__name__)
+
+NUM_PARTITIONS_AHEAD = 7
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_PARTITION_SUFFIX_FORMAT = "%Y%m%d"
+
+
+def get_partition_interval() -> timedelta | None:
+    """
+    Return the time range covered by each partition, or `None`
+    if partitioning is disabled (the default).
+    """
+    interval_days: int | None = getattr(
+        settings, "TASK_RUN_PARTITION_INTERVAL_DAYS", None
+    )
+    return timedelta(days=interval_days) if interval_days else None
+
+
+def is_partitioned(model: type[AbstractTaskRun]) -> bool:
+    connection = _get_connection(model)
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(%s))",
+            [model._meta.db_table],
+        )
+        return bool(cursor.fetchone()[0])
+
+
+def manage_partitions(
+    model: type[AbstractTaskRun],
+    retention: timedelta | None,
+    interval: timedelta,
+    now: datetime,
+) -> None:
+    """
+    Partition the `model` table if it isn't already, then make sure
+    partitions exist ahead of `now`, and drop partitions older than `retention`
+    unless it is `None`.
+    """
+    connection = _get_connection(model)
+    if connection.vendor != "postgresql":
+        return
+    boundary: datetime | None = None
+    if not is_partitioned(model):
+        # Runs started before the table is partitioned must fit the existing
+        # table's partition, so leave a whole interval to partition it in.
+        boundary = _get_interval_start(now, interval) + interval * 2
+        _prepare_partition_table(connection, model, boundary)
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            # Pending deferred foreign key checks would block the DDL below
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            if boundary is not None:
+                _partition_table(cursor, model, boundary)
+            _create_partitions(cursor, model, interval, now)
+            if retention is not None:
+                _drop_partitions(cursor, model, now - retention)
+
+
+def _prepare_partition_table(
+    connection: "BaseDatabaseWrapper",
+    model: type[AbstractTaskRun],
+    boundary: datetime,
+) -> None:
+    """
+    Do the slow work of attaching the `model` table as the partition for runs
+    started before `boundary` ahead of `_partition_table`, without blocking
+    writes to it: build the primary key index including `started_at`, and
+    check that every run fits the partition.
+    """
+    table = model._meta.db_table
+    index = _get_primary_key_index_name(table)
+    check = _get_boundary_check_name(table)
+    quote = connection.ops.quote_name
+    logger.info("Preparing to partition table %s", table)
+
+    with connection.cursor() as cursor:
+        # Pending deferred foreign key checks would block the DDL below
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        # A concurrent build that failed leaves an invalid index behind
+        cursor.execute(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+            [index],
+        )
+        if (row := cursor.fetchone()) and not row[0]:
+            cursor.execute(f"DROP INDEX {quote(index)}")
+        # Indexes can't be built concurrently in a transaction
+        concurrently = "" if connection.in_atomic_block else " CONCURRENTLY"
+        cursor.execute(
+            f"CREATE UNIQUE INDEX{concurrently} IF NOT EXISTS {quote(index)} "
+            f"ON {quote(table)} (id, started_at)"
+        )
+        # Validating the constraint doesn't block writes, unlike the full scan
+        # of the table attaching it as a partition would otherwise take.
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} DROP CONSTRAINT IF EXISTS {quote(check)}"
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(check)} "
+            f"CHECK (started_at < '{boundary.isoformat()}') NOT VALID"
+        )
+        cursor.execute(f"ALTER TABLE {quote(table)} VALIDATE CONSTRAINT {quote(check)}")
+
+
+def _partition_table(
+    cursor: "CursorWrapper",
+    model: type[AbstractTaskRun],
+    boundary: datetime,
+) -> None:
+    """
+    Replace the `model` table by a partitioned one, attaching the existing
+    table as the partition for runs started before `boundary`.
+
+    This takes an exclusive lock on the table, but neither copies nor scans
+    any rows, as the index and check built by `_prepare_partition_table`
+    are reused, along with the existing foreign keys and indexes.
+    """
+    table = model._meta.db_table
+    legacy_table = _get_partition_name(table, boundary)
+    quote = cursor.db.ops.quote_name
+    logger.info("Partitioning table %s", table)
+
+    cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+    cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(legacy_table)}")
+    cursor.execute(
+        f"CREATE TABLE {quote(table)} "
+        f"(LIKE {quote(legacy_table)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+        "PARTITION BY RANGE (started_at)"
+    )
+
+    # Keep ids unique across the old and new partitions
+    cursor.execute(
+        "SELECT pg_get_serial_sequence(%s, 'id'), pg_get_serial_sequence(%s, 'id')",
+        [legacy_table, table],
+    )
+    legacy_sequence, sequence = cursor.fetchone()
+    if sequence is None:
+        # Serial columns keep using the existing sequence, which would
+        # otherwise be dropped along with the old partition.
+        cursor.execute(
+            f"ALTER SEQUENCE {legacy_sequence} OWNED BY {quote(table)}.{quote('id')}"
+        )
+    else:
+        cursor.execute("SELECT setval(%s, nextval(%s))", [sequence, legacy_sequence])
+        # Partitions can't have identity columns of their own
+        cursor.execute(
+            f"ALTER TABLE {quote(legacy_table)} ALTER COLUMN id DROP IDENTITY"
+        )
+
+    # Unique constraints on a partitioned table must include the partition key
+    cursor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, started_at)")
+    for field in model._meta.concrete_fields:
+        if isinstance(field, ForeignKey):
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} ADD FOREIGN KEY ({quote(field.column)}) "
+                f"REFERENCES {quote(field.target_field.model._meta.db_table)} "
+                f"({quote(field.target_field.column)}) "
+                "DEFERRABLE INITIALLY DEFERRED"
+            )
+        if field.db_index:  # type: ignore[attr-defined]
+            cursor.execute(f"CREATE INDEX ON {quote(table)} ({quote(field.column)})")
+
+    cursor.execute(
+        "SELECT conname FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+        [legacy_table],
+    )
+    (legacy_primary_key,) = cursor.fetchone()
+    cursor.execute(
+        f"ALTER TABLE {quote(legacy_table)} DROP CONSTRAINT {quote(legacy_primary_key)}"
+    )
+    cursor.execute(
+        f"ALTER TABLE {quote(legacy_table)} ADD PRIMARY KEY "
+        f"USING INDEX {quote(_get_primary_key_index_name(table))}"
+    )
+    cursor.execute(
+        f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(legacy_table)} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+    )
+    cursor.execute(
+        f"ALTER TABLE {quote(legacy_table)} "
+        f"DROP CONSTRAINT {quote(_get_boundary_check_name(table))}"
+    )
+    cursor.execute(
+        f"CREATE TABLE {quote(f'{table}_default')} PARTITION OF {quote(table)} DEFAULT"
+    )
+
+
+def _create_partitions(
+    cursor: "CursorWrapper",
+    model: type[AbstractTaskRun],
+    interval: timedelta,
+    now: datetime,
+) -> None:
+    table = model._meta.db_table
+    default_partition = f"{table}_default"
+    quote = cursor.db.ops.quote_name
+    partition_ends = _get_partition_ends(cursor, table)
+    # Runs older than the current interval stay in the default partition,
+    # until dropped along with it past their retention period.
+    start = max([*partition_ends, _get_interval_start(now, interval)])
+    ranges: list[tuple[datetime, datetime]] = []
+    while start < now + interval * NUM_PARTITIONS_AHEAD:
+        ranges.append((start, start + interval))
+        start += interval
+    if not ranges:
+        return
+    first_start, last_end = ranges[0][0], ranges[-1][1]
+
+    # If partitions were not created in a while, runs for the new ranges
+    # have landed in the default partition, and must be moved out of it
+    # before the new partitions can be created.
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {quote(default_partition)} "
+        "WHERE started_at >= %s AND started_at < %s)",
+        [first_start, last_end],
+    )
+    (has_default_runs,) = cursor.fetchone()
+    if has_default_runs:
+        logger.info("Moving runs of %s out of its default partition", table)
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(default_partition)}"
+        )
+
+    for start, end in ranges:
+        logger.info("Creating partition of %s for runs before %s", table, end)
+        cursor.execute(
+            f"CREATE TABLE {quote(_get_partition_name(table, end))} "
+            f"PARTITION OF {quote(table)} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+    if has_default_runs:
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {quote(default_partition)} "
+            "WHERE started_at >= %s AND started_at < %s RETURNING *) "
+            f"INSERT INTO {quote(table)} SELECT * FROM moved",
+            [first_start, last_end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION "
+            f"{quote(default_partition)} DEFAULT"
+        )
+
+
+def _drop_partitions(
+    cursor: "CursorWrapper",
+    model: type[AbstractTaskRun],
+    delete_before: datetime,
+) -> None:
+    table = model._meta.db_table
+    quote = cursor.db.ops.quote_name
+    for partition_end in _get_partition_ends(cursor, table):
+        if partition_end <= delete_before:
+            partition = _get_partition_name(table, partition_end)
+            logger.info("Dropping partition %s", partition)
+            cursor.execute(f"DROP TABLE {quote(partition)}")
+    # The default partition only holds runs for ranges without a partition
+    cursor.execute(
+        f"DELETE FROM {quote(f'{table}_default')} WHERE started_at < %s",
+        [delete_before],
+    )
+
+
+def _get_partition_ends(cursor: "CursorWrapper", table: str) -> list[datetime]:
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(%s)",
+        [table],
+    )
+    prefix = f"{table}_p"
+    return sorted(
+        datetime.strptime(
+            partition.removeprefix(prefix),
+            _PARTITION_SUFFIX_FORMAT,
+        ).replace(tzinfo=dt_timezone.utc)
+        for (partition,) in cursor.fetchall()
+        if partition.startswith(prefix)
+    )
+
+
+def _get_partition_name(table: str, end: datetime) -> str:
+    return f"{table}_p{end.astimezone(dt_timezone.utc):{_PARTITION_SUFFIX_FORMAT}}"
+
+
+def _get_primary_key_index_name(table: str) -> str:
+    return f"{table}_id_started_at_uniq"
+
+
+def _get_boundary_check_name(table: str) -> str:
+    return f"{table}_started_at_boundary_check"
+
+
+def _get_interval_start(value: datetime, interval: timedelta) -> datetime:
+    return _EPOCH + (value - _EPOCH) // interval * interval
+
+
+def _get_connection(model: type[Model]) -> "BaseDatabaseWrapper":
+    return connections[router.db_for_write(model)]
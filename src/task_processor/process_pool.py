@@ -0,0 +1,191 @@
+import importlib
+import logging
+import multiprocessing
+import threading
+import traceback
+import typing
+from multiprocessing.connection import Connection
+
+from task_processor.exceptions import TaskProcessingError
+from task_processor.task_registry import get_task
+
+if typing.TYPE_CHECKING:
+    from multiprocessing.context import SpawnProcess
+
+    from task_processor.models import AbstractBaseTask
+
+logger = logging.getLogger(__name__)
+
+# Processes are spawned rather than forked, as forking a process
+# running several threads is unsafe.
+_context = multiprocessing.get_context("spawn")
+
+
+class TaskProcessPool:
+    """
+    Execute tasks in a bounded pool of worker processes, so that CPU-bound
+    tasks can run in parallel without holding the task processor's GIL.
+
+    Processes are started on demand, and reused across tasks. A process
+    running a task that times out is killed, and replaced on demand.
+    """
+
+    def __init__(self, max_processes: int) -> None:
+        if max_processes < 1:
+            raise ValueError("Number of processes must be at least one")
+        self.max_processes = max_processes
+        self._semaphore = threading.BoundedSemaphore(max_processes)
+        self._lock = threading.Lock()
+        self._idle_processes: list[TaskProcess] = []
+
+    def run(self, task: "AbstractBaseTask") -> None:
+        with self._semaphore:
+            with self._lock:
+                process = (
+                    self._idle_processes.pop()
+                    if self._idle_processes
+                    else TaskProcess()
+                )
+            try:
+                process.run(task)
+            finally:
+                if process.is_alive():
+                    with self._lock:
+                        self._idle_processes.append(process)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            processes, self._idle_processes = self._idle_processes, []
+        for process in processes:
+            process.stop()
+
+
+class TaskProcess:
+    def __init__(self) -> None:
+        self._connection, child_connection = _context.Pipe()
+        self._process: "SpawnProcess" = _context.Process(
+            target=_serve,
+            args=(child_connection,),
+            name="TaskProcess",
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+        try:
+            # Wait for the process to set up Django, so that it
+            # does not count towards the first task's timeout.
+            self._connection.recv()
+        except EOFError:
+            self.kill()
+            raise TaskProcessingError(
+                f"Task process failed to start with code {self._process.exitcode}"
+            )
+
+    def is_alive(self) -> bool:
+        return self._process.is_alive()
+
+    def run(self, task: "AbstractBaseTask") -> None:
+        function = get_task(task.task_identifier).task_function
+        self._connection.send(
+            (
+                function.__module__,
+                function.__qualname__,
+                task.serialized_args,
+                task.serialized_kwargs,
+            )
+        )
+        timeout = task.timeout.total_seconds() if task.timeout else None
+        if not self._connection.poll(timeout):
+            self.kill()
+            raise TimeoutError(
+                f"Task '{task.task_identifier}' timed out after {timeout} seconds"
+            )
+        try:
+            error: Exception | None = self._connection.recv()
+        except EOFError:
+            self.kill()
+            raise TaskProcessingError(
+                f"Process running task '{task.task_identifier}' exited "
+                f"unexpectedly with code {self._process.exitcode}"
+            )
+        if error:
+            raise error
+
+    def kill(self) -> None:
+        self._process.kill()
+        self._process.join()
+        self._connection.close()
+
+    def stop(self) -> None:
+        self._connection.close()  # The process exits once the pipe is closed
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self.kill()
+
+
+def _serve(connection: Connection) -> None:
+    import django
+
+    django.setup()
+
+    from django.db import close_old_connections, connections
+
+    from task_processor.models import AbstractBaseTask
+
+    connection.send(None)  # Ready to accept tasks
+
+    while True:
+        try:
+            module_name, qualname, serialized_args, serialized_kwargs = (
+                connection.recv()
+            )
+        except EOFError:
+            break
+
+        # Close connections that errored, or outlived `CONN_MAX_AGE`,
+        # in a previous task, as Django does between requests.
+        close_old_connections()
+
+        error: Exception | None = None
+        try:
+            function = _import_task_function(module_name, qualname)
+            function(
+                *(
+                    AbstractBaseTask.deserialize_data(serialized_args)
+                    if serialized_args
+                    else ()
+                ),
+                **(
+                    AbstractBaseTask.deserialize_data(serialized_kwargs)
+                    if serialized_kwargs
+                    else {}
+                ),
+            )
+        except Exception as e:
+            error = e
+
+        try:
+            connection.send(error)
+        except Exception:
+            # The error can't be pickled, send its traceback instead.
+            connection.send(
+                TaskProcessingError(
+                    "".join(traceback.format_exception(typing.cast(Exception, error)))
+                )
+            )
+
+    connections.close_all()
+
+
+def _import_task_function(
+    module_name: str,
+    qualname: str,
+) -> typing.Callable[..., typing.Any]:
+    task_function: typing.Any = importlib.import_module(module_name)
+    for attribute in qualname.split("."):
+        task_function = getattr(task_function, attribute)
+    # Task handlers are replaced by their `TaskHandler` wrapper in the module
+    return typing.cast(
+        typing.Callable[..., typing.Any],
+        getattr(task_function, "unwrapped", task_function),
+    )
@@ -1,13 +1,17 @@
+import asyncio
 import logging
+import random
+import threading
 import traceback
 import typing
 from concurrent.futures import ThreadPoolExecutor
-from contextlib import ExitStack
-from datetime import timedelta
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
 from importlib.metadata import version
 
 from django.conf import settings
-from django.db import close_old_connections
+from django.db import close_old_connections, connections
 from django.utils import timezone
 from opentelemetry import context as otel_context
 from opentelemetry import propagate, trace
@@ -23,9 +27,11 @@ from task_processor.models import (
     TaskResult,
     TaskRun,
 )
-from task_processor.task_registry import TaskType, get_task
+from task_processor.process_pool import TaskProcessPool
+from task_processor.task_registry import TaskExecutionBackend, TaskType, get_task
 
 T = typing.TypeVar("T", bound=AbstractBaseTask)
+R = typing.TypeVar("R")
 AnyTaskRun = TaskRun | RecurringTaskRun
 
 logger = logging.getLogger(__name__)
@@ -33,43 +39,239 @@ logger = logging.getLogger(__name__)
 UNREGISTERED_RECURRING_TASK_GRACE_PERIOD = timedelta(minutes=30)
 
 
-def run_tasks(database: str, num_tasks: int = 1) -> list[TaskRun]:
+class TaskWorker:
+    """
+    Execute tasks on a long-lived thread, so that database connections and
+    other thread-locals are reused across tasks.
+
+    The thread is only replaced when a task times out, in which case it is
+    abandoned to finish (or hang) on its own.
+
+    If `event_loop` is provided, asynchronous tasks are run on it instead,
+    so that many of them can be awaited concurrently. Likewise, tasks using
+    the process execution backend are run in `process_pool`, if provided.
+    """
+
+    def __init__(
+        self,
+        event_loop: asyncio.AbstractEventLoop | None = None,
+        process_pool: TaskProcessPool | None = None,
+    ) -> None:
+        self.event_loop = event_loop
+        self.process_pool = process_pool
+        self.last_claimed_at: datetime | None = None
+        self.claimed_tasks: list[tuple[str, AbstractBaseTask]] = []
+        self._executor: ThreadPoolExecutor | None = None
+        # Identities of claimed tasks, guarded by `_lock` as
+        # tasks may be released from another thread.
+        self._started_tasks: set[int] = set()
+        self._released_tasks: set[int] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def num_in_flight(self) -> int:
+        return len(self.claimed_tasks)
+
+    @contextmanager
+    def claim(
+        self,
+        database: str,
+        tasks: typing.Iterable[AbstractBaseTask],
+    ) -> typing.Iterator[None]:
+        """
+        Hold `tasks`, claimed from `database`, as in flight until the wrapped
+        block exits, so that their leases are renewed meanwhile.
+        """
+        claimed_tasks = [(database, task) for task in tasks]
+        self.last_claimed_at = timezone.now()
+        # Replace rather than mutate the list, as it's read from other threads
+        self.claimed_tasks = [*self.claimed_tasks, *claimed_tasks]
+        try:
+            yield
+        finally:
+            self.claimed_tasks = [
+                claimed_task
+                for claimed_task in self.claimed_tasks
+                if claimed_task not in claimed_tasks
+            ]
+            with self._lock:
+                for _, task in claimed_tasks:
+                    self._started_tasks.discard(id(task))
+                    self._released_tasks.discard(id(task))
+
+    def start(self, task: AbstractBaseTask) -> bool:
+        """
+        Mark the claimed `task` as started, unless it was released.
+        """
+        with self._lock:
+            if id(task) in self._released_tasks:
+                return False
+            self._started_tasks.add(id(task))
+            return True
+
+    def release(self) -> list[tuple[str, Task]]:
+        """
+        Give up the claimed tasks which haven't started yet, so that they
+        are skipped, and return them along with their database.
+
+        Recurring tasks are started as soon as they are claimed,
+        and so are never released.
+        """
+        with self._lock:
+            released_tasks = [
+                (database, task)
+                for database, task in self.claimed_tasks
+                if isinstance(task, Task)
+                and id(task) not in self._started_tasks
+                and id(task) not in self._released_tasks
+            ]
+            self._released_tasks.update(id(task) for _, task in released_tasks)
+        return released_tasks
+
+    def run(self, task: AbstractBaseTask) -> None:
+        if task.is_async and self.event_loop:
+            self.run_coroutine(_await_task(task))
+            return
+        if (
+            self.process_pool
+            and get_task(task.task_identifier).execution_backend
+            == TaskExecutionBackend.PROCESS
+        ):
+            self.process_pool.run(task)
+            return
+        future = self._get_executor().submit(self._run, task)
+        timeout = task.timeout.total_seconds() if task.timeout else None
+        try:
+            future.result(timeout=timeout)  # Wait for completion or timeout
+        except FutureTimeoutError:
+            # Don't wait for the worker thread, as this would block
+            # the TaskRunner thread until the timed out task finishes.
+            self.abandon()
+            raise
+
+    def run_coroutine(
+        self,
+        coroutine: typing.Coroutine[typing.Any, typing.Any, R],
+    ) -> R:
+        """
+        Block until `coroutine` completes on the event loop, or on the
+        worker thread if there is no event loop.
+        """
+        if self.event_loop:
+            return asyncio.run_coroutine_threadsafe(coroutine, self.event_loop).result()
+        return self._get_executor().submit(asyncio.run, coroutine).result()
+
+    def abandon(self) -> None:
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False)
+        self._executor = None
+
+    def shutdown(self) -> None:
+        if self._executor is None:
+            return
+        self._executor.submit(connections.close_all)
+        self.abandon()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="TaskWorker",
+            )
+        return self._executor
+
+    @staticmethod
+    def _run(task: AbstractBaseTask) -> None:
+        # Close connections that errored, or outlived `CONN_MAX_AGE`,
+        # in a previous task, as Django does between requests.
+        close_old_connections()
+        task.run()
+
+
+def run_tasks(
+    database: str,
+    num_tasks: int = 1,
+    worker: TaskWorker | None = None,
+    queues: list[str] | None = None,
+    fair_share: bool = False,
+    priority_aging: timedelta | None = None,
+) -> list[TaskRun]:
     if num_tasks < 1:
         raise ValueError("Number of tasks to process must be at least one")
 
     task_manager: TaskManager = Task.objects.db_manager(database)
-    tasks = task_manager.get_tasks_to_process(num_tasks)
+    tasks = task_manager.get_tasks_to_process(
+        num_tasks, queues, fair_share, priority_aging
+    )
     if tasks:
         logger.debug(f"Running {len(tasks)} task(s) from database '{database}'")
 
         executed_tasks = []
         task_runs = []
 
-        for task in tasks:
-            task, task_run = _run_task(task)
-
-            executed_tasks.append(task)
-            assert isinstance(task_run, TaskRun)
-            task_runs.append(task_run)
+        with _get_worker(worker) as worker, worker.claim(database, tasks):
+            # The whole batch is recorded as started at once, rather than each
+            # task as it runs; tasks released meanwhile are reset on release.
+            task_manager.mark_started([task.pk for task in tasks])
+            # Asynchronous tasks are awaited concurrently, ahead of
+            # synchronous ones, which are run one after another.
+            async_tasks = [
+                task for task in tasks if task.is_async and worker.start(task)
+            ]
+            async_results: typing.Iterator[typing.Tuple[Task, AnyTaskRun]] = iter([])
+            if async_tasks:
+                async_results = iter(
+                    worker.run_coroutine(_run_async_tasks(async_tasks))
+                )
+            for task in tasks:
+                if task in async_tasks:
+                    task, task_run = next(async_results)
+                elif not task.is_async and worker.start(task):
+                    task, task_run = _run_task(task, worker)
+                else:
+                    # Released while the task processor is draining;
+                    # the task is unlocked by the releasing thread.
+                    continue
+
+                task.finished_at = task_run.finished_at or timezone.now()
+                task.last_error = task_run.error_details
+                executed_tasks.append(task)
+                assert isinstance(task_run, TaskRun)
+                task_runs.append(task_run)
 
         if executed_tasks:
             Task.objects.using(database).bulk_update(
                 executed_tasks,
-                fields=["completed", "num_failures", "is_locked", "scheduled_for"],
+                fields=[
+                    "completed",
+                    "num_failures",
+                    "is_locked",
+                    "scheduled_for",
+                    "finished_at",
+                    "last_error",
+                    "lease_expires_at",
+                ],
             )
 
-        if task_runs:
-            TaskRun.objects.using(database).bulk_create(task_runs)
-            logger.debug(
-                f"Finished running {len(task_runs)} task(s) from database '{database}'"
-            )
+        # Every task run is returned, but only some are persisted
+        if recorded_task_runs := [
+            task_run for task_run in task_runs if _should_record_task_run(task_run)
+        ]:
+            TaskRun.objects.using(database).bulk_create(recorded_task_runs)
+        logger.debug(
+            f"Finished running {len(task_runs)} task(s) from database '{database}'"
+        )
 
         return task_runs
 
     return []
 
 
-def run_recurring_task(database: str) -> RecurringTaskRun | None:
+def run_recurring_task(
+    database: str,
+    worker: TaskWorker | None = None,
+) -> RecurringTaskRun | None:
     # NOTE: We will probably see a lot of delay in the execution of recurring tasks
     # if the tasks take longer then `run_every` to execute. This is not
     # a problem for now, but we should be mindful of this limitation
@@ -92,20 +294,25 @@ def run_recurring_task(database: str) -> RecurringTaskRun | None:
         return None
 
     task_run: RecurringTaskRun | None = None
-    if task.should_execute:
+    # Tasks are only picked up once due, unless they never were before
+    next_run_at = task.next_run_at or task.get_next_run_at()
+    if next_run_at <= timezone.now():
         # Persist the task run before execution so that, if the worker is
         # killed mid-task, we still have a row we can later mark as timed
         # out when the task is unlocked by the timeout-based reaper in
         # `get_recurringtasks_to_process`.
         task_run = RecurringTaskRun(started_at=timezone.now(), task=task)
         task_run.save(using=database)
-        task, run = _run_task(task, task_run=task_run)
+        with _get_worker(worker) as worker, worker.claim(database, [task]):
+            task, run = _run_task(task, worker, task_run=task_run)
         assert run is task_run
         # task.run() may have idled the DB connection past the server's
         # session timeout; drop stale connections so the saves below open
         # a fresh one. See Sentry FLAGSMITH-API-5EM.
         close_old_connections()
+        task.next_run_at = task.get_next_run_at(last_task_run=task_run)
     else:
+        task.next_run_at = next_run_at
         task.unlock()
 
     task.save(
@@ -115,6 +322,7 @@ def run_recurring_task(database: str) -> RecurringTaskRun | None:
             "locked_at",
             "is_disabled",
             "num_consecutive_failures",
+            "next_run_at",
         ],
     )
 
@@ -126,14 +334,78 @@ def run_recurring_task(database: str) -> RecurringTaskRun | None:
     return None
 
 
+def _should_record_task_run(task_run: TaskRun) -> bool:
+    if task_run.result != TaskResult.SUCCESS.value:
+        return True
+    sample_rate: float = getattr(settings, "TASK_RUN_SUCCESS_SAMPLE_RATE", 1.0)
+    return random.random() < sample_rate
+
+
+@contextmanager
+def _get_worker(worker: TaskWorker | None) -> typing.Iterator[TaskWorker]:
+    if worker:
+        yield worker
+        return
+    worker = TaskWorker()
+    try:
+        yield worker
+    finally:
+        worker.shutdown()
+
+
 def _run_task(
     task: T,
+    worker: TaskWorker,
     task_run: AnyTaskRun | None = None,
 ) -> typing.Tuple[T, AnyTaskRun]:
+    task_run = _get_task_run(task, task_run)
+    with _track_task_run(task, task_run):
+        worker.run(task)
+    return task, task_run
+
+
+async def _run_async_tasks(tasks: list[T]) -> list[typing.Tuple[T, AnyTaskRun]]:
+    return await asyncio.gather(*map(_run_async_task, tasks))
+
+
+async def _run_async_task(task: T) -> typing.Tuple[T, AnyTaskRun]:
+    task_run = _get_task_run(task)
+    with _track_task_run(task, task_run):
+        await _await_task(task)
+    return task, task_run
+
+
+async def _await_task(task: AbstractBaseTask) -> None:
+    timeout = task.timeout.total_seconds() if task.timeout else None
+    await asyncio.wait_for(task.run_async(), timeout=timeout)
+
+
+def _get_task_run(task: T, task_run: AnyTaskRun | None = None) -> AnyTaskRun:
     assert settings.TASK_PROCESSOR_MODE, (
         "Attempt to run tasks in a non-task-processor environment"
     )
+    if task_run is None:
+        task_run = task.task_runs.model(started_at=timezone.now(), task=task)  # type: ignore[attr-defined]
+    return task_run
+
+
+def _observe_queue_latency(task: Task, started_at: datetime) -> None:
+    # Tasks scheduled before they were created are due from creation
+    due_at = max(task.scheduled_for or task.created_at, task.created_at)
+    metrics.flagsmith_task_processor_task_queue_latency_seconds.labels(
+        task_identifier=task.task_identifier,
+        priority=str(task.priority),
+    ).observe(max((started_at - due_at).total_seconds(), 0))
 
+
+@contextmanager
+def _track_task_run(task: T, task_run: AnyTaskRun) -> typing.Iterator[None]:
+    """
+    Record the outcome of the task execution wrapped by this context manager
+    on the task, its run, metrics and traces.
+
+    Exceptions raised by the task are recorded as failures, and not propagated.
+    """
     ctx = ExitStack()
     timer = metrics.flagsmith_task_processor_task_duration_seconds.time()
     ctx.enter_context(timer)
@@ -141,13 +413,18 @@ def _run_task(
     task_identifier = task.task_identifier
     registered_task = get_task(task_identifier)
 
+    if isinstance(task, Task):
+        _observe_queue_latency(task, task_run.started_at)
+
+    # Only format arguments if logged
     logger.debug(
-        f"Running task {task_identifier} id={task.pk} args={task.args} kwargs={task.kwargs}"
+        "Running task %s id=%s args=%s kwargs=%s",
+        task_identifier,
+        task.pk,
+        task.args,
+        task.kwargs,
     )
-    if task_run is None:
-        task_run = task.task_runs.model(started_at=timezone.now(), task=task)  # type: ignore[attr-defined]
     result: str
-    executor = None
 
     extracted_ctx = propagate.extract(task.trace_context or {})
     tracer = trace.get_tracer("task_processor", version("flagsmith-common"))
@@ -155,14 +432,7 @@ def _run_task(
     otel_token = otel_context.attach(trace.set_span_in_context(span, extracted_ctx))
 
     try:
-        # Use explicit executor management to avoid blocking on shutdown
-        # when tasks timeout but continue running in worker threads.
-        # The default context manager behavior (wait=True) would block
-        # the TaskRunner thread indefinitely waiting for stuck workers.
-        executor = ThreadPoolExecutor(max_workers=1)
-        future = executor.submit(task.run)
-        timeout = task.timeout.total_seconds() if task.timeout else None
-        future.result(timeout=timeout)  # Wait for completion or timeout
+        yield
 
         task_run.result = result = TaskResult.SUCCESS.value
         task_run.finished_at = timezone.now()
@@ -208,13 +478,6 @@ def _run_task(
                     delay_until,
                 )
 
-    finally:
-        # Always shutdown the executor without waiting for worker threads.
-        # This prevents the TaskRunner thread from blocking indefinitely
-        # when a task times out but continues running in a worker thread.
-        if executor is not None:
-            executor.shutdown(wait=False)
-
     labels = {
         "task_identifier": task_identifier,
         "task_type": registered_task.task_type.value.lower(),
@@ -229,5 +492,3 @@ def _run_task(
     span.set_attributes(labels)
     span.end()
     otel_context.detach(otel_token)
-
-    return task, task_run
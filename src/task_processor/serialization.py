@@ -0,0 +1,89 @@
+"""
+Serialization of task arguments.
+
+Arguments are serialized with the codec named by the `TASK_PAYLOAD_CODEC`
+setting (JSON by default). Payloads serialized with any codec other than
+JSON are prefixed with the codec's name, e.g. `msgpack:...`, so that rows
+written with a previous codec can still be deserialized.
+
+Payloads larger than the `TASK_PAYLOAD_COMPRESSION_THRESHOLD_BYTES` setting,
+if set, are gzipped and base64-encoded, and prefixed with `gzip:`.
+"""
+
+import base64
+import gzip
+import typing
+from dataclasses import dataclass
+
+import simplejson as json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from task_processor.exceptions import TaskProcessingError
+
+JSON_CODEC_NAME = "json"
+COMPRESSED_PAYLOAD_PREFIX = "gzip"
+
+_django_json_encoder_default = DjangoJSONEncoder().default
+
+
+@dataclass(frozen=True)
+class PayloadCodec:
+    name: str
+    encode: typing.Callable[[typing.Any], str]
+    decode: typing.Callable[[str], typing.Any]
+
+
+registered_codecs: dict[str, PayloadCodec] = {}
+
+
+def register_codec(codec: PayloadCodec) -> None:
+    if not codec.name.isidentifier() or codec.name == COMPRESSED_PAYLOAD_PREFIX:
+        raise ValueError(f"Invalid codec name '{codec.name}'")
+    registered_codecs[codec.name] = codec
+
+
+def get_codec(name: str) -> PayloadCodec:
+    try:
+        return registered_codecs[name]
+    except KeyError:
+        raise TaskProcessingError(
+            f"No payload codec registered with name '{name}'. "
+            "Ensure it is registered with `register_codec`."
+        )
+
+
+def serialize(data: typing.Any) -> str:
+    codec = get_codec(getattr(settings, "TASK_PAYLOAD_CODEC", JSON_CODEC_NAME))
+    payload = codec.encode(data)
+    if codec.name != JSON_CODEC_NAME:
+        # Keep JSON payloads readable by task processors predating codecs
+        payload = f"{codec.name}:{payload}"
+
+    threshold: int | None = getattr(
+        settings, "TASK_PAYLOAD_COMPRESSION_THRESHOLD_BYTES", None
+    )
+    if threshold is not None and len(encoded := payload.encode()) > threshold:
+        compressed = base64.b64encode(gzip.compress(encoded, mtime=0)).decode()
+        return f"{COMPRESSED_PAYLOAD_PREFIX}:{compressed}"
+    return payload
+
+
+def deserialize(data: str) -> typing.Any:
+    # JSON payloads of task arguments start with `[` or `{`,
+    # and so never look like a codec name followed by a colon.
+    name, separator, encoded = data.partition(":")
+    if separator and name.isidentifier():
+        if name == COMPRESSED_PAYLOAD_PREFIX:
+            return deserialize(gzip.decompress(base64.b64decode(encoded)).decode())
+        return get_codec(name).decode(encoded)
+    return registered_codecs[JSON_CODEC_NAME].decode(data)
+
+
+register_codec(
+    PayloadCodec(
+        name=JSON_CODEC_NAME,
+        encode=lambda data: json.dumps(data, default=_django_json_encoder_default),
+        decode=json.loads,
+    )
+)
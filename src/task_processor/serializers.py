@@ -1,7 +1,18 @@
 from rest_framework import serializers
 
-from task_processor.types import MonitoringInfo
+from task_processor.types import MonitoringInfo, WaitingTasksInfo
+
+
+class WaitingTasksSerializer(serializers.Serializer[WaitingTasksInfo]):
+    database = serializers.CharField(read_only=True)
+    task_identifier = serializers.CharField(read_only=True)
+    priority = serializers.IntegerField(read_only=True, allow_null=True)
+    waiting = serializers.IntegerField(read_only=True)
+    oldest_waiting_seconds = serializers.FloatField(read_only=True)
 
 
 class MonitoringSerializer(serializers.Serializer[MonitoringInfo]):
     waiting = serializers.IntegerField(read_only=True)
+    oldest_waiting_seconds = serializers.FloatField(read_only=True, allow_null=True)
+    is_estimate = serializers.BooleanField(read_only=True)
+    breakdown = WaitingTasksSerializer(many=True, read_only=True)
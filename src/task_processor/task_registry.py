@@ -1,4 +1,5 @@
 import enum
+import inspect
 import logging
 import typing
 from dataclasses import dataclass
@@ -14,12 +15,22 @@ class TaskType(enum.Enum):
     RECURRING = "RECURRING"
 
 
+class TaskExecutionBackend(enum.Enum):
+    THREAD = "THREAD"
+    PROCESS = "PROCESS"
+
+
 @dataclass
 class RegisteredTask:
     task_identifier: str
     task_function: TaskCallable[typing.Any]
     task_type: TaskType = TaskType.STANDARD
     task_kwargs: dict[str, typing.Any] | None = None
+    execution_backend: TaskExecutionBackend = TaskExecutionBackend.THREAD
+
+    @property
+    def is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self.task_function)
 
 
 registered_tasks: dict[str, RegisteredTask] = {}
@@ -37,7 +48,8 @@ def initialise() -> None:
             logger.debug("Persisting recurring task '%s'", task_identifier)
             RecurringTask.objects.update_or_create(
                 task_identifier=task_identifier,
-                defaults=registered_task.task_kwargs,
+                # Reschedule the task in case its schedule changed
+                defaults={**(registered_task.task_kwargs or {}), "next_run_at": None},
             )
 
 
@@ -57,12 +69,14 @@ def get_task(task_identifier: str) -> RegisteredTask:
 def register_task(
     task_identifier: str,
     callable_: TaskCallable[typing.Any],
+    execution_backend: TaskExecutionBackend = TaskExecutionBackend.THREAD,
 ) -> None:
     global registered_tasks
 
     registered_task = RegisteredTask(
         task_identifier=task_identifier,
         task_function=callable_,
+        execution_backend=execution_backend,
     )
     registered_tasks[task_identifier] = registered_task
 
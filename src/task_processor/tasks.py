@@ -10,7 +10,16 @@ from task_processor.decorators import (
     register_recurring_task,
     register_task_handler,
 )
-from task_processor.models import HealthCheckModel, RecurringTaskRun, Task
+from task_processor.models import (
+    HealthCheckModel,
+    RecurringTaskRun,
+    Task,
+    TaskRun,
+)
+from task_processor.partitioning import (
+    get_partition_interval,
+    manage_partitions,
+)
 
 if typing.TYPE_CHECKING:
     # ugh https://github.com/typeddjango/django-stubs/issues/1744
@@ -22,6 +31,8 @@ if typing.TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+# No longer used by the health check, which reads heartbeats instead,
+# but kept for API instances enqueueing it while being upgraded.
 @register_task_handler()
 def create_health_check_model(health_check_model_uuid: str) -> None:
     logger.info("Creating health check model.")
@@ -65,7 +76,51 @@ def clean_up_old_recurring_task_runs() -> None:
     if not settings.ENABLE_CLEAN_UP_OLD_TASKS:
         return
 
+    if get_partition_interval():
+        # Old runs are dropped along with their partition instead
+        return
+
     now = timezone.now()
     delete_before = now - timedelta(days=settings.RECURRING_TASK_RUN_RETENTION_DAYS)
 
     RecurringTaskRun.objects.filter(finished_at__lt=delete_before).delete()
+
+
+@register_recurring_task(
+    run_every=settings.TASK_DELETE_RUN_EVERY,
+    first_run_time=settings.TASK_DELETE_RUN_TIME,
+)
+def manage_task_run_partitions() -> None:
+    """
+    Partition task run tables by start time if `TASK_RUN_PARTITION_INTERVAL_DAYS`
+    is set, creating upcoming partitions and dropping expired ones.
+
+    Task runs are dropped along with their partition once older than
+    `TASK_DELETE_RETENTION_DAYS`, or `RECURRING_TASK_RUN_RETENTION_DAYS`
+    for recurring tasks, whether or not their task was cleaned up yet.
+    Partitions are still created, but not dropped, if `ENABLE_CLEAN_UP_OLD_TASKS`
+    is disabled.
+    """
+    if not (interval := get_partition_interval()):
+        return
+
+    clean_up = settings.ENABLE_CLEAN_UP_OLD_TASKS
+    now = timezone.now()
+    manage_partitions(
+        TaskRun,
+        retention=(
+            timedelta(days=settings.TASK_DELETE_RETENTION_DAYS) if clean_up else None
+        ),
+        interval=interval,
+        now=now,
+    )
+    manage_partitions(
+        RecurringTaskRun,
+        retention=(
+            timedelta(days=settings.RECURRING_TASK_RUN_RETENTION_DAYS)
+            if clean_up
+            else None
+        ),
+        interval=interval,
+        now=now,
+    )
@@ -1,15 +1,39 @@
+import asyncio
 import logging
+import os
+import random
+import socket
 import time
 import typing
 from datetime import datetime, timedelta
-from threading import Thread
+from threading import Event, Lock, Thread
 
 from django.conf import settings
-from django.db import close_old_connections
+from django.db import close_old_connections, connections
 from django.utils import timezone
 
-from task_processor.processor import run_recurring_task, run_tasks
-from task_processor.task_registry import initialise
+from task_processor import metrics
+from task_processor.constants import (
+    AUTOSCALE_INTERVAL_SECONDS,
+    DEFAULT_TASK_QUEUE,
+    HEARTBEAT_INTERVAL_SECONDS,
+    HEARTBEAT_RETENTION_SECONDS,
+    QUEUE_METRICS_INTERVAL_SECONDS,
+    TASK_LEASE_RENEWAL_SECONDS,
+)
+from task_processor.models import Task, TaskProcessorHeartbeat
+from task_processor.monitoring import get_task_counts
+from task_processor.notifications import (
+    listen_for_enqueued_tasks,
+    wait_for_enqueued_tasks,
+)
+from task_processor.process_pool import TaskProcessPool
+from task_processor.processor import TaskWorker, run_recurring_task, run_tasks
+from task_processor.task_registry import (
+    TaskExecutionBackend,
+    initialise,
+    registered_tasks,
+)
 from task_processor.types import TaskProcessorConfig
 
 logger = logging.getLogger(__name__)
@@ -25,25 +49,45 @@ class TaskRunnerCoordinator(Thread):
         super().__init__(*args, **kwargs)
         self.config = config
         self._threads: list[TaskRunner] = []
+        self._listener: TaskNotificationListener | None = None
+        self._event_loop_thread: EventLoopThread | None = None
+        self._process_pool: TaskProcessPool | None = None
         self._monitor_threads = True
+        self._metrics_exporter = QueueMetricsExporter()
+        # Runners stopped when scaling down, and still finishing their iteration
+        # with tasks in flight. Shared with the heartbeat writer to renew their
+        # leases, and so updated in place.
+        self._stopped_threads: list[TaskRunner] = []
+        # Guards replacing runners against the coordinator being stopped
+        self._threads_lock = Lock()
 
     def run(self) -> None:
         initialise()
 
         logger.info("Processor starting")
 
-        for _ in range(self.config.num_threads):
-            self._threads.append(
-                task := TaskRunner(
-                    sleep_interval_millis=self.config.sleep_interval_ms,
-                    queue_pop_size=self.config.queue_pop_size,
-                )
-            )
-            task.start()
+        self._start_task_executors()
+
+        for queues, num_threads in self._get_queues_threads():
+            for _ in range(num_threads):
+                self._threads.append(self._start_runner(queues))
+
+        if self.config.listen:
+            self._listener = TaskNotificationListener(runners=self._threads)
+            self._listener.start()
+
+        self._metrics_exporter.start()
+        heartbeat_writer = HeartbeatWriter(
+            runners=self._threads,
+            stopped_runners=self._stopped_threads,
+        )
+        heartbeat_writer.start()
 
-        ms_before_unhealthy = (
-            self.config.grace_period_ms + self.config.sleep_interval_ms
+        ms_before_unhealthy = self.config.grace_period_ms + max(
+            self.config.sleep_interval_ms,
+            self.config.max_sleep_interval_ms or 0,
         )
+        next_autoscale_at = time.monotonic() + AUTOSCALE_INTERVAL_SECONDS
         while self._monitor_threads:
             time.sleep(1)
             unhealthy_threads = self._get_unhealthy_threads(
@@ -51,10 +95,172 @@ class TaskRunnerCoordinator(Thread):
             )
             if unhealthy_threads:
                 logger.warning("%d unhealthy threads detected", len(unhealthy_threads))
+                self._replace_dead_threads()
+            if self._is_autoscaling() and time.monotonic() >= next_autoscale_at:
+                self._autoscale()
+                next_autoscale_at = time.monotonic() + AUTOSCALE_INTERVAL_SECONDS
 
-        for thread in self._threads:
+        self._drain()
+        if self._listener:
+            self._listener.join()
+        self._metrics_exporter.stop()
+        self._metrics_exporter.join()
+        heartbeat_writer.stop()
+        heartbeat_writer.join()
+        self._stop_task_executors()
+
+    def _start_runner(self, queues: list[str] | None) -> "TaskRunner":
+        runner = TaskRunner(
+            sleep_interval_millis=self.config.sleep_interval_ms,
+            max_sleep_interval_millis=self.config.max_sleep_interval_ms,
+            queue_pop_size=self.config.queue_pop_size,
+            queues=queues,
+            fair_share=self.config.fair_share,
+            priority_aging_millis=self.config.priority_aging_ms,
+            # Recurring tasks belong to the default queue
+            run_recurring_tasks=(queues is None or DEFAULT_TASK_QUEUE in queues),
+            event_loop=(
+                self._event_loop_thread.loop if self._event_loop_thread else None
+            ),
+            process_pool=self._process_pool,
+        )
+        runner.start()
+        return runner
+
+    def _replace_dead_threads(self) -> None:
+        """
+        Replace runners that died, e.g. from an error escaping their loop.
+
+        Runners that stalled are left running, as threads can't be killed.
+        """
+        # The list of threads is shared with the listener and heartbeat
+        # writer, and so is updated in place.
+        with self._threads_lock:
+            if not self._monitor_threads:
+                return
+            for index, thread in enumerate(self._threads):
+                if not thread.is_alive():
+                    logger.warning("Replacing dead thread %s", thread.name)
+                    self._threads[index] = self._start_runner(thread.queues)
+
+    def _is_autoscaling(self) -> bool:
+        # Runners are only scaled when processing all queues
+        return bool(self.config.max_num_threads) and self.config.queues is None
+
+    def _autoscale(self) -> None:
+        """
+        Add a runner if runners are saturated, i.e. all popped a full batch from
+        the queue in their last iteration, or more tasks are waiting than they
+        pop at once. Remove a runner if several found no tasks.
+
+        The number of runners stays between `num_threads` and `max_num_threads`,
+        and changes by one runner at a time, to avoid overreacting to bursts.
+        """
+        with self._threads_lock:
+            if not self._monitor_threads:
+                return
+            self._stopped_threads[:] = [
+                thread for thread in self._stopped_threads if thread.is_alive()
+            ]
+            num_threads = len(self._threads)
+            idle_threads = [
+                thread for thread in self._threads if thread.last_num_tasks == 0
+            ]
+            is_saturated = all(
+                thread.last_num_tasks is not None
+                and thread.last_num_tasks >= thread.queue_pop_size
+                for thread in self._threads
+            ) or (self._metrics_exporter.num_waiting or 0) > (
+                num_threads * self.config.queue_pop_size
+            )
+
+            if is_saturated and num_threads < (self.config.max_num_threads or 0):
+                logger.info("Scaling up to %d threads", num_threads + 1)
+                self._threads.append(self._start_runner(queues=None))
+            elif (
+                not is_saturated
+                and len(idle_threads) > 1
+                and num_threads > self.config.num_threads
+            ):
+                logger.info("Scaling down to %d threads", num_threads - 1)
+                thread = idle_threads[-1]
+                self._threads.remove(thread)
+                thread.stop()
+                self._stopped_threads.append(thread)
+
+    def _drain(self) -> None:
+        """
+        Wait for runners to finish the tasks they claimed, and release the
+        tasks not started by the end of the drain timeout.
+        """
+        threads = [*self._threads, *self._stopped_threads]
+        deadline = time.monotonic() + self.config.drain_timeout_ms / 1000
+        for thread in threads:
+            thread.join(timeout=max(deadline - time.monotonic(), 0))
+        if any(thread.is_alive() for thread in threads):
+            self._release_unstarted_tasks(threads)
+        # Tasks in flight can't be interrupted; if the task processor is
+        # killed meanwhile, they're reclaimed once their lease expires.
+        for thread in threads:
             thread.join()
 
+    def _release_unstarted_tasks(self, threads: list["TaskRunner"]) -> None:
+        released_tasks: dict[str, list[Task]] = {}
+        for thread in threads:
+            for database, task in thread.worker.release():
+                released_tasks.setdefault(database, []).append(task)
+
+        for database, tasks in released_tasks.items():
+            try:
+                num_released = Task.objects.db_manager(database).release(
+                    [task.pk for task in tasks]
+                )
+            except Exception as exception:
+                exception_repr = f"{exception.__class__.__module__}.{repr(exception)}"
+                logger.error(
+                    f"Error releasing tasks from database '{database}': {exception_repr}",
+                    exc_info=exception,
+                )
+                close_old_connections()
+                continue
+            logger.warning(
+                "Released %d of %d task(s) not started before the drain timeout "
+                "from database '%s': %s",
+                num_released,
+                len(tasks),
+                database,
+                ", ".join(f"{task.task_identifier} id={task.pk}" for task in tasks),
+            )
+
+    def _get_queues_threads(self) -> list[tuple[list[str] | None, int]]:
+        if self.config.queues is None:
+            return [(None, self.config.num_threads)]
+        return [
+            ([queue], num_threads) for queue, num_threads in self.config.queues.items()
+        ]
+
+    def _start_task_executors(self) -> None:
+        """
+        Start the executors shared by task runners, if any registered task
+        needs them.
+        """
+        if any(task.is_async for task in registered_tasks.values()):
+            self._event_loop_thread = EventLoopThread()
+            self._event_loop_thread.start()
+
+        if self.config.num_processes and any(
+            task.execution_backend == TaskExecutionBackend.PROCESS
+            for task in registered_tasks.values()
+        ):
+            self._process_pool = TaskProcessPool(self.config.num_processes)
+
+    def _stop_task_executors(self) -> None:
+        if self._event_loop_thread:
+            self._event_loop_thread.stop()
+            self._event_loop_thread.join()
+        if self._process_pool:
+            self._process_pool.shutdown()
+
     def _get_unhealthy_threads(self, ms_before_unhealthy: int) -> list["TaskRunner"]:
         unhealthy_threads = []
         healthy_threshold = timezone.now() - timedelta(milliseconds=ms_before_unhealthy)
@@ -69,9 +275,12 @@ class TaskRunnerCoordinator(Thread):
         return unhealthy_threads
 
     def stop(self) -> None:
-        self._monitor_threads = False
-        for t in self._threads:
-            t.stop()
+        with self._threads_lock:
+            self._monitor_threads = False
+            for t in self._threads:
+                t.stop()
+        if self._listener:
+            self._listener.stop()
 
 
 class TaskRunner(Thread):
@@ -79,39 +288,92 @@ class TaskRunner(Thread):
         self,
         *args: typing.Any,
         sleep_interval_millis: int = 2000,
+        max_sleep_interval_millis: int | None = None,
         queue_pop_size: int = 1,
+        queues: list[str] | None = None,
+        fair_share: bool = False,
+        priority_aging_millis: int | None = None,
+        run_recurring_tasks: bool = True,
+        event_loop: asyncio.AbstractEventLoop | None = None,
+        process_pool: TaskProcessPool | None = None,
         **kwargs: typing.Any,
     ):
         super(TaskRunner, self).__init__(*args, **kwargs)
         self.sleep_interval_millis = sleep_interval_millis
+        self.max_sleep_interval_millis = max(
+            max_sleep_interval_millis or sleep_interval_millis,
+            sleep_interval_millis,
+        )
         self.queue_pop_size = queue_pop_size
+        self.queues = queues
+        self.fair_share = fair_share
+        self.priority_aging = (
+            timedelta(milliseconds=priority_aging_millis)
+            if priority_aging_millis
+            else None
+        )
+        self.run_recurring_tasks = run_recurring_tasks
         self.last_checked_for_tasks: datetime | None = None
+        self.last_num_tasks: int | None = None
+
+        self.worker = TaskWorker(event_loop=event_loop, process_pool=process_pool)
 
         self._stopped = False
+        self._wakeup = Event()
+        self._num_idle_iterations = 0
 
     def run(self) -> None:
         while not self._stopped:
+            # Clear before the iteration so that tasks enqueued while
+            # it runs still cut the following sleep short.
+            self._wakeup.clear()
             self.last_checked_for_tasks = timezone.now()
-            self.run_iteration()
-            time.sleep(self.sleep_interval_millis / 1000)
+            num_tasks = self.last_num_tasks = self.run_iteration()
+            if sleep_interval_millis := self.get_sleep_interval_millis(num_tasks):
+                self._wakeup.wait(sleep_interval_millis / 1000)
+        self.worker.shutdown()
+        # Runners may be stopped when scaling down, long before the
+        # task processor exits, so don't leave their connections open.
+        connections.close_all()
 
-    def run_iteration(self) -> None:
+    def run_iteration(self) -> int:
         """
         Consume and execute tasks from the queue, and run recurring tasks
 
         This method tries to consume tasks from multiple databases as to ensure
         that any remaining tasks are processed after opting in or out of a
         separate database setup.
+
+        Return the number of tasks run.
         """
         database_is_separate = "task_processor" in settings.TASK_PROCESSOR_DATABASES
+        num_tasks = 0
 
         for database in settings.TASK_PROCESSOR_DATABASES:
+            # Once stopped, the coordinator may have released the tasks
+            # not started yet, so no more tasks must be claimed.
+            if self._stopped:
+                break
             try:
-                run_tasks(database, self.queue_pop_size)
+                num_tasks += len(
+                    run_tasks(
+                        database,
+                        self.queue_pop_size,
+                        self.worker,
+                        queues=self.queues,
+                        fair_share=self.fair_share,
+                        priority_aging=self.priority_aging,
+                    )
+                )
 
                 # Recurring tasks are only run on one database
-                if (database == "default") ^ database_is_separate:
-                    run_recurring_task(database)
+                if (
+                    self.run_recurring_tasks
+                    and ((database == "default") ^ database_is_separate)
+                    and not self._stopped
+                ):
+                    if run_recurring_task(database, self.worker):
+                        num_tasks += 1
             except Exception as exception:
                 # To prevent task threads from dying if they get an error retrieving the tasks from the
                 # database this will allow the thread to continue trying to retrieve tasks if it can
@@ -124,5 +386,316 @@ class TaskRunner(Thread):
 
                 close_old_connections()
 
+        return num_tasks
+
+    def get_sleep_interval_millis(self, num_tasks: int) -> float:
+        """
+        Return how long to sleep after an iteration that ran `num_tasks`.
+
+        Don't sleep if the queue was popped in full, as more tasks are likely
+        waiting. Otherwise, back off exponentially, with jitter, for as long
+        as no tasks are found, up to `max_sleep_interval_millis`.
+        """
+        if num_tasks >= self.queue_pop_size:
+            self._num_idle_iterations = 0
+            return 0
+        if num_tasks:
+            self._num_idle_iterations = 0
+            return self.sleep_interval_millis
+
+        backoff_millis = min(
+            self.sleep_interval_millis * 2**self._num_idle_iterations,
+            self.max_sleep_interval_millis,
+        )
+        if backoff_millis < self.max_sleep_interval_millis:
+            self._num_idle_iterations += 1
+        return random.uniform(self.sleep_interval_millis, backoff_millis)
+
+    def wake(self) -> None:
+        """
+        Interrupt the current sleep so that the queue is checked immediately.
+        """
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self.wake()
+
+
+class EventLoopThread(Thread):
+    """
+    Run an event loop shared by all task runners, so that asynchronous
+    tasks are awaited concurrently rather than occupying a thread each.
+    """
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.loop = asyncio.new_event_loop()
+
+    def run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class TaskNotificationListener(Thread):
+    """
+    Wake task runners up as soon as tasks are enqueued, instead of waiting
+    for their sleep interval to elapse.
+
+    A single connection per task processor database listens for the
+    notifications issued by `TaskHandler.delay`. The runners' sleep interval
+    remains as a fallback for tasks scheduled in the future, or enqueued
+    without a notification.
+    """
+
+    def __init__(
+        self,
+        *args: typing.Any,
+        runners: list[TaskRunner],
+        poll_interval_seconds: float = 1.0,
+        **kwargs: typing.Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.runners = runners
+        self.poll_interval_seconds = poll_interval_seconds
+
+        self._stopped = False
+
+    def run(self) -> None:
+        while not self._stopped:
+            try:
+                self.listen()
+            except Exception as exception:
+                exception_repr = f"{exception.__class__.__module__}.{repr(exception)}"
+                logger.error(
+                    f"Error listening for enqueued tasks: {exception_repr}",
+                    exc_info=exception,
+                )
+                close_old_connections()
+                time.sleep(self.poll_interval_seconds)
+
+    def listen(self) -> None:
+        listening_connections = [
+            connection
+            for database in settings.TASK_PROCESSOR_DATABASES
+            if listen_for_enqueued_tasks(connection := connections[database])
+        ]
+        if not listening_connections:
+            logger.warning("No task processor database supports notifications")
+            self._stopped = True
+            return
+
+        logger.info("Listening for enqueued tasks")
+        while not self._stopped:
+            if wait_for_enqueued_tasks(
+                listening_connections,
+                timeout=self.poll_interval_seconds,
+            ):
+                for runner in self.runners:
+                    runner.wake()
+
     def stop(self) -> None:
         self._stopped = True
+
+
+class QueueMetricsExporter(Thread):
+    """
+    Periodically export the depth and lag of the task queue as gauges.
+
+    A single thread per task processor counts tasks with one query per
+    task processor database, whatever the number of task runners.
+    """
+
+    def __init__(
+        self,
+        *args: typing.Any,
+        interval_seconds: float = QUEUE_METRICS_INTERVAL_SECONDS,
+        **kwargs: typing.Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.interval_seconds = interval_seconds
+
+        self.num_waiting: int | None = None
+
+        self._stopped = Event()
+        self._waiting_labels: set[tuple[str, str]] = set()
+        self._locked_labels: set[str] = set()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval_seconds):
+            try:
+                self.export()
+            except Exception as exception:
+                exception_repr = f"{exception.__class__.__module__}.{repr(exception)}"
+                logger.error(
+                    f"Error exporting queue metrics: {exception_repr}",
+                    exc_info=exception,
+                )
+                close_old_connections()
+        connections.close_all()
+
+    def export(self) -> None:
+        now = timezone.now()
+        waiting: dict[tuple[str, str], int] = {}
+        locked: dict[str, int] = {}
+        oldest_scheduled_for: datetime | None = None
+        for database in settings.TASK_PROCESSOR_DATABASES:
+            for (
+                task_identifier,
+                priority,
+                num_waiting,
+                num_locked,
+                scheduled_for,
+            ) in get_task_counts(database, now):
+                labels = (task_identifier, str(priority))
+                waiting[labels] = waiting.get(labels, 0) + num_waiting
+                locked[task_identifier] = locked.get(task_identifier, 0) + num_locked
+                if scheduled_for and (
+                    oldest_scheduled_for is None or scheduled_for < oldest_scheduled_for
+                ):
+                    oldest_scheduled_for = scheduled_for
+
+        # Reset gauges for tasks that are no longer queued,
+        # rather than leave their last value behind.
+        for labels in self._waiting_labels - waiting.keys():
+            waiting[labels] = 0
+        for task_identifier in self._locked_labels - locked.keys():
+            locked[task_identifier] = 0
+        self._waiting_labels = {labels for labels, num in waiting.items() if num}
+        self._locked_labels = {labels for labels, num in locked.items() if num}
+
+        for (task_identifier, priority_label), num_waiting in waiting.items():
+            metrics.flagsmith_task_processor_waiting_tasks.labels(
+                task_identifier=task_identifier,
+                priority=priority_label,
+            ).set(num_waiting)
+        for task_identifier, num_locked in locked.items():
+            metrics.flagsmith_task_processor_locked_tasks.labels(
+                task_identifier=task_identifier,
+            ).set(num_locked)
+        self.num_waiting = sum(waiting.values())
+        metrics.flagsmith_task_processor_oldest_waiting_task_age_seconds.set(
+            (now - oldest_scheduled_for).total_seconds() if oldest_scheduled_for else 0
+        )
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class HeartbeatWriter(Thread):
+    """
+    Periodically record the state of task runners as heartbeats, so that
+    the task processor's health can be checked without enqueueing tasks,
+    renew the leases of tasks claimed by runners, and reclaim tasks whose
+    lease expired.
+
+    Heartbeats are written for all runners with a single query, and
+    removed once the task processor stops.
+    """
+
+    def __init__(
+        self,
+        *args: typing.Any,
+        runners: list[TaskRunner],
+        stopped_runners: list[TaskRunner] | None = None,
+        interval_seconds: float = HEARTBEAT_INTERVAL_SECONDS,
+        **kwargs: typing.Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.runners = runners
+        # Runners no longer checking for tasks, but maybe finishing some
+        self.stopped_runners = stopped_runners if stopped_runners is not None else []
+        self.interval_seconds = interval_seconds
+        self.worker_id_prefix = f"{socket.gethostname()}:{os.getpid()}:"
+
+        self._stopped = Event()
+
+    def run(self) -> None:
+        self._run_safely(self.delete_expired)
+        while not self._stopped.wait(self.interval_seconds):
+            self._run_safely(self.renew_leases)
+            self._run_safely(self.reclaim_expired_leases)
+            self._run_safely(self.write)
+        self._run_safely(self.delete)
+        connections.close_all()
+
+    def write(self) -> None:
+        now = timezone.now()
+        TaskProcessorHeartbeat.objects.bulk_create(
+            [
+                TaskProcessorHeartbeat(
+                    worker_id=f"{self.worker_id_prefix}{runner.name}",
+                    last_seen_at=now,
+                    last_checked_at=runner.last_checked_for_tasks,
+                    last_claimed_at=runner.worker.last_claimed_at,
+                    num_in_flight=runner.worker.num_in_flight,
+                )
+                # Heartbeats of dead runners are left to go stale
+                for runner in self.runners
+                if runner.is_alive()
+            ],
+            update_conflicts=True,
+            unique_fields=["worker_id"],
+            update_fields=[
+                "last_seen_at",
+                "last_checked_at",
+                "last_claimed_at",
+                "num_in_flight",
+            ],
+        )
+
+    def renew_leases(self) -> None:
+        task_ids: dict[str, list[int]] = {}
+        for runner in [*self.runners, *self.stopped_runners]:
+            for database, task in runner.worker.claimed_tasks:
+                # Recurring tasks are released after their timeout instead
+                if isinstance(task, Task):
+                    task_ids.setdefault(database, []).append(task.pk)
+        for database, database_task_ids in task_ids.items():
+            Task.objects.db_manager(database).renew_leases(
+                database_task_ids,
+                timedelta(seconds=TASK_LEASE_RENEWAL_SECONDS),
+            )
+
+    def reclaim_expired_leases(self) -> None:
+        for database in settings.TASK_PROCESSOR_DATABASES:
+            if num_reclaimed := Task.objects.db_manager(database).reclaim_expired():
+                logger.warning(
+                    "Reclaimed %d task(s) whose lease expired from database '%s'",
+                    num_reclaimed,
+                    database,
+                )
+
+    def delete(self) -> None:
+        TaskProcessorHeartbeat.objects.filter(
+            worker_id__startswith=self.worker_id_prefix
+        ).delete()
+
+    def delete_expired(self) -> None:
+        """
+        Delete heartbeats left behind by task processors that didn't stop cleanly.
+        """
+        TaskProcessorHeartbeat.objects.filter(
+            last_seen_at__lt=timezone.now()
+            - timedelta(seconds=HEARTBEAT_RETENTION_SECONDS)
+        ).delete()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run_safely(self, method: typing.Callable[[], None]) -> None:
+        try:
+            method()
+        except Exception as exception:
+            exception_repr = f"{exception.__class__.__module__}.{repr(exception)}"
+            logger.error(
+                f"Error recording task runner heartbeats: {exception_repr}",
+                exc_info=exception,
+            )
+            close_old_connections()
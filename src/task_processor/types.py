@@ -1,9 +1,9 @@
 from dataclasses import dataclass
-from typing import Callable, ParamSpec, TypeAlias, TypedDict
+from typing import Awaitable, Callable, ParamSpec, TypeAlias, TypedDict
 
 TaskParameters = ParamSpec("TaskParameters")
 
-TaskCallable: TypeAlias = Callable[TaskParameters, None]
+TaskCallable: TypeAlias = Callable[TaskParameters, None | Awaitable[None]]
 
 TraceContext: TypeAlias = dict[str, str]
 
@@ -14,7 +14,33 @@ class TaskProcessorConfig:
     sleep_interval_ms: int
     grace_period_ms: int
     queue_pop_size: int
+    listen: bool = False
+    num_processes: int = 1
+    max_sleep_interval_ms: int | None = None
+    # number of threads per queue to process tasks from, or all queues if unset
+    queues: dict[str, int] | None = None
+    fair_share: bool = False
+    # millis to wait for claimed tasks to finish on shutdown,
+    # before releasing those not started yet
+    drain_timeout_ms: int = 10000
+    # max number of threads to scale up to when busy, if processing all queues
+    max_num_threads: int | None = None
+    # millis of waiting that raise a task's priority by one point,
+    # or claim tasks in strict priority order if unset
+    priority_aging_ms: int | None = None
+
+
+class WaitingTasksInfo(TypedDict):
+    database: str
+    task_identifier: str
+    priority: int | None
+    waiting: int
+    oldest_waiting_seconds: float
 
 
 class MonitoringInfo(TypedDict):
     waiting: int
+    oldest_waiting_seconds: float | None
+    # whether counts were extrapolated from a sample of the task table
+    is_estimate: bool
+    breakdown: list[WaitingTasksInfo]
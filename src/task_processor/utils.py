@@ -8,7 +8,11 @@ from typing import Any, Generator
 from environs import Env
 
 from task_processor.constants import (
+    DEFAULT_TASK_PROCESSOR_DRAIN_TIMEOUT_MS,
+    DEFAULT_TASK_PROCESSOR_FAIR_SHARE,
     DEFAULT_TASK_PROCESSOR_GRACE_PERIOD_MS,
+    DEFAULT_TASK_PROCESSOR_LISTEN,
+    DEFAULT_TASK_PROCESSOR_NUM_PROCESSES,
     DEFAULT_TASK_PROCESSOR_NUM_THREADS,
     DEFAULT_TASK_PROCESSOR_QUEUE_POP_SIZE,
     DEFAULT_TASK_PROCESSOR_SLEEP_INTERVAL_MS,
@@ -30,6 +34,25 @@ def get_task_identifier_from_function(
     return f"{module.__name__.rsplit('.')[-1]}.{task_name or function.__name__}"
 
 
+def parse_queues(value: str) -> dict[str, int | None]:
+    """
+    Parse a comma-separated list of queue names, each optionally followed by
+    the number of threads to process it with, e.g. `default,bulk:2`.
+    """
+    queues: dict[str, int | None] = {}
+    for item in value.split(","):
+        name, _, num_threads = item.strip().partition(":")
+        if not name:
+            raise argparse.ArgumentTypeError(f"Invalid queue: '{item}'")
+        try:
+            queues[name] = int(num_threads) if num_threads else None
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"Invalid number of threads for queue '{name}': '{num_threads}'"
+            )
+    return queues
+
+
 def add_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "--numthreads",
@@ -40,6 +63,32 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
             default=DEFAULT_TASK_PROCESSOR_NUM_THREADS,
         ),
     )
+    parser.add_argument(
+        "--maxnumthreads",
+        type=int,
+        help=(
+            "Max number of worker threads to scale up to while workers are "
+            "saturated. Workers are scaled back down to `--numthreads` once idle. "
+            "Defaults to a fixed number of threads. Ignored if `--queues` is set."
+        ),
+        default=(
+            env.int("TASK_PROCESSOR_MAX_NUM_THREADS")
+            if "TASK_PROCESSOR_MAX_NUM_THREADS" in os.environ
+            else None
+        ),
+    )
+    parser.add_argument(
+        "--numprocesses",
+        type=int,
+        help=(
+            "Number of worker processes to run tasks using "
+            "the process execution backend. Set to 0 to run them in threads."
+        ),
+        default=env.int(
+            "TASK_PROCESSOR_NUM_PROCESSES",
+            default=DEFAULT_TASK_PROCESSOR_NUM_PROCESSES,
+        ),
+    )
     parser.add_argument(
         "--sleepintervalms",
         type=int,
@@ -53,6 +102,21 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
             )
         ),
     )
+    parser.add_argument(
+        "--maxsleepintervalms",
+        type=int,
+        help=(
+            "Max number of millis each worker waits before checking for new tasks. "
+            "Workers back off from `--sleepintervalms` up to this value "
+            "while there are no tasks. Defaults to `--sleepintervalms`, "
+            "i.e. no backoff."
+        ),
+        default=(
+            env.int("TASK_PROCESSOR_MAX_SLEEP_INTERVAL_MS")
+            if "TASK_PROCESSOR_MAX_SLEEP_INTERVAL_MS" in os.environ
+            else None
+        ),
+    )
     parser.add_argument(
         "--graceperiodms",
         type=int,
@@ -62,6 +126,19 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
             default=DEFAULT_TASK_PROCESSOR_GRACE_PERIOD_MS,
         ),
     )
+    parser.add_argument(
+        "--draintimeoutms",
+        type=int,
+        help=(
+            "Number of millis to wait on shutdown for tasks already popped from "
+            "the queue to finish. Tasks not started by then are released "
+            "for other workers."
+        ),
+        default=env.int(
+            "TASK_PROCESSOR_DRAIN_TIMEOUT_MS",
+            default=DEFAULT_TASK_PROCESSOR_DRAIN_TIMEOUT_MS,
+        ),
+    )
     parser.add_argument(
         "--queuepopsize",
         type=int,
@@ -71,6 +148,64 @@ def add_arguments(parser: argparse.ArgumentParser) -> None:
             default=DEFAULT_TASK_PROCESSOR_QUEUE_POP_SIZE,
         ),
     )
+    parser.add_argument(
+        "--queues",
+        type=parse_queues,
+        help=(
+            "Comma-separated queues to process tasks from, each optionally "
+            "followed by its number of worker threads, e.g. `default,bulk:2`. "
+            "Queues without a number of threads get `--numthreads`. "
+            "Recurring tasks are only run if the `default` queue is included. "
+            "Defaults to processing tasks from all queues."
+        ),
+        default=(
+            parse_queues(env.str("TASK_PROCESSOR_QUEUES"))
+            if "TASK_PROCESSOR_QUEUES" in os.environ
+            else None
+        ),
+    )
+    parser.add_argument(
+        "--fairshare",
+        action=argparse.BooleanOptionalAction,
+        help=(
+            "Interleave task identifiers among the next tasks due, up to ten "
+            "times as many as each batch popped from the queue, so that a burst "
+            "of one task within them doesn't delay others."
+        ),
+        default=env.bool(
+            "TASK_PROCESSOR_FAIR_SHARE",
+            default=DEFAULT_TASK_PROCESSOR_FAIR_SHARE,
+        ),
+    )
+    parser.add_argument(
+        "--priorityagingms",
+        type=int,
+        help=(
+            "Number of millis a task has to wait for its priority to be raised by "
+            "one point, so that lower priority tasks aren't starved by higher "
+            "priority ones, e.g. with 1000, a `LOWER` (100) priority task waiting "
+            "for 100 seconds is claimed ahead of new `HIGHEST` (0) priority tasks. "
+            "Defaults to claiming tasks in strict priority order."
+        ),
+        default=(
+            env.int("TASK_PROCESSOR_PRIORITY_AGING_MS")
+            if "TASK_PROCESSOR_PRIORITY_AGING_MS" in os.environ
+            else None
+        ),
+    )
+    parser.add_argument(
+        "--listen",
+        action=argparse.BooleanOptionalAction,
+        help=(
+            "Wake workers up as soon as tasks are enqueued using Postgres "
+            "LISTEN/NOTIFY. Requires `ENABLE_TASK_PROCESSOR_NOTIFY` "
+            "to be set for the API."
+        ),
+        default=env.bool(
+            "TASK_PROCESSOR_LISTEN",
+            default=DEFAULT_TASK_PROCESSOR_LISTEN,
+        ),
+    )
 
 
 @contextmanager
@@ -83,9 +218,24 @@ def start_task_processor(
 ]:
     config = TaskProcessorConfig(
         num_threads=options["numthreads"],
+        max_num_threads=options["maxnumthreads"],
         sleep_interval_ms=options["sleepintervalms"],
         grace_period_ms=options["graceperiodms"],
+        drain_timeout_ms=options["draintimeoutms"],
         queue_pop_size=options["queuepopsize"],
+        listen=options["listen"],
+        fair_share=options["fairshare"],
+        priority_aging_ms=options["priorityagingms"],
+        num_processes=options["numprocesses"],
+        max_sleep_interval_ms=options["maxsleepintervalms"],
+        queues=(
+            {
+                queue: num_threads or options["numthreads"]
+                for queue, num_threads in queues.items()
+            }
+            if (queues := options["queues"]) is not None
+            else None
+        ),
     )
 
     logger.debug("Config: %s", config)
@@ -6,7 +6,7 @@ from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from task_processor.monitoring import get_num_waiting_tasks
+from task_processor.monitoring import get_monitoring_info
 from task_processor.serializers import MonitoringSerializer
 
 
@@ -15,6 +15,6 @@ from task_processor.serializers import MonitoringSerializer
 @permission_classes([IsAuthenticated, IsAdminUser])
 def monitoring(request: Request, /, **kwargs: Any) -> Response:
     return Response(
-        data={"waiting": get_num_waiting_tasks()},
+        data=MonitoringSerializer(get_monitoring_info()).data,
         content_type="application/json",
     )
@@ -163,11 +163,19 @@ def test_ensure_cli_env__docgen_in_argv__sets_docgen_mode(
         assert os.environ.get("DOCGEN_MODE") == "true"
 
 
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["flagsmith", "start", "task-processor"],
+        ["flagsmith", "benchmarktaskprocessor"],
+    ],
+)
 def test_ensure_cli_env__task_processor_in_argv__sets_run_by_processor(
     monkeypatch: pytest.MonkeyPatch,
+    argv: list[str],
 ) -> None:
     # Given
-    monkeypatch.setattr("sys.argv", ["flagsmith", "task-processor"])
+    monkeypatch.setattr("sys.argv", argv)
 
     # When / Then
     with ensure_cli_env():
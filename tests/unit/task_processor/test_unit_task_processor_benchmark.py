@@ -0,0 +1,159 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import CommandError, call_command
+from pytest_django.fixtures import SettingsWrapper
+from pytest_mock import MockerFixture
+
+from task_processor.benchmark import BenchmarkResult, Percentiles, run_benchmark
+from task_processor.models import Task
+from task_processor.task_run_method import TaskRunMethod
+
+
+@pytest.mark.task_processor_mode
+@pytest.mark.multi_database(transaction=True)
+@pytest.mark.parametrize("workload", ["noop", "sleep", "cpu", "payload"])
+def test_run_benchmark__workload__processes_all_tasks(
+    current_database: str,
+    settings: SettingsWrapper,
+    workload: str,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    # When
+    result = run_benchmark(
+        workload=workload,
+        num_tasks=10,
+        size=10,
+        num_threads=2,
+        queue_pop_size=3,
+        sleep_interval_ms=10,
+        timeout=timedelta(seconds=30),
+    )
+
+    # Then
+    assert result.num_tasks == result.num_completed == 10
+    assert result.enqueue_rate > 0
+    assert result.throughput > 0
+    assert 0 < result.claim_latency.p50 <= result.claim_latency.p99
+    assert 0 < result.end_to_end_latency.p50 <= result.end_to_end_latency.p99
+    # At least one claim, and one update, per batch of tasks
+    assert result.statements_per_task >= 2 / 3
+    assert not Task.objects.using(current_database).exists()
+
+
+@pytest.mark.task_processor_mode
+@pytest.mark.django_db(transaction=True)
+def test_run_benchmark__tasks_not_processed__raises_timeout_error(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    # When / Then
+    with pytest.raises(TimeoutError):
+        run_benchmark(
+            workload="noop",
+            num_tasks=1,
+            num_threads=0,
+            queue_pop_size=1,
+            sleep_interval_ms=10,
+            timeout=timedelta(seconds=0.2),
+        )
+
+
+@pytest.mark.parametrize(
+    "values, expected_percentiles",
+    [
+        ([], Percentiles(p50=0.0, p95=0.0, p99=0.0)),
+        ([2.0], Percentiles(p50=2.0, p95=2.0, p99=2.0)),
+        (
+            [float(value) for value in range(1, 102)],
+            Percentiles(p50=51.0, p95=96.0, p99=100.0),
+        ),
+    ],
+)
+def test_percentiles_from_values__values__returns_expected(
+    values: list[float],
+    expected_percentiles: Percentiles,
+) -> None:
+    # Given / When
+    percentiles = Percentiles.from_values(values)
+
+    # Then
+    assert percentiles == expected_percentiles
+
+
+@pytest.mark.task_processor_mode
+@pytest.mark.django_db(transaction=True)
+def test_benchmarktaskprocessor__tasks_processed__writes_report(
+    capsys: pytest.CaptureFixture[str],
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    # When
+    call_command(
+        "benchmarktaskprocessor",
+        "--numtasks=5",
+        "--numthreads=1",
+        "--sleepintervalms=10",
+    )
+
+    # Then
+    report = capsys.readouterr().out
+    assert "Completed tasks: 5 of 5\n" in report
+    for metric in (
+        "Enqueue rate",
+        "Throughput",
+        "Claim latency",
+        "End-to-end latency",
+        "DB statements per task",
+    ):
+        assert f"{metric}: " in report
+
+
+@pytest.mark.parametrize(
+    "args, expected_fair_share",
+    [([], False), (["--fairshare"], True), (["--no-fairshare"], False)],
+)
+def test_benchmarktaskprocessor__fairshare__passes_fair_share(
+    mocker: MockerFixture,
+    settings: SettingsWrapper,
+    args: list[str],
+    expected_fair_share: bool,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+    percentiles = Percentiles(p50=0.0, p95=0.0, p99=0.0)
+    run_benchmark_mock = mocker.patch(
+        "common.core.management.commands.benchmarktaskprocessor.run_benchmark",
+        return_value=BenchmarkResult(
+            num_tasks=1,
+            num_completed=1,
+            enqueue_rate=1.0,
+            throughput=1.0,
+            claim_latency=percentiles,
+            end_to_end_latency=percentiles,
+            statements_per_task=1.0,
+        ),
+    )
+
+    # When
+    call_command("benchmarktaskprocessor", *args)
+
+    # Then
+    assert run_benchmark_mock.call_args.kwargs["fair_share"] is expected_fair_share
+
+
+def test_benchmarktaskprocessor__tasks_not_run_by_processor__raises(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.SYNCHRONOUSLY
+
+    # When / Then
+    with pytest.raises(CommandError):
+        call_command("benchmarktaskprocessor")
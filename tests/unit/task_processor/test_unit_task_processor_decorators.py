@@ -5,9 +5,10 @@ from datetime import timedelta
 from unittest.mock import MagicMock
 
 import pytest
+from freezegun import freeze_time
 from opentelemetry import baggage, context, trace
 from pytest_django import DjangoCaptureOnCommitCallbacks
-from pytest_django.fixtures import SettingsWrapper
+from pytest_django.fixtures import DjangoAssertNumQueries, SettingsWrapper
 from pytest_mock import MockerFixture
 
 from common.test_tools import AssertMetricFixture
@@ -187,6 +188,24 @@ def test_inputs_validation__run_without_task_processor__raises_invalid_arguments
         my_function.delay(args=(NonSerializableObj(),))
 
 
+def test_delay__async_function_run_synchronously__awaits_function(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.SYNCHRONOUSLY
+    calls = []
+
+    @register_task_handler()
+    async def my_function(value: int) -> None:
+        calls.append(value)
+
+    # When
+    my_function.delay(args=(1,))
+
+    # Then
+    assert calls == [1]
+
+
 @pytest.mark.django_db
 def test_delay__task_queue_full__returns_none(settings: SettingsWrapper) -> None:
     # Given
@@ -306,3 +325,230 @@ def test_delay__baggage__persists_baggage_in_trace_context() -> None:
     assert task.trace_context is not None
     assert "baggage" in task.trace_context
     assert "amplitude.device_id=device-123" in task.trace_context["baggage"]
+
+
+@pytest.mark.django_db
+def test_delay_many__task_processor__creates_tasks_in_single_query(
+    settings: SettingsWrapper,
+    django_assert_num_queries: DjangoAssertNumQueries,
+    assert_metric: AssertMetricFixture,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler(priority=TaskPriority.HIGH)
+    def my_function(value: int, *, flag: bool) -> None: ...
+
+    # When
+    with django_assert_num_queries(1):
+        tasks = my_function.delay_many(
+            [(1,), (2,), (3,)],
+            kwargs_list=[{"flag": True}, {"flag": False}, {"flag": True}],
+        )
+
+    # Then
+    assert [(task.args, task.kwargs) for task in tasks] == [
+        ((1,), {"flag": True}),
+        ((2,), {"flag": False}),
+        ((3,), {"flag": True}),
+    ]
+    assert Task.objects.filter(
+        task_identifier=my_function.task_identifier,
+        priority=TaskPriority.HIGH,
+    ).count() == len(tasks)
+    assert_metric(
+        name="flagsmith_task_processor_enqueued_tasks_total",
+        value=3.0,
+        labels={"task_identifier": my_function.task_identifier},
+    )
+
+
+@pytest.mark.django_db
+def test_delay_many__queue_almost_full__drops_excess_tasks(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler(queue_size=2)
+    def my_function(value: int) -> None: ...
+
+    Task.objects.create(task_identifier=my_function.task_identifier)
+
+    # When
+    tasks = my_function.delay_many([(1,), (2,), (3,)])
+
+    # Then
+    assert [task.args for task in tasks] == [(1,), (2,)]
+    assert Task.objects.filter(task_identifier=my_function.task_identifier).count() == 3
+
+
+def test_delay_many__kwargs_list_length_mismatch__raises_invalid_arguments() -> None:
+    # Given
+    @register_task_handler()
+    def my_function(value: int) -> None: ...
+
+    # When / Then
+    with pytest.raises(InvalidArgumentsError):
+        my_function.delay_many([(1,), (2,)], kwargs_list=[{}])
+
+
+def test_delay_many__run_synchronously__runs_each_task(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.SYNCHRONOUSLY
+    calls = []
+
+    @register_task_handler()
+    def my_function(value: int) -> None:
+        calls.append(value)
+
+    # When
+    tasks = my_function.delay_many([(1,), (2,)])
+
+    # Then
+    assert tasks == []
+    assert calls == [1, 2]
+
+
+@pytest.mark.django_db
+def test_delay__deduplicate_pending_task__coalesces_task(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler(deduplicate=True)
+    def my_function(value: int) -> None: ...
+
+    pending_task = my_function.delay(args=(1,))
+
+    # When
+    task = my_function.delay(args=(1,))
+    other_task = my_function.delay(args=(2,))
+
+    # Then
+    assert pending_task and task and other_task
+    assert task.pk == pending_task.pk
+    assert other_task.pk != pending_task.pk
+    assert Task.objects.filter(task_identifier=my_function.task_identifier).count() == 2
+
+
+@pytest.mark.django_db
+def test_delay__dedup_key_of_locked_task__creates_task(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler()
+    def my_function(value: int) -> None: ...
+
+    locked_task = my_function.delay(args=(1,), dedup_key="key")
+    assert locked_task
+    Task.objects.filter(pk=locked_task.pk).update(is_locked=True)
+
+    # When
+    task = my_function.delay(args=(2,), dedup_key="key")
+    coalesced_task = my_function.delay(args=(3,), dedup_key="key")
+
+    # Then
+    assert task and coalesced_task
+    assert task.pk != locked_task.pk
+    assert coalesced_task.pk == task.pk
+    assert coalesced_task.args == (2,)
+
+
+@pytest.mark.django_db
+def test_delay__debounce_pending_task__pushes_scheduled_for(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler(debounce=timedelta(seconds=30))
+    def my_function() -> None: ...
+
+    with freeze_time("2026-01-01T00:00:00Z"):
+        pending_task = my_function.delay()
+
+    # When
+    with freeze_time("2026-01-01T00:00:10Z"):
+        task = my_function.delay()
+
+    # Then
+    assert pending_task and task
+    assert task.pk == pending_task.pk
+    assert pending_task.scheduled_for
+    assert task.scheduled_for == pending_task.scheduled_for + timedelta(seconds=10)
+
+
+@pytest.mark.django_db
+def test_delay_many__deduplicate__coalesces_tasks(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler(deduplicate=True)
+    def my_function(value: int) -> None: ...
+
+    pending_task = my_function.delay(args=(1,))
+    assert pending_task
+
+    # When
+    tasks = my_function.delay_many([(1,), (2,), (2,)])
+
+    # Then
+    assert [task.args for task in tasks] == [(1,), (2,)]
+    assert tasks[0].pk == pending_task.pk
+    assert Task.objects.filter(task_identifier=my_function.task_identifier).count() == 2
+
+
+@pytest.mark.django_db
+def test_delay__queue__persists_queue_on_task(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler(queue="bulk")
+    def my_function(value: int) -> None: ...
+
+    # When
+    task = my_function.delay(args=(1,))
+    tasks = my_function.delay_many([(2,)])
+
+    # Then
+    assert task
+    assert [task.queue, *(task.queue for task in tasks)] == ["bulk", "bulk"]
+    assert set(Task.objects.values_list("queue", flat=True)) == {"bulk"}
+
+
+@pytest.mark.django_db
+def test_delay__max_concurrency__persists_max_concurrency_on_task(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler(max_concurrency=2)
+    def my_function(value: int) -> None: ...
+
+    # When
+    task = my_function.delay(args=(1,))
+    tasks = my_function.delay_many([(2,)])
+
+    # Then
+    assert task
+    assert [task.max_concurrency, *(task.max_concurrency for task in tasks)] == [2, 2]
+
+
+def test_register_task_handler__invalid_max_concurrency__raises() -> None:
+    # Given
+    def my_function() -> None: ...
+
+    # When / Then
+    with pytest.raises(ValueError):
+        register_task_handler(max_concurrency=0)(my_function)
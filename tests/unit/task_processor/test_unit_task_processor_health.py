@@ -1,44 +1,66 @@
+from datetime import timedelta
+
 import pytest
-from pytest_django.fixtures import SettingsWrapper
-from pytest_mock import MockerFixture
+from django.utils import timezone
+from pytest_django.fixtures import DjangoAssertNumQueries, SettingsWrapper
 
 from task_processor.health import is_processor_healthy
-from task_processor.models import HealthCheckModel
-from task_processor.task_run_method import TaskRunMethod
+from task_processor.models import TaskProcessorHeartbeat
+
+
+@pytest.mark.django_db
+def test_is_processor_healthy__no_heartbeats__returns_false() -> None:
+    # Given / When
+    result = is_processor_healthy()
+
+    # Then
+    assert result is False
 
 
-def test_is_processor_healthy__task_not_processed__returns_false(
-    mocker: MockerFixture,
+@pytest.mark.django_db
+def test_is_processor_healthy__stale_heartbeat__returns_false(
+    settings: SettingsWrapper,
 ) -> None:
     # Given
-    mocker.patch("task_processor.health.create_health_check_model")
-    mocked_health_check_model_class = mocker.patch(
-        "task_processor.health.HealthCheckModel"
-    )
-    mocked_health_check_model_class.objects.filter.return_value.first.return_value = (
-        None
+    settings.TASK_PROCESSOR_HEARTBEAT_MAX_AGE_SECONDS = 30
+    now = timezone.now()
+    TaskProcessorHeartbeat.objects.create(
+        worker_id="host:1:TaskRunner-1",
+        last_seen_at=now,
+        last_checked_at=now - timedelta(minutes=1),
     )
 
     # When
-    result = is_processor_healthy(max_tries=3)
+    result = is_processor_healthy()
 
     # Then
     assert result is False
 
 
 @pytest.mark.django_db
-def test_is_processor_healthy__task_processed__returns_true(
-    settings: SettingsWrapper,
+def test_is_processor_healthy__recent_heartbeat__returns_true(
+    django_assert_num_queries: DjangoAssertNumQueries,
 ) -> None:
     # Given
-    settings.TASK_RUN_METHOD = TaskRunMethod.SYNCHRONOUSLY
+    now = timezone.now()
+    TaskProcessorHeartbeat.objects.bulk_create(
+        [
+            TaskProcessorHeartbeat(
+                worker_id="host:1:TaskRunner-1",
+                last_seen_at=now,
+                last_checked_at=now - timedelta(hours=1),
+            ),
+            TaskProcessorHeartbeat(
+                worker_id="host:1:TaskRunner-2",
+                last_seen_at=now,
+                last_checked_at=now - timedelta(seconds=1),
+            ),
+        ]
+    )
 
     # When
-    result = is_processor_healthy(max_tries=3)
+    with django_assert_num_queries(1):
+        result = is_processor_healthy()
 
     # Then
-    # the health is reported as success
     assert result is True
-
-    # but the health check model used to verify the health is deleted
-    assert not HealthCheckModel.objects.exists()
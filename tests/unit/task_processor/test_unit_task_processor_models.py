@@ -1,12 +1,15 @@
-from datetime import time, timedelta
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 
 import pytest
 from django.utils import timezone
 from freezegun import freeze_time
+from pytest_django.fixtures import DjangoAssertNumQueries
 from pytest_mock import MockerFixture
 
+from task_processor import serialization
 from task_processor.decorators import register_task_handler
+from task_processor.exceptions import InvalidArgumentsError
 from task_processor.models import RecurringTask, RecurringTaskRun, Task, TaskResult
 from task_processor.task_registry import initialise
 
@@ -52,6 +55,43 @@ def test_task_args__no_data__return_expected() -> None:
     assert task.args == ()
 
 
+def test_task_args__accessed_twice__deserializes_once(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    task = Task.create("test_task", scheduled_for=timezone.now(), args=(1,))
+    deserialize = mocker.spy(serialization, "deserialize")
+
+    # When
+    task.args
+    args = task.args
+
+    # Then
+    assert args == (1,)
+    deserialize.assert_called_once_with(task.serialized_args)
+
+
+def test_task_args__serialized_args_changed__returns_new_args() -> None:
+    # Given
+    task = Task.create("test_task", scheduled_for=timezone.now(), args=(1,))
+    task.args
+
+    # When
+    task.serialized_args = Task.serialize_data((2,))
+
+    # Then
+    assert task.args == (2,)
+
+
+def test_task_create__non_serializable_args__raises_invalid_arguments() -> None:
+    # Given
+    args = (object(),)
+
+    # When / Then
+    with pytest.raises(InvalidArgumentsError):
+        Task.create("test_task", scheduled_for=timezone.now(), args=args)
+
+
 @pytest.mark.parametrize(
     "input, expected_output",
     (
@@ -119,6 +159,46 @@ def test_recurring_task_should_execute__first_run_time_before_midnight__returns_
     assert task.should_execute is True
 
 
+@pytest.mark.parametrize(
+    "run_results, expected_next_run_at",
+    [
+        pytest.param(
+            [TaskResult.SUCCESS], one_hour_ago + timedelta(days=1), id="success"
+        ),
+        pytest.param([TaskResult.FAILURE], one_hour_ago, id="failure__retries_now"),
+        pytest.param(
+            [TaskResult.FAILURE] * 4,
+            one_hour_ago - timedelta(minutes=3) + timedelta(days=1),
+            id="failures__retries_once_fewer_than_four_runs_in_window",
+        ),
+    ],
+)
+@pytest.mark.django_db
+def test_recurring_task_get_next_run_at__task_runs__returns_expected(
+    run_results: list[TaskResult],
+    expected_next_run_at: datetime,
+) -> None:
+    # Given
+    task = RecurringTask.objects.create(
+        task_identifier="my_task",
+        run_every=timedelta(days=1),
+    )
+    RecurringTaskRun.objects.bulk_create(
+        RecurringTaskRun(
+            task=task,
+            started_at=one_hour_ago - timedelta(minutes=minutes_ago),
+            result=result.name,
+        )
+        for minutes_ago, result in enumerate(run_results)
+    )
+
+    # When
+    next_run_at = task.get_next_run_at()
+
+    # Then
+    assert next_run_at == expected_next_run_at
+
+
 @pytest.mark.parametrize(
     "trace_context",
     [
@@ -206,3 +286,29 @@ def test_recurring_task_reconcile_abandoned_run__finished_run_present__only_aban
     assert finished_run.result == TaskResult.SUCCESS.value
     assert finished_run.finished_at == finished_at
     assert finished_run.error_details is None
+
+
+@pytest.mark.parametrize(
+    "num_queued, expected_capacity",
+    [(0, 3), (1, 2), (2, 1), (3, 0), (10, 0)],
+)
+@pytest.mark.django_db
+def test_task_get_queue_capacity__queued_tasks__returns_expected(
+    django_assert_num_queries: DjangoAssertNumQueries,
+    num_queued: int,
+    expected_capacity: int,
+) -> None:
+    # Given
+    Task.objects.bulk_create(
+        [Task(task_identifier="my_task") for _ in range(num_queued)]
+        + [Task(task_identifier="my_task", completed=True)]
+        + [Task(task_identifier="other_task")]
+    )
+
+    # When
+    with django_assert_num_queries(1) as captured:
+        capacity = Task.get_queue_capacity("my_task", queue_size=2)
+
+    # Then
+    assert capacity == expected_capacity
+    assert "LIMIT 3" in captured.captured_queries[0]["sql"]
@@ -1,10 +1,22 @@
 from datetime import timedelta
 
 import pytest
+from django.core.cache import cache
 from django.utils import timezone
+from pytest_django.fixtures import DjangoAssertNumQueries, SettingsWrapper
+from pytest_mock import MockerFixture
 
-from task_processor.models import Task
-from task_processor.monitoring import get_num_waiting_tasks
+from task_processor.models import Task, TaskPriority
+from task_processor.monitoring import (
+    _get_sample_percent,
+    get_monitoring_info,
+    get_num_waiting_tasks,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_cache() -> None:
+    cache.clear()
 
 
 @pytest.mark.django_db
@@ -38,3 +50,120 @@ def test_get_num_waiting_tasks__mixed_task_states__returns_only_waiting() -> Non
 
     # Then
     assert num_waiting_tasks == 1
+
+
+@pytest.mark.django_db
+def test_get_monitoring_info__waiting_tasks__returns_breakdown() -> None:
+    # Given
+    now = timezone.now()
+    Task.objects.bulk_create(
+        [
+            Task(task_identifier="tasks.first", scheduled_for=now - timedelta(hours=1)),
+            Task(task_identifier="tasks.first", scheduled_for=now),
+            Task(
+                task_identifier="tasks.first",
+                scheduled_for=now,
+                priority=TaskPriority.HIGH,
+            ),
+            Task(task_identifier="tasks.second", scheduled_for=now),
+            # not waiting
+            Task(task_identifier="tasks.second", scheduled_for=now, completed=True),
+        ]
+    )
+
+    # When
+    monitoring_info = get_monitoring_info()
+
+    # Then
+    assert monitoring_info["waiting"] == 4
+    assert monitoring_info["is_estimate"] is False
+    assert monitoring_info["oldest_waiting_seconds"] == pytest.approx(3600, abs=60)
+    assert [
+        (info["database"], info["task_identifier"], info["priority"], info["waiting"])
+        for info in monitoring_info["breakdown"]
+    ] == [
+        ("default", "tasks.first", None, 2),
+        ("default", "tasks.first", TaskPriority.HIGH, 1),
+        ("default", "tasks.second", None, 1),
+    ]
+
+
+@pytest.mark.django_db
+def test_get_monitoring_info__called_twice__caches_result(
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    # Given
+    get_monitoring_info()
+    Task.objects.create(task_identifier="tasks.test_task")
+
+    # When
+    with django_assert_num_queries(0):
+        monitoring_info = get_monitoring_info()
+
+    # Then
+    assert monitoring_info["waiting"] == 0
+
+
+@pytest.mark.django_db
+def test_get_monitoring_info__large_task_table__samples_table(
+    settings: SettingsWrapper,
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    settings.TASK_PROCESSOR_MONITORING_SAMPLE_ROWS = 1000
+    mocker.patch(
+        "task_processor.monitoring._get_sample_percent",
+        return_value=100.0,
+    )
+    Task.objects.create(
+        task_identifier="tasks.test_task",
+        scheduled_for=timezone.now() - timedelta(seconds=1),
+    )
+
+    # When
+    monitoring_info = get_monitoring_info()
+
+    # Then
+    assert monitoring_info["waiting"] == 1
+    assert monitoring_info["is_estimate"] is True
+    assert monitoring_info["breakdown"][0]["task_identifier"] == "tasks.test_task"
+
+
+@pytest.mark.django_db
+def test_get_monitoring_info__oldest_task_not_sampled__returns_exact_oldest(
+    settings: SettingsWrapper,
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    settings.TASK_PROCESSOR_MONITORING_SAMPLE_ROWS = 1000
+    # so small that no page of the task table is sampled
+    mocker.patch(
+        "task_processor.monitoring._get_sample_percent",
+        return_value=0.000001,
+    )
+    Task.objects.create(
+        task_identifier="tasks.test_task",
+        scheduled_for=timezone.now() - timedelta(hours=1),
+    )
+
+    # When
+    monitoring_info = get_monitoring_info()
+
+    # Then
+    assert monitoring_info["breakdown"] == []
+    assert monitoring_info["is_estimate"] is True
+    assert monitoring_info["oldest_waiting_seconds"] == pytest.approx(3600, abs=60)
+
+
+@pytest.mark.django_db
+def test_get_sample_percent__small_task_table__returns_none(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_PROCESSOR_MONITORING_SAMPLE_ROWS = 1000
+
+    # When
+    sample_percent = _get_sample_percent("default")
+
+    # Then
+    assert sample_percent is None
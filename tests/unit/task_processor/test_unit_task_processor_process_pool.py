@@ -0,0 +1,166 @@
+import os
+import time
+import typing
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from django.utils import timezone
+
+from task_processor.decorators import register_task_handler
+from task_processor.exceptions import TaskBackoffError
+from task_processor.models import Task, TaskResult
+from task_processor.process_pool import TaskProcessPool
+from task_processor.processor import TaskWorker, run_tasks
+from task_processor.task_registry import TaskExecutionBackend
+
+
+def _write_pid(path: str) -> None:
+    Path(path).write_text(str(os.getpid()))
+
+
+def _no_op() -> None:
+    pass
+
+
+def _sleep(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def _back_off(delay_until: str) -> None:
+    raise TaskBackoffError(delay_until=datetime.fromisoformat(delay_until))
+
+
+@pytest.fixture
+def process_pool() -> typing.Generator[TaskProcessPool, None, None]:
+    process_pool = TaskProcessPool(max_processes=1)
+    yield process_pool
+    process_pool.shutdown()
+
+
+@pytest.mark.django_db
+@pytest.mark.task_processor_mode
+def test_run_tasks__process_backend__runs_task_in_process(
+    process_pool: TaskProcessPool,
+    tmp_path: Path,
+) -> None:
+    # Given
+    task_handler = register_task_handler(
+        execution_backend=TaskExecutionBackend.PROCESS,
+    )(_write_pid)
+    pid_paths = [tmp_path / "first", tmp_path / "second"]
+    now = timezone.now()
+    Task.objects.bulk_create(
+        [
+            Task.create(
+                task_handler.task_identifier,
+                scheduled_for=now - timedelta(seconds=len(pid_paths) - index),
+                args=(str(pid_path),),
+            )
+            for index, pid_path in enumerate(pid_paths)
+        ]
+    )
+
+    # When
+    task_runs = run_tasks(
+        "default",
+        len(pid_paths),
+        worker=TaskWorker(process_pool=process_pool),
+    )
+
+    # Then
+    assert [task_run.result for task_run in task_runs] == [
+        TaskResult.SUCCESS.value
+    ] * len(pid_paths)
+    pids = {pid_path.read_text() for pid_path in pid_paths}
+    assert len(pids) == 1  # The process is reused
+    assert str(os.getpid()) not in pids
+
+
+@pytest.mark.django_db
+@pytest.mark.task_processor_mode
+def test_run_tasks__process_backend_empty_payload__runs_task(
+    process_pool: TaskProcessPool,
+) -> None:
+    # Given
+    task_handler = register_task_handler(
+        execution_backend=TaskExecutionBackend.PROCESS,
+    )(_no_op)
+    Task.objects.create(
+        task_identifier=task_handler.task_identifier,
+        serialized_args=None,
+        serialized_kwargs=None,
+    )
+
+    # When
+    task_runs = run_tasks("default", worker=TaskWorker(process_pool=process_pool))
+
+    # Then
+    assert [task_run.result for task_run in task_runs] == [TaskResult.SUCCESS.value]
+
+
+@pytest.mark.django_db
+@pytest.mark.task_processor_mode
+def test_run_tasks__process_backend_task_timeout__kills_process(
+    process_pool: TaskProcessPool,
+) -> None:
+    # Given
+    task_handler = register_task_handler(
+        execution_backend=TaskExecutionBackend.PROCESS,
+        timeout=timedelta(milliseconds=500),
+    )(_sleep)
+    task = Task.create(
+        task_handler.task_identifier,
+        scheduled_for=timezone.now(),
+        args=(60,),
+        timeout=task_handler.timeout,
+    )
+    task.save()
+
+    # When
+    started_at = time.monotonic()
+    task_runs = run_tasks("default", worker=TaskWorker(process_pool=process_pool))
+
+    # Then
+    assert time.monotonic() - started_at < 30
+    assert task_runs[0].result == TaskResult.FAILURE.value
+    assert "TimeoutError" in (task_runs[0].error_details or "")
+    assert not process_pool._idle_processes
+
+
+@pytest.mark.django_db
+@pytest.mark.task_processor_mode
+def test_run_tasks__process_backend_task_backs_off__reschedules_task(
+    process_pool: TaskProcessPool,
+) -> None:
+    # Given
+    task_handler = register_task_handler(
+        execution_backend=TaskExecutionBackend.PROCESS,
+    )(_back_off)
+    delay_until = timezone.now() + timedelta(hours=1)
+    task = Task.create(
+        task_handler.task_identifier,
+        scheduled_for=timezone.now(),
+        args=(delay_until.isoformat(),),
+    )
+    task.save()
+
+    # When
+    task_runs = run_tasks("default", worker=TaskWorker(process_pool=process_pool))
+
+    # Then
+    assert task_runs[0].result == TaskResult.FAILURE.value
+    task.refresh_from_db()
+    assert task.scheduled_for == delay_until
+    assert len(process_pool._idle_processes) == 1
+
+
+def test_register_task_handler__process_backend_local_function__raises() -> None:
+    # Given
+    def my_function() -> None: ...
+
+    # When / Then
+    with pytest.raises(ValueError):
+        register_task_handler(execution_backend=TaskExecutionBackend.PROCESS)(
+            my_function
+        )
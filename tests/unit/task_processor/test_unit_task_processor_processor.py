@@ -1,11 +1,15 @@
+import asyncio
 import logging
+import threading
 import time
 import uuid
 from datetime import datetime, timedelta
 from threading import Thread
 
+import prometheus_client
 import pytest
 from django.core.cache import cache
+from django.db import connections
 from django.utils import timezone
 from freezegun import freeze_time
 from opentelemetry import trace
@@ -13,7 +17,7 @@ from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
     InMemorySpanExporter,
 )
 from opentelemetry.trace import StatusCode
-from pytest_django.fixtures import SettingsWrapper
+from pytest_django.fixtures import DjangoAssertNumQueries, SettingsWrapper
 from pytest_mock import MockerFixture
 
 from common.test_tools.types import AssertMetricFixture, RunTasksFixture
@@ -23,6 +27,7 @@ from task_processor.decorators import (
     register_task_handler,
 )
 from task_processor.exceptions import TaskAbandonedError, TaskBackoffError
+from task_processor.managers import TaskManager
 from task_processor.models import (
     RecurringTask,
     RecurringTaskRun,
@@ -33,10 +38,12 @@ from task_processor.models import (
 )
 from task_processor.processor import (
     UNREGISTERED_RECURRING_TASK_GRACE_PERIOD,
+    TaskWorker,
     run_recurring_task,
     run_tasks,
 )
 from task_processor.task_registry import initialise, registered_tasks
+from task_processor.threads import EventLoopThread
 
 DEFAULT_CACHE_KEY = "foo"
 DEFAULT_CACHE_VALUE = "bar"
@@ -107,6 +114,8 @@ def test_run_task__success__creates_task_run_object(
 
     task.refresh_from_db(using=current_database)
     assert task.completed
+    assert task.finished_at == task_run.finished_at
+    assert task.last_error is None
 
 
 @pytest.mark.multi_database
@@ -542,6 +551,8 @@ def test_run_task__failure__creates_task_run_object(
 
     task.refresh_from_db(using=current_database)
     assert not task.completed
+    assert task.finished_at
+    assert task.last_error == task_run.error_details
 
     logs = [(record.levelno, record.message) for record in caplog.records]
     assert logs == [
@@ -796,6 +807,96 @@ def test_run_task__multiple_priorities__runs_in_correct_order(
     assert task_runs_3[0].task == task_2
 
 
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__priority_aging__runs_tasks_by_aged_priority(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    now = timezone.now()
+    # Tasks are due at the commented number of seconds from now,
+    # aging one priority point per second
+    lower_task, highest_task, low_task, high_task = Task.objects.using(
+        current_database
+    ).bulk_create(
+        [
+            Task.create(  # -50
+                dummy_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=150),
+                priority=TaskPriority.LOWER,
+            ),
+            Task.create(  # -10
+                dummy_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=10),
+                priority=TaskPriority.HIGHEST,
+            ),
+            Task.create(  # 15
+                dummy_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=60),
+                priority=TaskPriority.LOW,
+            ),
+            Task.create(  # 24
+                dummy_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=1),
+                priority=TaskPriority.HIGH,
+            ),
+        ]
+    )
+    # Tasks without a priority age as `LOWER` priority tasks: -100
+    unprioritised_task = Task.create(
+        dummy_task.task_identifier,
+        scheduled_for=now - timedelta(seconds=200),
+    )
+    unprioritised_task.priority = None
+    unprioritised_task.save(using=current_database)
+
+    # When
+    task_runs_1 = run_tasks(current_database, 2, priority_aging=timedelta(seconds=1))
+    task_runs_2 = run_tasks(current_database, 3, priority_aging=timedelta(seconds=1))
+
+    # Then
+    assert [task_run.task for task_run in task_runs_1] == [
+        unprioritised_task,
+        lower_task,
+    ]
+    assert [task_run.task for task_run in task_runs_2] == [
+        highest_task,
+        low_task,
+        high_task,
+    ]
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__no_priority_aging__runs_tasks_by_priority(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    now = timezone.now()
+    lower_task, highest_task = Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(
+                dummy_task.task_identifier,
+                scheduled_for=now - timedelta(days=1),
+                priority=TaskPriority.LOWER,
+            ),
+            Task.create(
+                dummy_task.task_identifier,
+                scheduled_for=now,
+                priority=TaskPriority.HIGHEST,
+            ),
+        ]
+    )
+
+    # When
+    task_runs = run_tasks(current_database, 2)
+
+    # Then
+    assert [task_run.task for task_run in task_runs] == [highest_task, lower_task]
+
+
 @pytest.mark.parametrize(
     "exception, expected_scheduled_for",
     [
@@ -1015,6 +1116,56 @@ def test_run_tasks__tasks_executed__expected_metrics(
     )
 
 
+@pytest.mark.django_db
+@pytest.mark.task_processor_mode
+def test_run_tasks__task_due_in_past__observes_queue_latency(
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    now = timezone.now()
+    Task.create(
+        dummy_task.task_identifier,
+        scheduled_for=now - timedelta(seconds=1),
+        args=("arg1", "arg2"),
+        priority=TaskPriority.HIGH,
+    ).save()
+    created_later_task = Task.create(
+        dummy_task.task_identifier,
+        scheduled_for=now,
+        args=("arg1", "arg2"),
+        priority=TaskPriority.LOW,
+    )
+    created_later_task.save()
+    # Tasks are due from their creation, if scheduled before
+    Task.objects.filter(pk=created_later_task.pk).update(
+        scheduled_for=now - timedelta(hours=1),
+        created_at=now - timedelta(minutes=1),
+    )
+
+    # When
+    with freeze_time(now + timedelta(minutes=1)):
+        run_tasks("default", 2)
+
+    # Then
+    for priority, expected_latency_seconds in (
+        (TaskPriority.HIGH, 60),
+        (TaskPriority.LOW, 120),
+    ):
+        labels = {
+            "task_identifier": dummy_task.task_identifier,
+            "priority": str(priority.value),
+        }
+        assert (
+            prometheus_client.REGISTRY.get_sample_value(
+                "flagsmith_task_processor_task_queue_latency_seconds_count", labels
+            )
+            == 1
+        )
+        assert prometheus_client.REGISTRY.get_sample_value(
+            "flagsmith_task_processor_task_queue_latency_seconds_sum", labels
+        ) == pytest.approx(expected_latency_seconds, abs=1)
+
+
 @pytest.mark.multi_database(transaction=True)
 @pytest.mark.task_processor_mode
 def test_run_tasks__locked_task__skips_locked(
@@ -1097,6 +1248,416 @@ def test_run_tasks__multiple_tasks__runs_all(
         assert task.completed
 
 
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__success_sample_rate_zero__only_records_failed_runs(
+    current_database: str,
+    settings: SettingsWrapper,
+    dummy_task: TaskHandler[[str, str]],
+    raise_exception_task: TaskHandler[[str]],
+) -> None:
+    # Given
+    settings.TASK_RUN_SUCCESS_SAMPLE_RATE = 0
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(dummy_task.task_identifier, scheduled_for=now),
+            Task.create(
+                raise_exception_task.task_identifier,
+                scheduled_for=now,
+                args=("Error!",),
+            ),
+        ]
+    )
+
+    # When
+    task_runs = run_tasks(current_database, 2)
+
+    # Then
+    assert len(task_runs) == 2
+    assert list(
+        TaskRun.objects.using(current_database).values_list("result", flat=True)
+    ) == [TaskResult.FAILURE.value]
+    assert (
+        Task.objects.using(current_database)
+        .filter(completed=True, finished_at__isnull=False)
+        .exists()
+    )
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__queues__runs_tasks_from_queues(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(dummy_task.task_identifier, scheduled_for=now, queue=queue)
+            for queue in ["default", "bulk", "other"]
+        ]
+    )
+
+    # When
+    task_runs = run_tasks(current_database, 5, queues=["bulk", "other"])
+
+    # Then
+    assert sorted(task_run.task.queue for task_run in task_runs) == [
+        "bulk",
+        "other",
+    ]
+    assert Task.objects.using(current_database).get(completed=False).queue == (
+        "default"
+    )
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__max_concurrency__skips_tasks_over_cap(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            # Already running elsewhere
+            Task.create(
+                dummy_task.task_identifier, scheduled_for=now, max_concurrency=2
+            ),
+            *(
+                Task.create(
+                    dummy_task.task_identifier,
+                    scheduled_for=now - timedelta(seconds=1),
+                    max_concurrency=2,
+                )
+                for _ in range(3)
+            ),
+        ]
+    )
+    Task.objects.using(current_database).filter(scheduled_for=now).update(
+        is_locked=True
+    )
+
+    # When
+    task_runs = run_tasks(current_database, 5)
+
+    # Then
+    assert len(task_runs) == 1
+    assert Task.objects.using(current_database).filter(completed=False).count() == 3
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__max_concurrency_changed__queued_tasks_keep_their_cap(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            # Already running elsewhere
+            Task.create(
+                dummy_task.task_identifier, scheduled_for=now, max_concurrency=1
+            ),
+            # Enqueued before the cap was raised
+            Task.create(
+                dummy_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=1),
+                max_concurrency=1,
+            ),
+            # Enqueued after the cap was raised
+            Task.create(
+                dummy_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=2),
+                max_concurrency=3,
+            ),
+        ]
+    )
+    Task.objects.using(current_database).filter(scheduled_for=now).update(
+        is_locked=True
+    )
+
+    # When
+    task_runs = run_tasks(current_database, 5)
+
+    # Then
+    # each task enforces the cap it was enqueued with
+    assert [task_run.task.max_concurrency for task_run in task_runs] == [3]
+    assert (
+        Task.objects.using(current_database).get(completed=False, is_locked=False)
+    ).max_concurrency == 1
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_get_tasks_to_process__capped_tasks_backlog__reads_candidates_only(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    @register_task_handler()
+    def capped_task() -> None: ...
+
+    backlog_size = 1000
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            *(
+                Task.create(
+                    capped_task.task_identifier,
+                    scheduled_for=now - timedelta(seconds=index),
+                    max_concurrency=2,
+                )
+                for index in range(backlog_size)
+            ),
+            *(
+                Task.create(
+                    dummy_task.task_identifier,
+                    scheduled_for=now - timedelta(seconds=index),
+                )
+                for index in range(backlog_size)
+            ),
+        ]
+    )
+    task_manager: TaskManager = Task.objects.db_manager(current_database)
+    stats_query = (
+        "SELECT seq_scan, seq_tup_read + idx_tup_fetch "
+        "FROM pg_stat_xact_user_tables WHERE relname = 'task_processor_task'"
+    )
+    with connections[current_database].cursor() as cursor:
+        cursor.execute("ANALYZE task_processor_task")
+        # Half of the tasks are capped, so scanning the table would find one quickly
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(stats_query)
+        seq_scans_before, rows_read_before = cursor.fetchone()
+
+    # When
+    tasks = list(task_manager.get_tasks_to_process(5))
+
+    # Then
+    with connections[current_database].cursor() as cursor:
+        cursor.execute(stats_query)
+        seq_scans_after, rows_read_after = cursor.fetchone()
+    assert len(tasks) == 5
+    assert seq_scans_after == seq_scans_before
+    # The capped tasks are locked among the candidates, not across the backlog
+    assert rows_read_after - rows_read_before < backlog_size
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+@pytest.mark.parametrize("fair_share", [True, False])
+def test_run_tasks__capped_tasks_backlog_at_cap__runs_tasks_behind_it(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+    fair_share: bool,
+) -> None:
+    # Given
+    @register_task_handler()
+    def capped_task() -> None: ...
+
+    num_tasks = 2
+    # More than all candidates considered for a batch
+    backlog_size = num_tasks * 10 + 5
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            # Already running elsewhere
+            Task.create(
+                capped_task.task_identifier, scheduled_for=now, max_concurrency=1
+            ),
+            *(
+                Task.create(
+                    capped_task.task_identifier,
+                    scheduled_for=now - timedelta(minutes=1, seconds=index),
+                    max_concurrency=1,
+                )
+                for index in range(backlog_size)
+            ),
+            Task.create(
+                dummy_task.task_identifier, scheduled_for=now, args=("foo", "bar")
+            ),
+        ]
+    )
+    Task.objects.using(current_database).filter(
+        task_identifier=capped_task.task_identifier, scheduled_for=now
+    ).update(is_locked=True)
+
+    # When
+    task_runs = run_tasks(current_database, num_tasks, fair_share=fair_share)
+
+    # Then
+    assert [task_run.task.task_identifier for task_run in task_runs] == [
+        dummy_task.task_identifier
+    ]
+    assert (
+        Task.objects.using(current_database)
+        .filter(task_identifier=capped_task.task_identifier, is_locked=False)
+        .count()
+        == backlog_size
+    )
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__fair_share__interleaves_task_identifiers(
+    current_database: str,
+) -> None:
+    # Given
+    @register_task_handler()
+    def bursty_task() -> None: ...
+
+    @register_task_handler()
+    def other_task() -> None: ...
+
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            # The burst is enqueued first
+            *(
+                Task.create(
+                    bursty_task.task_identifier,
+                    scheduled_for=now - timedelta(seconds=10 - index),
+                )
+                for index in range(5)
+            ),
+            Task.create(other_task.task_identifier, scheduled_for=now),
+        ]
+    )
+
+    # When
+    task_runs = run_tasks(current_database, 2, fair_share=True)
+
+    # Then
+    assert sorted(task_run.task.task_identifier for task_run in task_runs) == [
+        bursty_task.task_identifier,
+        other_task.task_identifier,
+    ]
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__task_run__releases_lease(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    task = Task.create(
+        dummy_task.task_identifier,
+        scheduled_for=timezone.now(),
+        args=("arg1", "arg2"),
+        timeout=timedelta(minutes=5),
+    )
+    task.save(using=current_database)
+    task_manager: TaskManager = Task.objects.db_manager(current_database)
+    list(task_manager.get_tasks_to_process(1))
+    task.refresh_from_db(using=current_database)
+    claimed_lease_expires_at = task.lease_expires_at
+    Task.objects.using(current_database).filter(pk=task.pk).update(is_locked=False)
+
+    # When
+    run_tasks(current_database)
+
+    # Then
+    # the lease taken when claiming the task covers its timeout, and a grace period
+    assert claimed_lease_expires_at
+    assert (
+        timedelta(minutes=5, seconds=50)
+        < claimed_lease_expires_at - timezone.now()
+        <= timedelta(minutes=6)
+    )
+    # and is released once the task finished
+    task.refresh_from_db(using=current_database)
+    assert task.completed
+    assert task.lease_expires_at is None
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__task_run__records_start(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    task = Task.create(
+        dummy_task.task_identifier,
+        scheduled_for=timezone.now(),
+        args=("arg1", "arg2"),
+    )
+    task.save(using=current_database)
+    started_before = timezone.now()
+
+    # When
+    run_tasks(current_database)
+
+    # Then
+    task.refresh_from_db(using=current_database)
+    assert task.completed
+    # so that a failure is counted if the task processor dies while running it
+    assert task.started_at
+    assert started_before <= task.started_at <= timezone.now()
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__unexpired_lease__skips_task(
+    current_database: str,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    task = Task.create(
+        dummy_task.task_identifier,
+        scheduled_for=timezone.now() - timedelta(hours=1),
+        args=("arg1", "arg2"),
+    )
+    task.save(using=current_database)
+    Task.objects.using(current_database).filter(pk=task.pk).update(
+        is_locked=True,
+        lease_expires_at=timezone.now() + timedelta(minutes=1),
+    )
+
+    # When
+    task_runs = run_tasks(current_database)
+
+    # Then
+    assert task_runs == []
+    task.refresh_from_db(using=current_database)
+    assert task.is_locked
+    assert task.num_failures == 0
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__multiple_tasks__claims_batch_in_single_query(
+    current_database: str,
+    django_assert_num_queries: DjangoAssertNumQueries,
+    dummy_task: TaskHandler[[str, str]],
+) -> None:
+    # Given
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(dummy_task.task_identifier, scheduled_for=timezone.now())
+            for _ in range(5)
+        ]
+    )
+
+    # When
+    with django_assert_num_queries(4, connection=connections[current_database]):
+        # 1. Claim the batch of tasks
+        # 2. Record the start of the batch
+        # 3. Update the tasks
+        # 4. Create the task runs
+        task_runs = run_tasks(current_database, 5)
+
+    # Then
+    assert len(task_runs) == 5
+    assert not Task.objects.using(current_database).filter(completed=False).exists()
+
+
 @pytest.mark.multi_database
 @pytest.mark.task_processor_mode
 def test_recurring_tasks__picked_up_but_not_executed__are_unlocked(
@@ -1133,6 +1694,58 @@ def test_recurring_tasks__picked_up_but_not_executed__are_unlocked(
     assert recurring_task.is_locked is False
 
 
+@pytest.mark.multi_database(transaction=True)
+@pytest.mark.task_processor_mode
+def test_run_recurring_task__success__schedules_next_run(
+    current_database: str,
+) -> None:
+    # Given
+    @register_recurring_task(run_every=timedelta(hours=1))
+    def my_task() -> None:
+        pass
+
+    initialise()
+
+    # When
+    task_run = run_recurring_task(current_database)
+
+    # Then
+    assert task_run
+    recurring_task = RecurringTask.objects.using(current_database).get(
+        task_identifier="test_unit_task_processor_processor.my_task"
+    )
+    assert recurring_task.next_run_at == task_run.started_at + timedelta(hours=1)
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_recurring_task__not_due__not_picked_up(
+    current_database: str,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    # Given
+    @register_recurring_task(run_every=timedelta(hours=1))
+    def my_task() -> None:
+        pass
+
+    initialise()
+
+    RecurringTask.objects.using(current_database).update(
+        next_run_at=timezone.now() + timedelta(minutes=1)
+    )
+
+    # When
+    with django_assert_num_queries(1, connection=connections[current_database]):
+        task_run = run_recurring_task(current_database)
+
+    # Then
+    assert task_run is None
+    recurring_task = RecurringTask.objects.using(current_database).get(
+        task_identifier="test_unit_task_processor_processor.my_task"
+    )
+    assert recurring_task.last_picked_at is None
+
+
 @pytest.mark.multi_database
 @pytest.mark.task_processor_mode
 def test_run_task__timeout__does_not_block(
@@ -1177,6 +1790,246 @@ def test_run_task__timeout__does_not_block(
     assert task.num_failures == 1
 
 
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__shared_worker__runs_tasks_on_same_thread(
+    current_database: str,
+) -> None:
+    # Given
+    thread_idents = []
+
+    @register_task_handler()
+    def _thread_ident_task() -> None:
+        thread_idents.append(threading.get_ident())
+
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(
+                _thread_ident_task.task_identifier, scheduled_for=timezone.now()
+            )
+            for _ in range(2)
+        ]
+    )
+
+    worker = TaskWorker()
+
+    # When
+    run_tasks(current_database, worker=worker)
+    run_tasks(current_database, worker=worker)
+    worker.shutdown()
+
+    # Then
+    assert len(thread_idents) == 2
+    assert thread_idents[0] == thread_idents[1]
+    assert threading.get_ident() not in thread_idents
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__shared_worker__counts_tasks_in_flight(
+    current_database: str,
+) -> None:
+    # Given
+    worker = TaskWorker()
+    num_in_flight = []
+
+    @register_task_handler()
+    def _num_in_flight_task() -> None:
+        num_in_flight.append(worker.num_in_flight)
+
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(
+                _num_in_flight_task.task_identifier, scheduled_for=timezone.now()
+            )
+            for _ in range(2)
+        ]
+    )
+
+    # When
+    run_tasks(current_database, 2, worker=worker)
+    worker.shutdown()
+
+    # Then
+    assert num_in_flight == [2, 2]
+    assert worker.num_in_flight == 0
+    assert worker.last_claimed_at is not None
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__worker_released__skips_unstarted_tasks(
+    current_database: str,
+) -> None:
+    # Given
+    worker = TaskWorker()
+    released_tasks = []
+
+    @register_task_handler()
+    def _releasing_task() -> None:
+        released_tasks.extend(worker.release())
+
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(
+                _releasing_task.task_identifier,
+                scheduled_for=timezone.now() - timedelta(seconds=seconds),
+            )
+            for seconds in (2, 1)
+        ]
+    )
+    first_task, second_task = Task.objects.using(current_database).order_by(
+        "scheduled_for"
+    )
+
+    # When
+    task_runs = run_tasks(current_database, 2, worker=worker)
+    worker.shutdown()
+
+    # Then
+    assert [task_run.task.pk for task_run in task_runs] == [first_task.pk]
+    assert released_tasks == [(current_database, second_task)]
+    second_task.refresh_from_db(using=current_database)
+    assert not second_task.completed
+    # the task is left to unlock to the releasing thread
+    assert second_task.is_locked
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__shared_worker_task_timeout__replaces_worker_thread(
+    current_database: str,
+) -> None:
+    # Given
+    thread_idents = []
+
+    @register_task_handler(timeout=timedelta(milliseconds=100))
+    def _thread_ident_task(seconds: float) -> None:
+        thread_idents.append(threading.get_ident())
+        time.sleep(seconds)
+
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(
+                _thread_ident_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=seconds),
+                args=(seconds,),
+                timeout=_thread_ident_task.timeout,
+            )
+            for seconds in (1, 0)
+        ]
+    )
+
+    worker = TaskWorker()
+
+    # When
+    task_runs = run_tasks(current_database, 2, worker=worker)
+    worker.shutdown()
+
+    # Then
+    assert [task_run.result for task_run in task_runs] == [
+        TaskResult.FAILURE.value,
+        TaskResult.SUCCESS.value,
+    ]
+    assert len(thread_idents) == 2
+    assert thread_idents[0] != thread_idents[1]
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__async_tasks_with_event_loop__awaits_tasks_concurrently(
+    current_database: str,
+) -> None:
+    # Given
+    num_tasks = 3
+    started: list[int] = []
+
+    @register_task_handler()
+    async def _async_task(task_number: int) -> None:
+        started.append(task_number)
+        # Only completes if all tasks are awaited at the same time
+        while len(started) < num_tasks:
+            await asyncio.sleep(0.01)
+
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(
+                _async_task.task_identifier,
+                scheduled_for=timezone.now(),
+                args=(task_number,),
+                timeout=timedelta(seconds=5),
+            )
+            for task_number in range(num_tasks)
+        ]
+    )
+
+    event_loop_thread = EventLoopThread(daemon=True)
+    event_loop_thread.start()
+    worker = TaskWorker(event_loop=event_loop_thread.loop)
+
+    # When
+    task_runs = run_tasks(current_database, num_tasks, worker=worker)
+    worker.shutdown()
+    event_loop_thread.stop()
+    event_loop_thread.join()
+
+    # Then
+    assert [task_run.result for task_run in task_runs] == [
+        TaskResult.SUCCESS.value
+    ] * num_tasks
+    assert sorted(started) == list(range(num_tasks))
+    assert not Task.objects.using(current_database).filter(completed=False).exists()
+
+
+@pytest.mark.multi_database
+@pytest.mark.task_processor_mode
+def test_run_tasks__async_task_timeout__fails_task(
+    current_database: str,
+) -> None:
+    # Given
+    @register_task_handler(timeout=timedelta(milliseconds=100))
+    async def _async_task(seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+    @register_task_handler()
+    def _sync_task() -> None:
+        pass
+
+    now = timezone.now()
+    Task.objects.using(current_database).bulk_create(
+        [
+            Task.create(
+                _sync_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=2),
+            ),
+            Task.create(
+                _async_task.task_identifier,
+                scheduled_for=now - timedelta(seconds=1),
+                args=(1,),
+                timeout=_async_task.timeout,
+            ),
+            Task.create(
+                _async_task.task_identifier,
+                scheduled_for=now,
+                args=(0,),
+                timeout=_async_task.timeout,
+            ),
+        ]
+    )
+
+    # When
+    task_runs = run_tasks(current_database, 3)
+
+    # Then
+    assert [task_run.result for task_run in task_runs] == [
+        TaskResult.SUCCESS.value,
+        TaskResult.FAILURE.value,
+        TaskResult.SUCCESS.value,
+    ]
+    assert "TimeoutError" in (task_runs[1].error_details or "")
+
+
 PARENT_TRACE_ID = 0x0AF7651916CD43DD8448EB211C80319C
 PARENT_SPAN_ID = 0xB7AD6B7169203331
 TRACEPARENT = f"00-{PARENT_TRACE_ID:032x}-{PARENT_SPAN_ID:016x}-01"
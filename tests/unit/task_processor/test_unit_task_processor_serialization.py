@@ -0,0 +1,131 @@
+import json
+
+import pytest
+from pytest_django.fixtures import SettingsWrapper
+
+from task_processor.exceptions import TaskProcessingError
+from task_processor.serialization import (
+    PayloadCodec,
+    deserialize,
+    register_codec,
+    registered_codecs,
+    serialize,
+)
+
+
+@pytest.fixture
+def reversed_codec(monkeypatch: pytest.MonkeyPatch) -> PayloadCodec:
+    codec = PayloadCodec(
+        name="reversed",
+        encode=lambda data: json.dumps(data)[::-1],
+        decode=lambda data: json.loads(data[::-1]),
+    )
+    monkeypatch.setitem(registered_codecs, codec.name, codec)
+    return codec
+
+
+def test_serialize__default_codec__returns_plain_json() -> None:
+    # Given
+    data = {"value": [1, "a:b"]}
+
+    # When
+    serialized = serialize(data)
+
+    # Then
+    assert serialized == '{"value": [1, "a:b"]}'
+    assert deserialize(serialized) == data
+
+
+def test_serialize__codec_setting__prefixes_codec_name(
+    settings: SettingsWrapper,
+    reversed_codec: PayloadCodec,
+) -> None:
+    # Given
+    settings.TASK_PAYLOAD_CODEC = reversed_codec.name
+
+    # When
+    serialized = serialize([1, 2])
+
+    # Then
+    assert serialized == "reversed:]2 ,1["
+    assert deserialize(serialized) == [1, 2]
+
+
+def test_deserialize__codec_setting__decodes_json_payloads(
+    settings: SettingsWrapper,
+    reversed_codec: PayloadCodec,
+) -> None:
+    # Given
+    serialized = serialize([1, 2])
+    settings.TASK_PAYLOAD_CODEC = reversed_codec.name
+
+    # When
+    deserialized = deserialize(serialized)
+
+    # Then
+    assert deserialized == [1, 2]
+
+
+def test_deserialize__unregistered_codec__raises() -> None:
+    # Given
+    serialized = "unknown:[1, 2]"
+
+    # When / Then
+    with pytest.raises(TaskProcessingError):
+        deserialize(serialized)
+
+
+def test_register_codec__invalid_name__raises() -> None:
+    # Given
+    codec = PayloadCodec(name="not valid", encode=json.dumps, decode=json.loads)
+
+    # When / Then
+    with pytest.raises(ValueError):
+        register_codec(codec)
+
+
+def test_serialize__payload_over_compression_threshold__compresses(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_PAYLOAD_COMPRESSION_THRESHOLD_BYTES = 100
+    data = [{"identifier": f"identity-{index}"} for index in range(100)]
+
+    # When
+    serialized = serialize(data)
+
+    # Then
+    assert serialized.startswith("gzip:")
+    assert len(serialized) < len(json.dumps(data)) / 2
+    assert deserialize(serialized) == data
+
+
+def test_serialize__payload_under_compression_threshold__does_not_compress(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_PAYLOAD_COMPRESSION_THRESHOLD_BYTES = 100
+    data = [1, 2]
+
+    # When
+    serialized = serialize(data)
+
+    # Then
+    assert serialized == "[1, 2]"
+
+
+def test_serialize__compressed_codec_payload__round_trips(
+    settings: SettingsWrapper,
+    reversed_codec: PayloadCodec,
+) -> None:
+    # Given
+    settings.TASK_PAYLOAD_CODEC = reversed_codec.name
+    settings.TASK_PAYLOAD_COMPRESSION_THRESHOLD_BYTES = 0
+    data = {"value": "x" * 10}
+
+    # When
+    serialized = serialize(data)
+
+    # Then
+    assert serialized.startswith("gzip:")
+    assert deserialize(serialized) == data
@@ -1,13 +1,23 @@
 from datetime import timedelta
 
 import pytest
+from django.db import connection
 from django.utils import timezone
+from freezegun import freeze_time
 from pytest_django.fixtures import DjangoAssertNumQueries, SettingsWrapper
 
-from task_processor.models import RecurringTask, RecurringTaskRun, Task
+from task_processor.models import (
+    RecurringTask,
+    RecurringTaskRun,
+    Task,
+    TaskResult,
+    TaskRun,
+)
+from task_processor.partitioning import NUM_PARTITIONS_AHEAD, is_partitioned
 from task_processor.tasks import (
     clean_up_old_recurring_task_runs,
     clean_up_old_tasks,
+    manage_task_run_partitions,
 )
 
 now = timezone.now()
@@ -192,3 +202,188 @@ def test_clean_up_old_recurring_task_runs__disabled__does_not_run(
 
     # Then
     assert RecurringTaskRun.objects.exists()
+
+
+@pytest.mark.django_db
+def test_clean_up_old_recurring_task_runs__partitioning_enabled__does_not_run(
+    settings: SettingsWrapper,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    # Given
+    settings.TASK_RUN_PARTITION_INTERVAL_DAYS = 1
+    recurring_task = RecurringTask.objects.create(
+        task_identifier="some_identifier", run_every=timedelta(seconds=1)
+    )
+    RecurringTaskRun.objects.create(
+        started_at=sixty_days_ago,
+        task=recurring_task,
+        finished_at=sixty_days_ago,
+    )
+
+    # When
+    with django_assert_num_queries(0):
+        clean_up_old_recurring_task_runs()
+
+    # Then
+    assert RecurringTaskRun.objects.exists()
+
+
+@pytest.mark.django_db
+def test_manage_task_run_partitions__partitioning_disabled__does_nothing(
+    settings: SettingsWrapper,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    # Given
+    settings.TASK_RUN_PARTITION_INTERVAL_DAYS = None
+
+    # When
+    with django_assert_num_queries(0):
+        manage_task_run_partitions()
+
+    # Then
+    assert not is_partitioned(TaskRun)
+    assert not is_partitioned(RecurringTaskRun)
+
+
+@pytest.mark.django_db
+def test_manage_task_run_partitions__partitioning_enabled__partitions_tables(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_PARTITION_INTERVAL_DAYS = 1
+    recurring_task = RecurringTask.objects.create(
+        task_identifier="some_identifier", run_every=timedelta(seconds=1)
+    )
+    existing_run = RecurringTaskRun.objects.create(
+        task=recurring_task,
+        started_at=one_day_ago,
+        finished_at=one_day_ago,
+    )
+
+    # When
+    manage_task_run_partitions()
+
+    # Then
+    assert is_partitioned(TaskRun)
+    assert is_partitioned(RecurringTaskRun)
+    new_run = RecurringTaskRun.objects.create(
+        task=recurring_task,
+        started_at=one_hour_from_now + timedelta(days=1),
+    )
+    assert new_run.pk > existing_run.pk
+    assert set(RecurringTaskRun.objects.all()) == {existing_run, new_run}
+
+
+@pytest.mark.django_db
+def test_manage_task_run_partitions__partitioning_enabled__reuses_existing_table_constraints(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_PARTITION_INTERVAL_DAYS = 1
+
+    # When
+    manage_task_run_partitions()
+
+    # Then
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, contype, conparentid <> 0 FROM pg_constraint "
+            "WHERE conrelid = ("
+            "  SELECT inhrelid FROM pg_inherits "
+            "  JOIN pg_class ON pg_class.oid = inhrelid "
+            "  WHERE inhparent = 'task_processor_taskrun'::regclass "
+            "  AND relname <> 'task_processor_taskrun_default' "
+            "  ORDER BY relname LIMIT 1"
+            ") ORDER BY contype"
+        )
+        constraints = cursor.fetchall()
+    # the primary key index built ahead of the lock, and the existing foreign
+    # key, are attached to the partitioned table's instead of being rebuilt
+    assert [(contype, is_attached) for _, contype, is_attached in constraints] == [
+        ("f", True),
+        ("p", True),
+    ]
+    assert constraints[1][0] == "task_processor_taskrun_id_started_at_uniq"
+
+
+@pytest.mark.django_db
+def test_manage_task_run_partitions__partitions_expired__drops_old_runs(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_PARTITION_INTERVAL_DAYS = 1
+    settings.TASK_DELETE_RETENTION_DAYS = 2
+    task = Task.objects.create(task_identifier="some.identifier", scheduled_for=now)
+    manage_task_run_partitions()
+    TaskRun.objects.bulk_create(
+        [
+            TaskRun(task=task, started_at=now, result=TaskResult.FAILURE.value),
+            TaskRun(task=task, started_at=now + timedelta(days=4)),
+        ]
+    )
+
+    # When
+    with freeze_time(now + timedelta(days=5)):
+        manage_task_run_partitions()
+
+    # Then
+    assert list(TaskRun.objects.values_list("started_at", flat=True)) == [
+        now + timedelta(days=4)
+    ]
+    task.delete()
+    assert not TaskRun.objects.exists()
+
+
+@pytest.mark.django_db
+def test_manage_task_run_partitions__clean_up_disabled__creates_partitions_only(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_PARTITION_INTERVAL_DAYS = 1
+    settings.TASK_DELETE_RETENTION_DAYS = 2
+    settings.ENABLE_CLEAN_UP_OLD_TASKS = False
+    task = Task.objects.create(task_identifier="some.identifier", scheduled_for=now)
+    TaskRun.objects.create(task=task, started_at=now, result=TaskResult.FAILURE.value)
+
+    # When
+    with freeze_time(now + timedelta(days=5)):
+        manage_task_run_partitions()
+
+    # Then
+    assert is_partitioned(TaskRun)
+    assert TaskRun.objects.filter(started_at=now).exists()
+    # partitions exist ahead, so new runs do not land in the default partition
+    new_run = TaskRun.objects.create(task=task, started_at=now + timedelta(days=10))
+    assert not TaskRun.objects.raw(
+        "SELECT * FROM task_processor_taskrun_default WHERE id = %s", [new_run.pk]
+    )
+
+
+@pytest.mark.django_db
+def test_manage_task_run_partitions__not_run_for_longer_than_partitions_ahead__moves_default_runs(
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_RUN_PARTITION_INTERVAL_DAYS = 1
+    settings.TASK_DELETE_RETENTION_DAYS = 30
+    task = Task.objects.create(task_identifier="some.identifier", scheduled_for=now)
+    manage_task_run_partitions()
+    later = now + timedelta(days=NUM_PARTITIONS_AHEAD + 3)
+    later_run = TaskRun.objects.create(
+        task=task, started_at=later, result=TaskResult.SUCCESS.value
+    )
+
+    # When
+    with freeze_time(later):
+        manage_task_run_partitions()
+
+    # Then
+    assert (
+        list(TaskRun.objects.raw("SELECT * FROM task_processor_taskrun_default")) == []
+    )
+    assert list(TaskRun.objects.all()) == [later_run]
+
+    # partitions keep being managed on later runs
+    with freeze_time(later + timedelta(days=31)):
+        manage_task_run_partitions()
+    assert not TaskRun.objects.exists()
@@ -1,11 +1,21 @@
+import asyncio
 import logging
+import time
+from datetime import timedelta
 
+import prometheus_client
 import pytest
-from django.db import DatabaseError
-from pytest_django.fixtures import SettingsWrapper
+from django.db import DatabaseError, connections
+from django.utils import timezone
+from pytest_django.fixtures import DjangoAssertNumQueries, SettingsWrapper
 from pytest_mock import MockerFixture
 
+from common.test_tools import AssertMetricFixture
 from task_processor import threads
+from task_processor.decorators import register_task_handler
+from task_processor.models import Task, TaskProcessorHeartbeat
+from task_processor.task_run_method import TaskRunMethod
+from task_processor.types import TaskProcessorConfig
 
 
 @pytest.mark.parametrize(
@@ -55,18 +65,32 @@ def test_task_runner__multi_database___consumes_tasks_from_multiple_databases(
     settings.TASK_PROCESSOR_DATABASES = ["default", "task_processor"]
     run_tasks = mocker.patch.object(threads, "run_tasks")
     run_recurring_task = mocker.patch.object(threads, "run_recurring_task")
-    task_runner = mocker.Mock()
+    task_runner = mocker.Mock(_stopped=False)
 
     # When
     threads.TaskRunner.run_iteration(task_runner)
 
     # Then
     assert run_tasks.call_args_list == [
-        mocker.call("default", task_runner.queue_pop_size),
-        mocker.call("task_processor", task_runner.queue_pop_size),
+        mocker.call(
+            "default",
+            task_runner.queue_pop_size,
+            task_runner.worker,
+            queues=task_runner.queues,
+            fair_share=task_runner.fair_share,
+            priority_aging=task_runner.priority_aging,
+        ),
+        mocker.call(
+            "task_processor",
+            task_runner.queue_pop_size,
+            task_runner.worker,
+            queues=task_runner.queues,
+            fair_share=task_runner.fair_share,
+            priority_aging=task_runner.priority_aging,
+        ),
     ]
     assert run_recurring_task.call_args_list == [
-        mocker.call("task_processor"),
+        mocker.call("task_processor", task_runner.worker),
     ]
 
 
@@ -79,15 +103,846 @@ def test_task_runner__single_database___consumes_tasks_from_one_databases(
     # Given
     run_tasks = mocker.patch.object(threads, "run_tasks")
     run_recurring_task = mocker.patch.object(threads, "run_recurring_task")
-    task_runner = mocker.Mock()
+    task_runner = mocker.Mock(_stopped=False)
 
     # When
     threads.TaskRunner.run_iteration(task_runner)
 
     # Then
     assert run_tasks.call_args_list == [
-        mocker.call(current_database, task_runner.queue_pop_size),
+        mocker.call(
+            current_database,
+            task_runner.queue_pop_size,
+            task_runner.worker,
+            queues=task_runner.queues,
+            fair_share=task_runner.fair_share,
+            priority_aging=task_runner.priority_aging,
+        ),
     ]
     assert run_recurring_task.call_args_list == [
-        mocker.call(current_database),
+        mocker.call(current_database, task_runner.worker),
+    ]
+
+
+@pytest.mark.parametrize(
+    "task_processor_databases",
+    [["default"], ["default", "task_processor"]],
+)
+def test_task_runner_run_iteration__stopped_while_running_tasks__claims_no_more_tasks(
+    mocker: MockerFixture,
+    settings: SettingsWrapper,
+    task_processor_databases: list[str],
+) -> None:
+    # Given
+    settings.TASK_PROCESSOR_DATABASES = task_processor_databases
+    task_runner = threads.TaskRunner()
+
+    def _stopping_run_tasks(*args: object, **kwargs: object) -> list[object]:
+        task_runner.stop()
+        return [mocker.Mock()]
+
+    run_tasks = mocker.patch.object(
+        threads, "run_tasks", side_effect=_stopping_run_tasks
+    )
+    run_recurring_task = mocker.patch.object(threads, "run_recurring_task")
+
+    # When
+    num_tasks = task_runner.run_iteration()
+
+    # Then
+    assert num_tasks == 1
+    assert [call.args[0] for call in run_tasks.call_args_list] == ["default"]
+    run_recurring_task.assert_not_called()
+
+
+@pytest.mark.multi_database
+def test_task_runner_run_iteration__tasks_run__returns_number_of_tasks(
+    current_database: str,
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    mocker.patch.object(threads, "run_tasks", return_value=[mocker.Mock()] * 3)
+    mocker.patch.object(threads, "run_recurring_task", return_value=mocker.Mock())
+    task_runner = threads.TaskRunner(queue_pop_size=5)
+
+    # When
+    num_tasks = task_runner.run_iteration()
+
+    # Then
+    assert num_tasks == 4
+
+
+def test_task_runner_get_sleep_interval_millis__idle__backs_off_until_activity(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    mocker.patch("task_processor.threads.random.uniform", side_effect=lambda a, b: b)
+    task_runner = threads.TaskRunner(
+        sleep_interval_millis=100,
+        max_sleep_interval_millis=1000,
+        queue_pop_size=10,
+    )
+
+    # When
+    sleep_intervals = [
+        task_runner.get_sleep_interval_millis(num_tasks)
+        for num_tasks in [0, 0, 0, 0, 0, 0, 3, 0, 10, 0]
+    ]
+
+    # Then
+    assert sleep_intervals == [100, 200, 400, 800, 1000, 1000, 100, 100, 0, 100]
+
+
+def test_task_runner_get_sleep_interval_millis__idle__jitters_between_bounds() -> None:
+    # Given
+    task_runner = threads.TaskRunner(
+        sleep_interval_millis=100,
+        max_sleep_interval_millis=1000,
+    )
+    for _ in range(5):
+        task_runner.get_sleep_interval_millis(0)
+
+    # When
+    sleep_intervals = [task_runner.get_sleep_interval_millis(0) for _ in range(20)]
+
+    # Then
+    assert all(100 <= sleep_interval <= 1000 for sleep_interval in sleep_intervals)
+    assert len(set(sleep_intervals)) > 1
+
+
+def test_task_runner__recurring_tasks_disabled__only_consumes_tasks(
+    mocker: MockerFixture,
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.TASK_PROCESSOR_DATABASES = ["default"]
+    run_tasks = mocker.patch.object(threads, "run_tasks", return_value=[])
+    run_recurring_task = mocker.patch.object(threads, "run_recurring_task")
+    task_runner = threads.TaskRunner(queues=["bulk"], run_recurring_tasks=False)
+
+    # When
+    task_runner.run_iteration()
+
+    # Then
+    run_tasks.assert_called_once_with(
+        "default",
+        task_runner.queue_pop_size,
+        task_runner.worker,
+        queues=["bulk"],
+        fair_share=False,
+        priority_aging=None,
+    )
+    run_recurring_task.assert_not_called()
+
+
+def test_task_runner__stopped__closes_connections(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    task_runner = threads.TaskRunner()
+
+    def run_iteration() -> int:
+        task_runner.stop()
+        return 0
+
+    mocker.patch.object(task_runner, "run_iteration", side_effect=run_iteration)
+    close_all = mocker.patch.object(connections, "close_all")
+
+    # When
+    task_runner.run()
+
+    # Then
+    close_all.assert_called_once_with()
+
+
+def test_task_runner__woken_up__checks_for_tasks_before_sleep_interval(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    task_runner = threads.TaskRunner(sleep_interval_millis=60_000)
+    iterations = []
+
+    def run_iteration() -> int:
+        iterations.append(time.monotonic())
+        if len(iterations) == 2:
+            task_runner.stop()
+        return 0
+
+    mocker.patch.object(task_runner, "run_iteration", side_effect=run_iteration)
+    task_runner.start()
+
+    # When
+    task_runner.wake()
+    task_runner.join(timeout=5)
+
+    # Then
+    assert not task_runner.is_alive()
+    assert len(iterations) == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_task_notification_listener__task_enqueued__wakes_runners(
+    mocker: MockerFixture,
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.ENABLE_TASK_PROCESSOR_NOTIFY = True
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler()
+    def my_task() -> None: ...
+
+    runner = mocker.Mock(spec=threads.TaskRunner)
+    listener = threads.TaskNotificationListener(
+        runners=[runner],
+        poll_interval_seconds=0.1,
+    )
+    listener.start()
+    time.sleep(0.5)  # wait for the listener to subscribe
+
+    # When
+    my_task.delay()
+
+    # Then
+    for _ in range(50):
+        if runner.wake.called:
+            break
+        time.sleep(0.1)
+    listener.stop()
+    listener.join(timeout=5)
+
+    runner.wake.assert_called_once_with()
+    assert not listener.is_alive()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_task_notification_listener__future_task_enqueued__does_not_wake_runners(
+    mocker: MockerFixture,
+    settings: SettingsWrapper,
+) -> None:
+    # Given
+    settings.ENABLE_TASK_PROCESSOR_NOTIFY = True
+    settings.TASK_RUN_METHOD = TaskRunMethod.TASK_PROCESSOR
+
+    @register_task_handler()
+    def my_task() -> None: ...
+
+    runner = mocker.Mock(spec=threads.TaskRunner)
+    listener = threads.TaskNotificationListener(
+        runners=[runner],
+        poll_interval_seconds=0.1,
+    )
+    listener.start()
+    time.sleep(0.5)  # wait for the listener to subscribe
+
+    # When
+    my_task.delay(delay_until=timezone.now() + timedelta(hours=1))
+
+    # Then
+    time.sleep(0.5)
+    listener.stop()
+    listener.join(timeout=5)
+
+    runner.wake.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_task_runner_coordinator__async_task_registered__shares_event_loop(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    @register_task_handler()
+    async def my_task() -> None: ...
+
+    task_runner_mock = mocker.patch.object(threads, "TaskRunner")
+    coordinator = threads.TaskRunnerCoordinator(
+        config=TaskProcessorConfig(
+            num_threads=2,
+            sleep_interval_ms=500,
+            grace_period_ms=10_000,
+            queue_pop_size=1,
+        ),
+    )
+    mocker.patch.object(coordinator, "_get_unhealthy_threads", return_value=[])
+
+    # When
+    coordinator.start()
+    coordinator.stop()
+    coordinator.join(timeout=5)
+
+    # Then
+    event_loops = {
+        call.kwargs["event_loop"] for call in task_runner_mock.call_args_list
+    }
+    assert len(task_runner_mock.call_args_list) == 2
+    assert len(event_loops) == 1
+    assert isinstance(event_loops.pop(), asyncio.AbstractEventLoop)
+    assert not coordinator.is_alive()
+
+
+@pytest.mark.django_db
+def test_task_runner_coordinator__queues__starts_runners_per_queue(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    task_runner_mock = mocker.patch.object(threads, "TaskRunner")
+    coordinator = threads.TaskRunnerCoordinator(
+        config=TaskProcessorConfig(
+            num_threads=5,
+            sleep_interval_ms=500,
+            grace_period_ms=10_000,
+            queue_pop_size=1,
+            queues={"default": 1, "bulk": 2},
+        ),
+    )
+    mocker.patch.object(coordinator, "_get_unhealthy_threads", return_value=[])
+
+    # When
+    coordinator.start()
+    coordinator.stop()
+    coordinator.join(timeout=5)
+
+    # Then
+    assert [
+        (call.kwargs["queues"], call.kwargs["run_recurring_tasks"])
+        for call in task_runner_mock.call_args_list
+    ] == [(["default"], True), (["bulk"], False), (["bulk"], False)]
+
+
+def test_task_runner_coordinator_replace_dead_threads__dead_runner__starts_replacement(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    coordinator = threads.TaskRunnerCoordinator(
+        config=TaskProcessorConfig(
+            num_threads=2,
+            sleep_interval_ms=500,
+            grace_period_ms=10_000,
+            queue_pop_size=1,
+        ),
+    )
+    alive_runner = mocker.Mock(spec=threads.TaskRunner)
+    alive_runner.is_alive.return_value = True
+    dead_runner = threads.TaskRunner(queues=["bulk"])
+    runners = coordinator._threads
+    runners.extend([alive_runner, dead_runner])
+    start_runner_mock = mocker.patch.object(coordinator, "_start_runner")
+
+    # When
+    coordinator._replace_dead_threads()
+
+    # Then
+    start_runner_mock.assert_called_once_with(["bulk"])
+    # the list shared with other threads is updated in place
+    assert coordinator._threads is runners
+    assert runners == [alive_runner, start_runner_mock.return_value]
+
+
+def test_task_runner_coordinator_replace_dead_threads__stopped__does_not_replace(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    coordinator = threads.TaskRunnerCoordinator(
+        config=TaskProcessorConfig(
+            num_threads=1,
+            sleep_interval_ms=500,
+            grace_period_ms=10_000,
+            queue_pop_size=1,
+        ),
+    )
+    coordinator._threads.append(threads.TaskRunner())
+    start_runner_mock = mocker.patch.object(coordinator, "_start_runner")
+    coordinator.stop()
+
+    # When
+    coordinator._replace_dead_threads()
+
+    # Then
+    start_runner_mock.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "last_num_tasks, num_waiting, expected_num_threads",
+    [
+        # all runners popped a full batch
+        ((5, 5), None, 3),
+        # more tasks waiting than runners pop at once
+        ((5, 1), 20, 3),
+        # busy, but not saturated
+        ((5, 1), 5, 2),
+        # several runners idle
+        ((0, 0), 0, 1),
+        # one runner idle
+        ((0, 1), 0, 2),
+    ],
+)
+def test_task_runner_coordinator_autoscale__runner_activity__scales_threads(
+    mocker: MockerFixture,
+    last_num_tasks: tuple[int, int],
+    num_waiting: int | None,
+    expected_num_threads: int,
+) -> None:
+    # Given
+    coordinator = threads.TaskRunnerCoordinator(
+        config=TaskProcessorConfig(
+            num_threads=1,
+            max_num_threads=3,
+            sleep_interval_ms=500,
+            grace_period_ms=10_000,
+            queue_pop_size=5,
+        ),
+    )
+    runners = [
+        mocker.Mock(
+            spec=threads.TaskRunner,
+            last_num_tasks=num_tasks,
+            queue_pop_size=5,
+        )
+        for num_tasks in last_num_tasks
+    ]
+    coordinator._threads.extend(runners)
+    coordinator._metrics_exporter.num_waiting = num_waiting
+    mocker.patch.object(coordinator, "_start_runner")
+    stopped_threads = coordinator._stopped_threads
+
+    # When
+    coordinator._autoscale()
+
+    # Then
+    assert len(coordinator._threads) == expected_num_threads
+    for runner in set(runners) - set(coordinator._threads):
+        runner.stop.assert_called_once_with()
+        assert runner in coordinator._stopped_threads
+    # the heartbeat writer renews the leases of stopped runners from the same list
+    assert coordinator._stopped_threads is stopped_threads
+
+
+def test_task_runner_coordinator_autoscale__max_num_threads__does_not_scale_up(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    coordinator = threads.TaskRunnerCoordinator(
+        config=TaskProcessorConfig(
+            num_threads=1,
+            max_num_threads=2,
+            sleep_interval_ms=500,
+            grace_period_ms=10_000,
+            queue_pop_size=1,
+        ),
+    )
+    coordinator._threads.extend(
+        mocker.Mock(spec=threads.TaskRunner, last_num_tasks=1, queue_pop_size=1)
+        for _ in range(2)
+    )
+    start_runner_mock = mocker.patch.object(coordinator, "_start_runner")
+
+    # When
+    coordinator._autoscale()
+
+    # Then
+    start_runner_mock.assert_not_called()
+    assert len(coordinator._threads) == 2
+
+
+@pytest.mark.django_db
+def test_task_runner_coordinator__drain_timeout_elapsed__releases_unstarted_tasks(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    # Given
+    Task.objects.bulk_create(
+        [
+            Task(task_identifier="tasks.first", is_locked=True),
+            Task(task_identifier="tasks.second", is_locked=True, dedup_key="key"),
+            # a pending duplicate of the second task
+            Task(task_identifier="tasks.second", dedup_key="key"),
+            Task(task_identifier="tasks.third", is_locked=True),
+        ]
+    )
+    first_task, second_task, _, third_task = Task.objects.order_by("pk")
+    runner = threads.TaskRunner()
+    coordinator = threads.TaskRunnerCoordinator(
+        config=TaskProcessorConfig(
+            num_threads=1,
+            sleep_interval_ms=500,
+            grace_period_ms=10_000,
+            queue_pop_size=3,
+            drain_timeout_ms=0,
+        ),
+    )
+
+    # When
+    with runner.worker.claim("default", [first_task, second_task, third_task]):
+        runner.worker.start(first_task)
+        coordinator._release_unstarted_tasks([runner])
+
+    # Then
+    assert [
+        Task.objects.get(pk=task.pk).is_locked for task in (first_task, third_task)
+    ] == [True, False]
+    # the second task is coalesced into its pending duplicate
+    assert not Task.objects.filter(pk=second_task.pk).exists()
+    assert caplog.messages == [
+        "Released 2 of 2 task(s) not started before the drain timeout "
+        f"from database 'default': tasks.second id={second_task.pk}, "
+        f"tasks.third id={third_task.pk}",
+    ]
+
+
+@pytest.mark.django_db
+def test_task_runner_coordinator__released_duplicates_marked_started__not_counted_as_failed() -> (
+    None
+):
+    # Given
+    expired_at = timezone.now() - timedelta(seconds=1)
+    Task.objects.bulk_create(
+        [
+            # duplicates of each other, marked started along with their batch
+            Task(
+                task_identifier="tasks.first",
+                dedup_key="key",
+                is_locked=True,
+                lease_expires_at=expired_at,
+                started_at=expired_at,
+            )
+            for _ in range(2)
+        ]
+    )
+    first_task, first_task_duplicate = Task.objects.order_by("pk")
+    runner = threads.TaskRunner()
+    coordinator = threads.TaskRunnerCoordinator(
+        config=TaskProcessorConfig(
+            num_threads=1,
+            sleep_interval_ms=500,
+            grace_period_ms=10_000,
+            queue_pop_size=2,
+            drain_timeout_ms=0,
+        ),
+    )
+    with runner.worker.claim("default", [first_task, first_task_duplicate]):
+        coordinator._release_unstarted_tasks([runner])
+
+    # When
+    threads.HeartbeatWriter(runners=[]).reclaim_expired_leases()
+
+    # Then
+    first_task.refresh_from_db()
+    assert not first_task.is_locked
+    assert first_task.num_failures == 0
+    # the duplicate left locked is coalesced into the released task
+    assert not Task.objects.filter(pk=first_task_duplicate.pk).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.task_processor_mode
+def test_queue_metrics_exporter_export__queued_tasks__sets_gauges(
+    assert_metric: AssertMetricFixture,
+) -> None:
+    # Given
+    now = timezone.now()
+    Task.objects.bulk_create(
+        [
+            Task(task_identifier="tasks.first", scheduled_for=now - timedelta(hours=1)),
+            Task(task_identifier="tasks.first", scheduled_for=now),
+            Task(task_identifier="tasks.first", scheduled_for=now, is_locked=True),
+            Task(task_identifier="tasks.second", scheduled_for=now, priority=25),
+            # not due yet
+            Task(
+                task_identifier="tasks.second", scheduled_for=now + timedelta(hours=1)
+            ),
+        ]
+    )
+    exporter = threads.QueueMetricsExporter()
+
+    # When
+    exporter.export()
+
+    # Then
+    assert_metric(
+        name="flagsmith_task_processor_waiting_tasks",
+        labels={"task_identifier": "tasks.first", "priority": "None"},
+        value=2,
+    )
+    assert_metric(
+        name="flagsmith_task_processor_waiting_tasks",
+        labels={"task_identifier": "tasks.second", "priority": "25"},
+        value=1,
+    )
+    assert_metric(
+        name="flagsmith_task_processor_locked_tasks",
+        labels={"task_identifier": "tasks.first"},
+        value=1,
+    )
+    oldest_waiting_task_age_seconds = prometheus_client.REGISTRY.get_sample_value(
+        "flagsmith_task_processor_oldest_waiting_task_age_seconds"
+    )
+    assert oldest_waiting_task_age_seconds == pytest.approx(3600, abs=60)
+
+
+@pytest.mark.django_db
+@pytest.mark.task_processor_mode
+def test_queue_metrics_exporter_export__tasks_completed__resets_gauges(
+    assert_metric: AssertMetricFixture,
+) -> None:
+    # Given
+    task = Task.objects.create(
+        task_identifier="tasks.first",
+        scheduled_for=timezone.now() - timedelta(seconds=1),
+    )
+    exporter = threads.QueueMetricsExporter()
+    exporter.export()
+    Task.objects.filter(pk=task.pk).update(completed=True)
+
+    # When
+    exporter.export()
+
+    # Then
+    assert_metric(
+        name="flagsmith_task_processor_waiting_tasks",
+        labels={"task_identifier": "tasks.first", "priority": "None"},
+        value=0,
+    )
+    assert_metric(
+        name="flagsmith_task_processor_oldest_waiting_task_age_seconds",
+        labels={},
+        value=0,
+    )
+
+
+@pytest.mark.django_db
+def test_heartbeat_writer_write__runners__upserts_heartbeats(
+    django_assert_num_queries: DjangoAssertNumQueries,
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    now = timezone.now()
+    runners = [threads.TaskRunner(name=f"TaskRunner-{index}") for index in range(3)]
+    for runner in runners[:2]:
+        mocker.patch.object(runner, "is_alive", return_value=True)
+        runner.last_checked_for_tasks = now
+    writer = threads.HeartbeatWriter(runners=runners)
+    writer.write()
+
+    # When
+    with runners[0].worker.claim("default", [Task(), Task()]):
+        with django_assert_num_queries(1):
+            writer.write()
+
+    # Then
+    assert list(
+        TaskProcessorHeartbeat.objects.order_by("worker_id").values_list(
+            "worker_id", "last_checked_at", "num_in_flight"
+        )
+    ) == [
+        (f"{writer.worker_id_prefix}TaskRunner-0", now, 2),
+        (f"{writer.worker_id_prefix}TaskRunner-1", now, 0),
+    ]
+    assert (
+        TaskProcessorHeartbeat.objects.get(
+            worker_id=f"{writer.worker_id_prefix}TaskRunner-0"
+        ).last_claimed_at
+        == runners[0].worker.last_claimed_at
+    )
+
+
+@pytest.mark.django_db
+def test_heartbeat_writer_renew_leases__tasks_in_flight__extends_leases() -> None:
+    # Given
+    now = timezone.now()
+    Task.objects.bulk_create(
+        [
+            Task(
+                task_identifier="tasks.first",
+                is_locked=True,
+                lease_expires_at=now + timedelta(seconds=1),
+            ),
+            Task(
+                task_identifier="tasks.first",
+                is_locked=True,
+                lease_expires_at=now + timedelta(hours=1),
+            ),
+            # not claimed by this task processor
+            Task(
+                task_identifier="tasks.first",
+                is_locked=True,
+                lease_expires_at=now + timedelta(seconds=1),
+            ),
+        ]
+    )
+    short_lease_task, long_lease_task, other_task = Task.objects.order_by("pk")
+    runner = threads.TaskRunner()
+    writer = threads.HeartbeatWriter(runners=[runner])
+
+    # When
+    with runner.worker.claim("default", [short_lease_task, long_lease_task]):
+        writer.renew_leases()
+
+    # Then
+    short_lease_task.refresh_from_db()
+    assert short_lease_task.lease_expires_at
+    assert short_lease_task.lease_expires_at > now + timedelta(seconds=30)
+    long_lease_task.refresh_from_db()
+    assert long_lease_task.lease_expires_at == now + timedelta(hours=1)
+    other_task.refresh_from_db()
+    assert other_task.lease_expires_at == now + timedelta(seconds=1)
+
+
+@pytest.mark.django_db
+def test_heartbeat_writer_renew_leases__stopped_runner_tasks_in_flight__extends_leases() -> (
+    None
+):
+    # Given
+    lease_expires_at = timezone.now() + timedelta(seconds=1)
+    task = Task.objects.create(
+        task_identifier="tasks.first",
+        is_locked=True,
+        lease_expires_at=lease_expires_at,
+    )
+    stopped_runner = threads.TaskRunner()
+    stopped_runner.stop()
+    writer = threads.HeartbeatWriter(runners=[], stopped_runners=[stopped_runner])
+
+    # When
+    with stopped_runner.worker.claim("default", [task]):
+        writer.renew_leases()
+
+    # Then
+    task.refresh_from_db()
+    assert task.lease_expires_at
+    assert task.lease_expires_at > lease_expires_at + timedelta(seconds=30)
+
+
+@pytest.mark.django_db
+def test_heartbeat_writer_reclaim_expired_leases__started_task__counts_failure(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    # Given
+    now = timezone.now()
+    Task.objects.bulk_create(
+        [
+            Task(
+                task_identifier="tasks.first",
+                dedup_key="key",
+                is_locked=True,
+                lease_expires_at=now - timedelta(seconds=1),
+                started_at=now - timedelta(minutes=5),
+            ),
+            # a pending duplicate, which the reclaimed task must not conflict with
+            Task(task_identifier="tasks.first", dedup_key="key"),
+            # not expired yet
+            Task(
+                task_identifier="tasks.first",
+                is_locked=True,
+                lease_expires_at=now + timedelta(seconds=1),
+                started_at=now - timedelta(minutes=5),
+            ),
+        ]
+    )
+    expired_task, _, unexpired_task = Task.objects.order_by("pk")
+    writer = threads.HeartbeatWriter(runners=[])
+
+    # When
+    writer.reclaim_expired_leases()
+
+    # Then
+    expired_task.refresh_from_db()
+    assert not expired_task.is_locked
+    assert expired_task.lease_expires_at is None
+    assert expired_task.num_failures == 1
+    assert expired_task.finished_at
+    assert expired_task.last_error == "Task lease expired before the task finished"
+    unexpired_task.refresh_from_db()
+    assert unexpired_task.is_locked
+    assert unexpired_task.num_failures == 0
+    assert caplog.messages == [
+        "Reclaimed 1 task(s) whose lease expired from database 'default'"
+    ]
+
+
+@pytest.mark.django_db
+def test_heartbeat_writer_reclaim_expired_leases__unstarted_tasks__releases_without_failure() -> (
+    None
+):
+    # Given
+    expired_at = timezone.now() - timedelta(seconds=1)
+    Task.objects.bulk_create(
+        [
+            Task(
+                task_identifier="tasks.first",
+                is_locked=True,
+                lease_expires_at=expired_at,
+            ),
+            Task(
+                task_identifier="tasks.second",
+                dedup_key="key",
+                is_locked=True,
+                lease_expires_at=expired_at,
+            ),
+            # a pending duplicate of the second task
+            Task(task_identifier="tasks.second", dedup_key="key"),
+            # duplicates of each other
+            *(
+                Task(
+                    task_identifier="tasks.third",
+                    dedup_key="key",
+                    is_locked=True,
+                    lease_expires_at=expired_at,
+                )
+                for _ in range(2)
+            ),
+        ]
+    )
+    first_task, second_task, _, third_task, third_task_duplicate = (
+        Task.objects.order_by("pk")
+    )
+    writer = threads.HeartbeatWriter(runners=[])
+
+    # When
+    writer.reclaim_expired_leases()
+
+    # Then
+    first_task.refresh_from_db()
+    assert not first_task.is_locked
+    assert first_task.num_failures == 0
+    # the second task is coalesced into its pending duplicate
+    assert not Task.objects.filter(pk=second_task.pk).exists()
+    # only one duplicate is released at once, the other is coalesced into it later
+    third_task.refresh_from_db()
+    assert not third_task.is_locked
+    third_task_duplicate.refresh_from_db()
+    assert third_task_duplicate.is_locked
+    writer.reclaim_expired_leases()
+    assert not Task.objects.filter(pk=third_task_duplicate.pk).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_heartbeat_writer__stopped__deletes_own_and_expired_heartbeats() -> None:
+    # Given
+    now = timezone.now()
+    TaskProcessorHeartbeat.objects.bulk_create(
+        [
+            TaskProcessorHeartbeat(
+                worker_id="other-host:1:TaskRunner-1",
+                last_seen_at=now - timedelta(days=2),
+            ),
+            TaskProcessorHeartbeat(
+                worker_id="other-host:2:TaskRunner-1",
+                last_seen_at=now,
+            ),
+        ]
+    )
+    runner = threads.TaskRunner(sleep_interval_millis=10)
+    writer = threads.HeartbeatWriter(runners=[runner], interval_seconds=0.01)
+    runner.start()
+    writer.start()
+    time.sleep(0.1)
+
+    # When
+    writer.stop()
+    writer.join(timeout=5)
+    runner.stop()
+    runner.join(timeout=5)
+
+    # Then
+    assert list(TaskProcessorHeartbeat.objects.values_list("worker_id", flat=True)) == [
+        "other-host:2:TaskRunner-1"
     ]
@@ -1,8 +1,10 @@
 import argparse
+import os
 
 import pytest
+from pytest_mock import MockerFixture
 
-from task_processor.utils import add_arguments
+from task_processor.utils import add_arguments, start_task_processor
 
 
 def _parse_defaults() -> argparse.Namespace:
@@ -21,6 +23,10 @@ def test_add_arguments__no_env__uses_run_docker_defaults(
         "TASK_PROCESSOR_SLEEP_INTERVAL",
         "TASK_PROCESSOR_GRACE_PERIOD_MS",
         "TASK_PROCESSOR_QUEUE_POP_SIZE",
+        "TASK_PROCESSOR_LISTEN",
+        "TASK_PROCESSOR_NUM_PROCESSES",
+        "TASK_PROCESSOR_MAX_SLEEP_INTERVAL_MS",
+        "TASK_PROCESSOR_QUEUES",
     ]:
         monkeypatch.delenv(name, raising=False)
 
@@ -32,6 +38,10 @@ def test_add_arguments__no_env__uses_run_docker_defaults(
     assert args.sleepintervalms == 500
     assert args.graceperiodms == 20000
     assert args.queuepopsize == 10
+    assert args.listen is False
+    assert args.numprocesses == (os.cpu_count() or 1)
+    assert args.maxsleepintervalms is None
+    assert args.queues is None
 
 
 def test_add_arguments__env_set__uses_env_values(
@@ -42,6 +52,10 @@ def test_add_arguments__env_set__uses_env_values(
     monkeypatch.setenv("TASK_PROCESSOR_SLEEP_INTERVAL_MS", "250")
     monkeypatch.setenv("TASK_PROCESSOR_GRACE_PERIOD_MS", "15000")
     monkeypatch.setenv("TASK_PROCESSOR_QUEUE_POP_SIZE", "20")
+    monkeypatch.setenv("TASK_PROCESSOR_LISTEN", "true")
+    monkeypatch.setenv("TASK_PROCESSOR_NUM_PROCESSES", "3")
+    monkeypatch.setenv("TASK_PROCESSOR_MAX_SLEEP_INTERVAL_MS", "8000")
+    monkeypatch.setenv("TASK_PROCESSOR_QUEUES", "default,bulk:2")
 
     # When
     args = _parse_defaults()
@@ -51,6 +65,10 @@ def test_add_arguments__env_set__uses_env_values(
     assert args.sleepintervalms == 250
     assert args.graceperiodms == 15000
     assert args.queuepopsize == 20
+    assert args.listen is True
+    assert args.numprocesses == 3
+    assert args.maxsleepintervalms == 8000
+    assert args.queues == {"default": None, "bulk": 2}
 
 
 def test_add_arguments__legacy_sleep_interval__used_as_fallback(
@@ -79,3 +97,108 @@ def test_add_arguments__sleep_interval_ms__takes_precedence_over_legacy(
 
     # Then
     assert args.sleepintervalms == 300
+
+
+@pytest.mark.parametrize("value", ["default,", "bulk:many"])
+def test_add_arguments__invalid_queues__errors(
+    value: str,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    # Given
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+
+    # When
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--queues", value])
+
+    # Then
+    assert "--queues" in capsys.readouterr().err
+
+
+def test_start_task_processor__queues__uses_num_threads_as_default(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    coordinator_class = mocker.patch("task_processor.utils.TaskRunnerCoordinator")
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    options = vars(
+        parser.parse_args(["--numthreads", "3", "--queues", "default,bulk:1"])
+    )
+
+    # When
+    with start_task_processor(options):
+        pass
+
+    # Then
+    config = coordinator_class.call_args.kwargs["config"]
+    assert config.queues == {"default": 3, "bulk": 1}
+
+
+def test_start_task_processor__fair_share__passes_config(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    coordinator_class = mocker.patch("task_processor.utils.TaskRunnerCoordinator")
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    options = vars(parser.parse_args(["--fairshare"]))
+
+    # When
+    with start_task_processor(options):
+        pass
+
+    # Then
+    assert coordinator_class.call_args.kwargs["config"].fair_share is True
+
+
+def test_start_task_processor__drain_timeout__passes_config(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    coordinator_class = mocker.patch("task_processor.utils.TaskRunnerCoordinator")
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    options = vars(parser.parse_args(["--draintimeoutms", "5000"]))
+
+    # When
+    with start_task_processor(options):
+        pass
+
+    # Then
+    assert coordinator_class.call_args.kwargs["config"].drain_timeout_ms == 5000
+
+
+def test_start_task_processor__max_num_threads__passes_config(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    coordinator_class = mocker.patch("task_processor.utils.TaskRunnerCoordinator")
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    options = vars(parser.parse_args(["--maxnumthreads", "10"]))
+
+    # When
+    with start_task_processor(options):
+        pass
+
+    # Then
+    assert coordinator_class.call_args.kwargs["config"].max_num_threads == 10
+
+
+def test_start_task_processor__priority_aging__passes_config(
+    mocker: MockerFixture,
+) -> None:
+    # Given
+    coordinator_class = mocker.patch("task_processor.utils.TaskRunnerCoordinator")
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    options = vars(parser.parse_args(["--priorityagingms", "1000"]))
+
+    # When
+    with start_task_processor(options):
+        pass
+
+    # Then
+    assert coordinator_class.call_args.kwargs["config"].priority_aging_ms == 1000